@@ -0,0 +1,89 @@
+"""Initial schema: the tables created by create_all before migrations existed
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migration_helpers import table_exists
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not table_exists("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("is_active", sa.Boolean(), nullable=True),
+            sa.Column("is_superuser", sa.Boolean(), nullable=True),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if not table_exists("conversations"):
+        op.create_table(
+            "conversations",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("whatsapp_id", sa.String(), nullable=True),
+            sa.Column("started_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("location_state", sa.String(), nullable=True),
+            sa.Column("problem_category", sa.String(), nullable=True),
+        )
+        op.create_index("ix_conversations_id", "conversations", ["id"])
+        op.create_index("ix_conversations_whatsapp_id", "conversations", ["whatsapp_id"])
+        op.create_index("ix_conversations_location_state", "conversations", ["location_state"])
+        op.create_index("ix_conversations_problem_category", "conversations", ["problem_category"])
+
+    if not table_exists("messages"):
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("conversation_id", sa.Integer(), sa.ForeignKey("conversations.id"), nullable=True),
+            sa.Column("content", sa.Text(), nullable=True),
+            sa.Column("role", sa.String(), nullable=True),
+            sa.Column("media_url", sa.String(), nullable=True),
+            sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        )
+        op.create_index("ix_messages_id", "messages", ["id"])
+
+    if not table_exists("professionals"):
+        op.create_table(
+            "professionals",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("type", sa.String(), nullable=False),
+            sa.Column("state", sa.String(), nullable=False),
+            sa.Column("city", sa.String(), nullable=False),
+            sa.Column("phone", sa.String(), nullable=True),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("specialties", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        for column in ("id", "name", "type", "state", "city"):
+            op.create_index(f"ix_professionals_{column}", "professionals", [column])
+
+    if not table_exists("system_configs"):
+        op.create_table(
+            "system_configs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("key", sa.String(), nullable=False),
+            sa.Column("value", sa.Text(), nullable=True),
+            sa.Column("description", sa.String(), nullable=True),
+        )
+        op.create_index("ix_system_configs_id", "system_configs", ["id"])
+        op.create_index("ix_system_configs_key", "system_configs", ["key"], unique=True)
+
+
+def downgrade():
+    for table in ("system_configs", "professionals", "messages", "conversations", "users"):
+        op.drop_table(table)
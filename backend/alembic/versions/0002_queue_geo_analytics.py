@@ -0,0 +1,125 @@
+"""Tables, columns and indexes added since the initial schema: config
+versions, inbound job queue, professional and conversation locations,
+unique whatsapp_id, analytics rollups and trend baselines, keyset indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migration_helpers import column_exists, index_exists, index_is_unique, table_exists
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+NEW_COLUMNS = [
+    ("professionals", sa.Column("latitude", sa.Float(), nullable=True)),
+    ("professionals", sa.Column("longitude", sa.Float(), nullable=True)),
+    ("conversations", sa.Column("location_source", sa.String(), nullable=True)),
+    ("conversations", sa.Column("location_city", sa.String(), nullable=True)),
+    ("conversations", sa.Column("latitude", sa.Float(), nullable=True)),
+    ("conversations", sa.Column("longitude", sa.Float(), nullable=True)),
+]
+
+
+def upgrade():
+    if not table_exists("system_config_versions"):
+        op.create_table(
+            "system_config_versions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+        )
+
+    if not table_exists("inbound_jobs"):
+        op.create_table(
+            "inbound_jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("dedup_key", sa.String(), nullable=True, unique=True),
+            sa.Column("group_key", sa.String(), nullable=True),
+            sa.Column("payload", sa.Text(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("run_after", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("locked_until", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("last_error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        for column in ("id", "group_key", "status", "run_after"):
+            op.create_index(f"ix_inbound_jobs_{column}", "inbound_jobs", [column])
+
+    if not table_exists("conversation_rollups"):
+        op.create_table(
+            "conversation_rollups",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("bucket", sa.Date(), nullable=False),
+            sa.Column("location_state", sa.String(), nullable=False),
+            sa.Column("problem_category", sa.String(), nullable=False),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.UniqueConstraint("bucket", "location_state", "problem_category", name="uq_conversation_rollup_key"),
+        )
+        op.create_index("ix_conversation_rollups_id", "conversation_rollups", ["id"])
+        op.create_index("ix_conversation_rollups_bucket", "conversation_rollups", ["bucket"])
+
+    if not table_exists("trend_baselines"):
+        op.create_table(
+            "trend_baselines",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("location_state", sa.String(), nullable=False),
+            sa.Column("problem_category", sa.String(), nullable=False),
+            sa.Column("mean", sa.Float(), nullable=False),
+            sa.Column("variance", sa.Float(), nullable=False),
+            sa.Column("observations", sa.Integer(), nullable=False),
+            sa.Column("last_bucket", sa.Date(), nullable=False),
+            sa.UniqueConstraint("location_state", "problem_category", name="uq_trend_baseline_key"),
+        )
+        op.create_index("ix_trend_baselines_id", "trend_baselines", ["id"])
+
+    for table, column in NEW_COLUMNS:
+        if not column_exists(table, column.name):
+            op.add_column(table, column)
+
+    if not index_is_unique("conversations", "ix_conversations_whatsapp_id"):
+        # Before the unique index, concurrent first messages could create
+        # duplicates: keep the oldest conversation and move messages to it
+        op.execute("""
+            UPDATE messages SET conversation_id = (
+                SELECT MIN(keep.id) FROM conversations keep
+                WHERE keep.whatsapp_id = (SELECT c.whatsapp_id FROM conversations c WHERE c.id = messages.conversation_id)
+            )
+            WHERE conversation_id IN (
+                SELECT dup.id FROM conversations dup
+                WHERE dup.id > (SELECT MIN(keep.id) FROM conversations keep WHERE keep.whatsapp_id = dup.whatsapp_id)
+            )
+        """)
+        op.execute("""
+            DELETE FROM conversations
+            WHERE id > (SELECT MIN(keep.id) FROM conversations keep WHERE keep.whatsapp_id = conversations.whatsapp_id)
+        """)
+        if index_exists("conversations", "ix_conversations_whatsapp_id"):
+            op.drop_index("ix_conversations_whatsapp_id", table_name="conversations")
+        op.create_index("ix_conversations_whatsapp_id", "conversations", ["whatsapp_id"], unique=True)
+
+    # Expression indexes aren't reflected on SQLite, so index_exists can't see this one
+    op.create_index(
+        "ix_conversations_activity", "conversations",
+        [sa.text("coalesce(updated_at, started_at)"), "id"], if_not_exists=True,
+    )
+    if not index_exists("messages", "ix_messages_conversation_timestamp"):
+        op.create_index("ix_messages_conversation_timestamp", "messages", ["conversation_id", "timestamp", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_messages_conversation_timestamp", table_name="messages")
+    op.drop_index("ix_conversations_activity", table_name="conversations")
+    op.drop_index("ix_conversations_whatsapp_id", table_name="conversations")
+    op.create_index("ix_conversations_whatsapp_id", "conversations", ["whatsapp_id"])
+    for table, column in reversed(NEW_COLUMNS):
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column(column.name)
+    for table in ("trend_baselines", "conversation_rollups", "inbound_jobs", "system_config_versions"):
+        op.drop_table(table)
@@ -0,0 +1,58 @@
+"""Denormalized last message columns on conversations for the chat list
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migration_helpers import column_exists, index_exists
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite can't add a column with a non-constant default; the application
+    # always sets last_message_at on insert, the default is only a fallback
+    is_sqlite = op.get_bind().dialect.name == "sqlite"
+    if not column_exists("conversations", "last_message_at"):
+        op.add_column("conversations", sa.Column(
+            "last_message_at", sa.DateTime(timezone=True),
+            server_default=None if is_sqlite else sa.func.now(), nullable=True,
+        ))
+    if not column_exists("conversations", "last_message_preview"):
+        op.add_column("conversations", sa.Column("last_message_preview", sa.String(), nullable=True))
+    if not column_exists("conversations", "message_count"):
+        op.add_column("conversations", sa.Column("message_count", sa.Integer(), server_default="0", nullable=False))
+
+    op.execute("""
+        UPDATE conversations SET
+            message_count = (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = conversations.id),
+            last_message_at = COALESCE(
+                (SELECT MAX(m.timestamp) FROM messages m WHERE m.conversation_id = conversations.id),
+                updated_at, started_at
+            ),
+            last_message_preview = (
+                SELECT SUBSTR(m.content, 1, 120) FROM messages m
+                WHERE m.conversation_id = conversations.id
+                ORDER BY m.timestamp DESC, m.id DESC LIMIT 1
+            )
+        WHERE last_message_at IS NULL OR message_count = 0
+    """)
+
+    op.drop_index("ix_conversations_activity", table_name="conversations", if_exists=True)
+    if not index_exists("conversations", "ix_conversations_last_message_at"):
+        op.create_index("ix_conversations_last_message_at", "conversations", ["last_message_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_conversations_last_message_at", table_name="conversations")
+    op.create_index("ix_conversations_activity", "conversations", [sa.text("coalesce(updated_at, started_at)"), "id"])
+    with op.batch_alter_table("conversations") as batch:
+        batch.drop_column("message_count")
+        batch.drop_column("last_message_preview")
+        batch.drop_column("last_message_at")
@@ -0,0 +1,31 @@
+"""Rolling conversation summary for the prompt history
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migration_helpers import column_exists
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not column_exists("conversations", "summary"):
+        op.add_column("conversations", sa.Column("summary", sa.Text(), nullable=True))
+    if not column_exists("conversations", "summary_through_id"):
+        op.add_column("conversations", sa.Column("summary_through_id", sa.Integer(), nullable=True))
+    if not column_exists("conversations", "summary_message_count"):
+        op.add_column("conversations", sa.Column("summary_message_count", sa.Integer(), server_default="0", nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table("conversations") as batch:
+        batch.drop_column("summary_message_count")
+        batch.drop_column("summary_through_id")
+        batch.drop_column("summary")
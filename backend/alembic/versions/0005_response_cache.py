@@ -0,0 +1,41 @@
+"""Shared table of cached AI answers
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migration_helpers import table_exists
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+NUM_BANDS = 8
+
+
+def upgrade():
+    if table_exists("response_cache_entries"):
+        return
+    op.create_table(
+        "response_cache_entries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("key", sa.String(), nullable=False, unique=True),
+        sa.Column("namespace", sa.String(), nullable=False),
+        sa.Column("question", sa.Text(), nullable=False),
+        sa.Column("response", sa.Text(), nullable=False),
+        *[sa.Column(f"band_{i}", sa.String(), nullable=False) for i in range(NUM_BANDS)],
+        sa.Column("hits", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    for column in ["id", "namespace", "last_used_at", "expires_at"] + [f"band_{i}" for i in range(NUM_BANDS)]:
+        op.create_index(f"ix_response_cache_entries_{column}", "response_cache_entries", [column])
+
+
+def downgrade():
+    op.drop_table("response_cache_entries")
@@ -0,0 +1,41 @@
+"""Shared table of cached image analyses
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migration_helpers import table_exists
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+NUM_BANDS = 8
+
+
+def upgrade():
+    if table_exists("image_analysis_cache_entries"):
+        return
+    op.create_table(
+        "image_analysis_cache_entries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("key", sa.String(), nullable=False, unique=True),
+        sa.Column("namespace", sa.String(), nullable=False),
+        sa.Column("dhash", sa.String(), nullable=False),
+        sa.Column("response", sa.Text(), nullable=False),
+        *[sa.Column(f"band_{i}", sa.String(), nullable=False) for i in range(NUM_BANDS)],
+        sa.Column("hits", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    for column in ["id", "namespace", "last_used_at", "expires_at"] + [f"band_{i}" for i in range(NUM_BANDS)]:
+        op.create_index(f"ix_image_analysis_cache_entries_{column}", "image_analysis_cache_entries", [column])
+
+
+def downgrade():
+    op.drop_table("image_analysis_cache_entries")
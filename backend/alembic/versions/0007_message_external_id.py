@@ -0,0 +1,28 @@
+"""WhatsApp message ids on stored messages, for idempotent job retries
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.migration_helpers import column_exists, index_exists
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not column_exists("messages", "external_id"):
+        op.add_column("messages", sa.Column("external_id", sa.String(), nullable=True))
+    if not index_exists("messages", "ix_messages_external_id"):
+        op.create_index("ix_messages_external_id", "messages", ["external_id"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_messages_external_id", table_name="messages")
+    with op.batch_alter_table("messages") as batch:
+        batch.drop_column("external_id")
@@ -0,0 +1,34 @@
+"""Expression indexes for keyset pagination on SQLite
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+# SQLite compares timestamps through datetime() (sortable_timestamp), so the
+# keyset queries need indexes on that expression. Postgres uses the plain ones.
+INDEXES = {
+    "ix_conversations_last_message_datetime": "conversations (datetime(last_message_at), id)",
+    "ix_messages_conversation_datetime": "messages (conversation_id, datetime(timestamp), id)",
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    # Expression indexes aren't reflected, so index_exists() can't see them
+    for name, columns in INDEXES.items():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {columns}")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for name in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
@@ -1,21 +1,28 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc
 from typing import List, Any, Optional
 from app.db.session import get_db
-from app.models.conversation import Conversation
+from app.models.analytics import ConversationRollup
+from app.services.analytics_service import UNKNOWN, get_trends
 
 router = APIRouter()
 
+# Counts come from conversation_rollups, kept up to date as conversations are
+# classified (see app.services.analytics_service), so each query only reads
+# one row per day, state and category.
+rollup_count = func.sum(ConversationRollup.count)
+
 @router.get("/states")
 async def get_state_ranking(db: AsyncSession = Depends(get_db)):
     """
     Returns ranking of states by number of conversations.
     """
     query = (
-        select(Conversation.location_state, func.count(Conversation.id).label("count"))
-        .where(Conversation.location_state.isnot(None))
-        .group_by(Conversation.location_state)
+        select(ConversationRollup.location_state, rollup_count.label("count"))
+        .where(ConversationRollup.location_state != UNKNOWN)
+        .group_by(ConversationRollup.location_state)
+        .having(rollup_count > 0)
         .order_by(desc("count"))
     )
     result = await db.execute(query)
@@ -27,15 +34,14 @@ async def get_problem_ranking(state: Optional[str] = None, db: AsyncSession = De
     Returns ranking of problems, optionally filtered by state.
     """
     query = (
-        select(Conversation.problem_category, func.count(Conversation.id).label("count"))
-        .where(Conversation.problem_category.isnot(None))
+        select(ConversationRollup.problem_category, rollup_count.label("count"))
+        .where(ConversationRollup.problem_category != UNKNOWN)
     )
     
     if state:
-        query = query.where(Conversation.location_state == state)
+        query = query.where(ConversationRollup.location_state == state)
         
-    query = query.group_by(Conversation.problem_category).order_by(desc("count"))
-    
+    query = query.group_by(ConversationRollup.problem_category).having(rollup_count > 0).order_by(desc("count"))
     result = await db.execute(query)
     return [{"problem": row[0], "count": row[1]} for row in result.all()]
 
@@ -45,11 +51,12 @@ async def get_problems_by_region(db: AsyncSession = Depends(get_db)):
     Returns ranking of problems grouped by state.
     """
     query = (
-        select(Conversation.location_state, Conversation.problem_category, func.count(Conversation.id).label("count"))
-        .where(Conversation.location_state.isnot(None))
-        .where(Conversation.problem_category.isnot(None))
-        .group_by(Conversation.location_state, Conversation.problem_category)
-        .order_by(Conversation.location_state, desc("count"))
+        select(ConversationRollup.location_state, ConversationRollup.problem_category, rollup_count.label("count"))
+        .where(ConversationRollup.location_state != UNKNOWN)
+        .where(ConversationRollup.problem_category != UNKNOWN)
+        .group_by(ConversationRollup.location_state, ConversationRollup.problem_category)
+        .having(rollup_count > 0)
+        .order_by(ConversationRollup.location_state, desc("count"))
     )
     result = await db.execute(query)
     
@@ -65,3 +72,17 @@ async def get_problems_by_region(db: AsyncSession = Depends(get_db)):
         data[state].append({"problem": problem, "count": count})
         
     return [{"state": k, "problems": v} for k, v in data.items()]
+
+@router.get("/trends")
+async def get_problem_trends(
+    granularity: str = Query("day", pattern="^(day|week)$"),
+    periods: int = Query(14, ge=1, le=104),
+    state: Optional[str] = None,
+    category: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Returns counts per state and problem per day or week, with an anomaly
+    score (z-score against the EWMA baseline) for the current period.
+    """
+    return await get_trends(db, granularity, periods, state, category)
@@ -5,6 +5,7 @@ from typing import List
 from app.db.session import get_db
 from app.models.system_config import SystemConfig as SystemConfigModel
 from app.schemas.system_config import SystemConfigCreate, SystemConfig, SystemConfigUpdate
+from app.services.config_service import config_cache, bump_config_version
 
 router = APIRouter()
 
@@ -23,7 +24,9 @@ async def create_config(config: SystemConfigCreate, db: AsyncSession = Depends(g
     
     new_config = SystemConfigModel(**config.model_dump())
     db.add(new_config)
+    await bump_config_version(db)
     await db.commit()
+    config_cache.invalidate()
     await db.refresh(new_config)
     return new_config
 
@@ -36,12 +39,16 @@ async def update_config(key: str, config: SystemConfigUpdate, db: AsyncSession =
         # For better UX, let's create if missing
         new_config = SystemConfigModel(key=key, value=config.value)
         db.add(new_config)
+        await bump_config_version(db)
         await db.commit()
+        config_cache.invalidate()
         await db.refresh(new_config)
         return new_config
     
     db_config.value = config.value
+    await bump_config_version(db)
     await db.commit()
+    config_cache.invalidate()
     await db.refresh(db_config)
     return db_config
 
@@ -1,32 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
-from sqlalchemy.orm import selectinload
-from typing import List, Dict, Any
-from app.db.session import get_db
+from sqlalchemy import tuple_
+from typing import List, Dict, Any, Optional
+from app.core.pagination import decode_cursor, encode_cursor, id_value, timestamp_value
+from app.db.session import get_db, sortable_timestamp, sortable_timestamp_param
 from app.models.conversation import Conversation, Message
+from app.services.analytics_service import count_conversations
 
 router = APIRouter()
 
 @router.get("/", response_model=Dict[str, Any])
 async def read_conversations(
-    skip: int = 0, 
-    limit: int = 10, 
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     db: AsyncSession = Depends(get_db)
 ):
     """
-    List conversations with pagination.
+    List conversations, latest message first, with keyset pagination:
+    pass next_cursor back as cursor for the following page. total is only
+    computed on request and comes from the analytics counters.
     """
-    # Get total count
-    count_query = select(func.count(Conversation.id))
-    count_result = await db.execute(count_query)
-    total = count_result.scalar()
+    activity = sortable_timestamp(Conversation.last_message_at)
+    query = select(Conversation, activity).order_by(activity.desc(), Conversation.id.desc()).limit(limit + 1)
+    if cursor:
+        last_activity, last_id = decode_cursor(cursor, timestamp_value, id_value)
+        query = query.where(tuple_(activity, Conversation.id) < tuple_(sortable_timestamp_param(last_activity), last_id))
 
-    # Get paginated items
-    query = select(Conversation).order_by(Conversation.updated_at.desc()).offset(skip).limit(limit)
     result = await db.execute(query)
-    conversations = result.scalars().all()
+    rows = result.all()
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0].id) if len(rows) > limit else None
     
     return {
         "items": [
@@ -34,48 +38,82 @@ async def read_conversations(
                 "id": c.id,
                 "whatsapp_id": c.whatsapp_id,
                 "location_state": c.location_state,
+                "location_city": c.location_city,
+                "location_source": c.location_source,
                 "problem_category": c.problem_category,
+                "last_message_at": c.last_message_at,
+                "last_message_preview": c.last_message_preview,
+                "message_count": c.message_count,
                 "created_at": c.started_at,
                 "updated_at": c.updated_at
             }
-            for c in conversations
+            for c, _ in rows[:limit]
         ],
-        "total": total
+        "next_cursor": next_cursor,
+        "total": await count_conversations(db) if include_total else None
     }
 
-@router.get("/{conversation_id}/messages", response_model=List[dict])
+@router.get("/{conversation_id}/messages", response_model=Dict[str, Any])
 async def read_messages(
     conversation_id: int, 
-    skip: int = 0, 
-    limit: int = 100, 
+    limit: int = Query(100, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Get messages for a specific conversation.
+    Get messages for a specific conversation, oldest first.
+
+    Without a cursor the latest messages are returned. before=prev_cursor
+    pages back through older messages; after=next_cursor returns only
+    messages newer than the last one seen, for incremental refresh.
     """
     # Check if conversation exists
-    result = await db.execute(select(Conversation).filter(Conversation.id == conversation_id))
-    conversation = result.scalars().first()
-    if not conversation:
+    result = await db.execute(select(Conversation.id).filter(Conversation.id == conversation_id))
+    if result.scalar() is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
-        
-    query = (
-        select(Message)
-        .filter(Message.conversation_id == conversation_id)
-        .order_by(Message.timestamp.asc())
-        .offset(skip)
-        .limit(limit)
-    )
-    result = await db.execute(query)
-    messages = result.scalars().all()
+
+    sent_at = sortable_timestamp(Message.timestamp)
+    position = tuple_(sent_at, Message.id)
+    query = select(Message, sent_at).filter(Message.conversation_id == conversation_id).limit(limit + 1)
+
+    if after:
+        after_ts, after_id = decode_cursor(after, timestamp_value, id_value)
+        query = query.where(position > tuple_(sortable_timestamp_param(after_ts), after_id))
+        query = query.order_by(sent_at.asc(), Message.id.asc())
+        rows = (await db.execute(query)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        prev_cursor = None
+    else:
+        if before:
+            before_ts, before_id = decode_cursor(before, timestamp_value, id_value)
+            query = query.where(position < tuple_(sortable_timestamp_param(before_ts), before_id))
+        query = query.order_by(sent_at.desc(), Message.id.desc())
+        rows = (await db.execute(query)).all()
+        has_older = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        has_more = False
+        prev_cursor = encode_cursor(rows[0][1], rows[0][0].id) if has_older else None
+
+    if rows:
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0].id)
+    else:
+        # Nothing new: keep polling from the same place
+        next_cursor = after
     
-    return [
-        {
-            "id": m.id,
-            "role": m.role,
-            "content": m.content,
-            "media_url": m.media_url,
-            "created_at": m.timestamp
-        }
-        for m in messages
-    ]
+    return {
+        "items": [
+            {
+                "id": m.id,
+                "role": m.role,
+                "content": m.content,
+                "media_url": m.media_url,
+                "created_at": m.timestamp
+            }
+            for m, _ in rows
+        ],
+        "prev_cursor": prev_cursor,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    }
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.session import get_db
+from app.services.analytics_service import get_dashboard_summary
+from typing import Optional, Tuple
+import hashlib
+import json
+import time
+
+router = APIRouter()
+
+# Per-worker cache of the serialized summary: (body, etag, expires_at)
+_summary_cache: Optional[Tuple[bytes, str, float]] = None
+
+@router.get("/summary")
+async def read_dashboard_summary(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Dashboard totals, today/week counts, rankings and the last 7 days.
+    Cached for DASHBOARD_CACHE_TTL_SECONDS; supports If-None-Match.
+    """
+    global _summary_cache
+    now = time.monotonic()
+    if _summary_cache is None or _summary_cache[2] <= now:
+        summary = await get_dashboard_summary(db)
+        # generated_at changes every time; keep it out of the ETag
+        content = {k: v for k, v in summary.items() if k != "generated_at"}
+        etag = '"' + hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest() + '"'
+        body = json.dumps(summary).encode()
+        _summary_cache = (body, etag, now + settings.DASHBOARD_CACHE_TTL_SECONDS)
+
+    body, etag, _ = _summary_cache
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.DASHBOARD_CACHE_TTL_SECONDS}"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
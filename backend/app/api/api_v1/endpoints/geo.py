@@ -2,10 +2,20 @@ from fastapi import APIRouter, Query, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.services.geo_service import find_nearby_professionals
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 router = APIRouter()
 
 @router.get("/nearby", response_model=List[Dict])
-async def get_nearby(lat: float, lon: float, type: str = "veterinarian", db: AsyncSession = Depends(get_db)):
-    return await find_nearby_professionals(db, lat, lon, type)
+async def get_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    type: str = "veterinarian",
+    limit: int = Query(10, ge=1, le=100),
+    radius_km: Optional[float] = Query(None, gt=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Professionals sorted by distance (km) from the given point.
+    """
+    return await find_nearby_professionals(db, lat, lon, type, limit=limit, radius_km=radius_km)
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from typing import Optional
+from app.core.config import settings
+from app.services.knowledge_index import knowledge_index
+from app.services.document_text import EXTRACTION_ERRORS, read_document_text
+import asyncio
+
+router = APIRouter()
+
+@router.get("/documents")
+async def read_documents():
+    return knowledge_index.documents()
+
+@router.post("/documents")
+async def add_document(
+    name: str = Form(...),
+    source: Optional[str] = Form(None),
+    text: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+):
+    """
+    Index a PDF or text file (or pasted text) as a knowledge source.
+    A document with the same name is replaced.
+    """
+    if file is not None:
+        content = await file.read()
+        # The file name helps when the browser sends application/octet-stream
+        kind = f"{file.content_type or ''} {file.filename or ''}".lower()
+        text = await read_document_text(kind, content)
+    if not text or not text.strip() or text in EXTRACTION_ERRORS:
+        raise HTTPException(status_code=400, detail=text if text in EXTRACTION_ERRORS else "No text to index")
+    try:
+        # Chunking and postings are CPU work; keep the event loop free
+        return await asyncio.to_thread(knowledge_index.add_document, name, text, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    if not await asyncio.to_thread(knowledge_index.remove_document, doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"ok": True}
+
+@router.get("/search")
+async def search_knowledge(q: str, k: int = settings.KNOWLEDGE_TOP_K):
+    """Passages that would be sent to the model for this question"""
+    return [passage._asdict() for passage in knowledge_index.search(q, k)]
@@ -5,6 +5,7 @@ from typing import List, Optional
 from app.db.session import get_db
 from app.models.professional import Professional as ProfessionalModel
 from app.schemas.professional import ProfessionalCreate, Professional as ProfessionalSchema, ProfessionalUpdate
+from app.services.geo_service import professional_index
 
 router = APIRouter()
 
@@ -33,6 +34,7 @@ async def create_professional(professional: ProfessionalCreate, db: AsyncSession
     db.add(db_professional)
     await db.commit()
     await db.refresh(db_professional)
+    await professional_index.upsert(db, db_professional)
     return db_professional
 
 @router.get("/{professional_id}", response_model=ProfessionalSchema)
@@ -52,4 +54,5 @@ async def delete_professional(professional_id: int, db: AsyncSession = Depends(g
     
     await db.delete(professional)
     await db.commit()
+    await professional_index.remove(db, professional_id)
     return professional
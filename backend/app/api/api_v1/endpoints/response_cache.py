@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db
+from app.services.image_cache import image_cache
+from app.services.response_cache import response_cache
+
+router = APIRouter()
+
+@router.get("/stats")
+async def read_response_cache_stats(db: AsyncSession = Depends(get_db)):
+    """Hit/miss counters of the worker serving the request, and shared entries"""
+    stats = response_cache.stats()
+    stats["db_entries"] = await response_cache.count_db_entries(db)
+    return stats
+
+@router.delete("/")
+async def flush_response_cache(db: AsyncSession = Depends(get_db)):
+    """Drop every cached answer in the DB and, on their next config check, in every worker"""
+    deleted = await response_cache.flush(db)
+    return {"deleted": deleted}
+
+@router.get("/images/stats")
+async def read_image_cache_stats(db: AsyncSession = Depends(get_db)):
+    """Hit/miss counters of the image analysis cache in this worker, and shared entries"""
+    stats = image_cache.stats()
+    stats["db_entries"] = await image_cache.count_db_entries(db)
+    return stats
+
+@router.delete("/images")
+async def flush_image_cache(db: AsyncSession = Depends(get_db)):
+    """Drop every cached image analysis, in the DB and in every worker"""
+    deleted = await image_cache.flush(db)
+    return {"deleted": deleted}
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, Request, HTTPException, Response, BackgroundTasks
+from fastapi import APIRouter, Depends, Request, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db, AsyncSessionLocal
-from app.services.whatsapp_service import process_whatsapp_message
+from app.db.session import get_db
+from app.services.job_queue import enqueue_jobs, seen_recently
+from app.services.webhook_parser import parse_webhook, log_statuses
+from app.services.whatsapp_service import inbound_queue
+from app.services.image_preprocessing import image_stats
 from app.core.config import settings
 import logging
 
@@ -18,38 +21,43 @@ async def verify_webhook(request: Request):
         return Response(content=params.get("hub.challenge"), media_type="text/plain")
     raise HTTPException(status_code=403, detail="Invalid verification token")
 
-async def process_message_background(message_data: dict):
-    """
-    Process message in background with its own DB session.
-    """
-    try:
-        async with AsyncSessionLocal() as db:
-            await process_whatsapp_message(db, message_data)
-    except Exception as e:
-        logger.error(f"Error in background processing: {e}")
+@router.get("/image-stats")
+async def read_image_stats():
+    """Bytes before/after preprocessing and latency, for the worker serving the request"""
+    return image_stats.as_dict()
 
 @router.post("/webhook")
-async def receive_message(request: Request, background_tasks: BackgroundTasks):
+async def receive_message(request: Request, db: AsyncSession = Depends(get_db)):
     """
-    Receive messages from WhatsApp and process in background.
+    Receive messages from WhatsApp and enqueue them for the worker pool.
     """
     try:
         data = await request.json()
         logger.info(f"Received webhook data: {data}")
 
-        # Basic parsing for Official API structure
-        entry = data.get("entry", [])
-        if entry:
-            changes = entry[0].get("changes", [])
-            if changes:
-                value = changes[0].get("value", {})
-                messages = value.get("messages", [])
-                if messages:
-                    for msg in messages:
-                        # Add to background tasks to avoid timeout
-                        background_tasks.add_task(process_message_background, msg)
+        batch = parse_webhook(data)
+        log_statuses(batch.statuses)
+
+        # Retries of messages this worker already queued are acked right away
+        messages = [m for m in batch.messages if not seen_recently(m.get("id"))]
+        if messages:
+            # Backpressure: a non-2xx makes Meta redeliver later
+            if await inbound_queue.is_saturated(db):
+                raise HTTPException(status_code=503, detail="Inbound queue is full")
+            # Grouped by sender so a quick burst (photo, "soja", "MT") becomes one turn
+            job_ids = await enqueue_jobs(
+                db,
+                [(msg, msg.get("id"), msg.get("from")) for msg in messages],
+                delay=settings.MESSAGE_COALESCE_WINDOW_SECONDS,
+                max_wait=settings.MESSAGE_COALESCE_MAX_WAIT_SECONDS,
+            )
+            if len(job_ids) < len(messages):
+                logger.info(f"Ignored {len(messages) - len(job_ids)} duplicate message deliveries")
+            inbound_queue.notify()
         
         return {"status": "ok"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing webhook: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
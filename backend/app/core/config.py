@@ -23,10 +23,104 @@ class Settings(BaseSettings):
         return v
 
     OPENAI_API_KEY: str = ""
+    # Warm OpenAI clients, one per distinct API key, sharing one connection pool
+    OPENAI_CLIENT_REGISTRY_SIZE: int = 4
+    OPENAI_MAX_CONNECTIONS: int = 100
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_TIMEOUT_SECONDS: float = 120.0
+    # Conversation memory sent with each question
+    HISTORY_MAX_MESSAGES: int = 12
+    HISTORY_TOKEN_BUDGET: int = 1500 # Estimated at ~4 characters per token
+    SUMMARY_REFRESH_TURNS: int = 4 # Refold the summary once this many turns have left the history
+    SUMMARY_MAX_TOKENS: int = 300
+    # Oldest unfolded messages folded per refresh, so a long backlog is caught up a batch at a time
+    SUMMARY_BATCH_MESSAGES: int = 40
+    SUMMARY_BATCH_TOKEN_BUDGET: int = 4000
+    # PDF text extraction, in worker processes off the event loop
+    PDF_EXTRACTION_WORKERS: int = 2
+    PDF_EXTRACTION_TIMEOUT_SECONDS: float = 30.0
+    PDF_MAX_PAGES: int = 300
+    PDF_MAX_BYTES: int = 25 * 1024 * 1024
+    PDF_TEXT_CACHE_ENTRIES: int = 64 # Per worker, keyed by content hash
+    # Photos are downscaled and re-encoded in threads before the vision call
+    IMAGE_PREPROCESS_WORKERS: int = 2
+    IMAGE_OUTPUT_FORMAT: str = "jpeg" # or "webp"
+    IMAGE_QUALITY: int = 85
+    # Analyses of repeated photos, keyed by perceptual hash (LRU in each worker, shared table in the DB)
+    IMAGE_CACHE_ENABLED: bool = True
+    IMAGE_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    IMAGE_CACHE_MEMORY_ENTRIES: int = 500
+    IMAGE_CACHE_DB_MAX_ENTRIES: int = 10000
+    IMAGE_CACHE_MAX_DISTANCE: int = 4 # Differing dHash bits for a near-duplicate hit (at most 7)
+    # Documents sent by users: short ones go to the model as is; longer ones
+    # are read in chunks (map, concurrently) and answered from the notes (reduce)
+    DOCUMENT_PROMPT_CHARS: int = 4000
+    DOCUMENT_MAP_REDUCE_ENABLED: bool = True
+    DOCUMENT_MAX_TOKENS: int = 30000 # Cap on the text read per document
+    DOCUMENT_CHUNK_TOKENS: int = 3000
+    DOCUMENT_MAP_CONCURRENCY: int = 4
+    DOCUMENT_MAP_MAX_TOKENS: int = 400 # Notes per chunk
+    # Local BM25 index of knowledge source documents (shared by the workers of a host)
+    KNOWLEDGE_INDEX_DIR: str = "./knowledge_index"
+    KNOWLEDGE_CHUNK_CHARS: int = 1200
+    KNOWLEDGE_TOP_K: int = 4
+    KNOWLEDGE_TOKEN_BUDGET: int = 800
+    # Answers to repeated questions (LRU in each worker, shared table in the DB)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    RESPONSE_CACHE_MEMORY_ENTRIES: int = 1000
+    RESPONSE_CACHE_DB_MAX_ENTRIES: int = 20000
+    RESPONSE_CACHE_SIMILARITY: float = 0.9 # Jaccard of character 4-grams for a near-duplicate hit
     WHATSAPP_VERIFY_TOKEN: str = "agenteagro_token"
     WHATSAPP_ACCESS_TOKEN: Optional[str] = None
     WHATSAPP_NUMBER_ID: Optional[str] = None
-    
+    # Stream long answers: send each part as soon as it is generated
+    WHATSAPP_STREAM_REPLIES: bool = True
+    WHATSAPP_FIRST_CHUNK_CHARS: int = 400 # First part goes out at the first paragraph break past this
+    WHATSAPP_CHUNK_CHARS: int = 1500
+
+    # SystemConfig cache (per worker)
+    CONFIG_CACHE_TTL_SECONDS: int = 300
+    CONFIG_VERSION_POLL_SECONDS: float = 5.0
+
+    # WhatsApp Graph API HTTP client (one pooled client per worker)
+    GRAPH_API_VERSION: str = "v19.0"
+    GRAPH_API_HTTP2: bool = False # Requires the "h2" package
+    GRAPH_API_TIMEOUT_SECONDS: float = 30.0
+    GRAPH_API_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    GRAPH_API_MAX_CONNECTIONS: int = 50
+    GRAPH_API_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    GRAPH_API_KEEPALIVE_EXPIRY_SECONDS: float = 60.0
+
+    # Inbound message queue (DB-backed, one worker pool per process)
+    JOB_WORKER_CONCURRENCY: int = 8
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_VISIBILITY_TIMEOUT_SECONDS: float = 300.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF_SECONDS: float = 5.0
+    JOB_RETRY_BACKOFF_MAX_SECONDS: float = 600.0
+    JOB_QUEUE_MAX_PENDING: int = 1000 # Webhook answers 503 above this so Meta retries later
+    JOB_RETENTION_DAYS: int = 7 # Finished jobs (and their dedup keys) are kept this long
+    WEBHOOK_DEDUP_LRU_SIZE: int = 10000
+    # Messages from one user arriving within the window are answered as one turn
+    MESSAGE_COALESCE_WINDOW_SECONDS: float = 4.0
+    MESSAGE_COALESCE_MAX_WAIT_SECONDS: float = 15.0
+
+    # Professional spatial index (per worker)
+    GEO_INDEX_CELL_DEGREES: float = 0.25 # ~28 km grid cells
+    GEO_INDEX_CHECK_SECONDS: float = 10.0 # How often to look for changes made by other workers
+
+    # Trend anomaly scores (EWMA baseline of daily counts per state and category)
+    TREND_EWMA_ALPHA: float = 0.1 # Weight of the newest day; ~2/alpha days of memory
+    TREND_MIN_HISTORY_DAYS: int = 7 # No score until the baseline has seen this many days
+    TREND_ANOMALY_Z: float = 3.0
+
+    DASHBOARD_CACHE_TTL_SECONDS: int = 30
+
+    # CSV of IBGE municipalities (nome, uf or codigo_uf, latitude, longitude);
+    # defaults to app/data/municipios.csv (regenerate with app/data/update_municipios.py)
+    GAZETTEER_PATH: Optional[str] = None
+
     # AWS S3 / MinIO
     AWS_ACCESS_KEY_ID: str = "minioadmin"
     AWS_SECRET_ACCESS_KEY: str = "minioadmin"
@@ -0,0 +1,37 @@
+from datetime import datetime
+from fastapi import HTTPException
+from typing import Any, Callable, List
+import base64
+import json
+
+def encode_cursor(*values: Any) -> str:
+    """Opaque cursor for a keyset position, e.g. (sort_key, id)"""
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def timestamp_value(value: Any) -> datetime:
+    """Cursor field holding a timestamp (ISO 8601 text)"""
+    if not isinstance(value, str):
+        raise ValueError("timestamp is not a string")
+    return datetime.fromisoformat(value)
+
+def id_value(value: Any) -> int:
+    """Cursor field holding a row id"""
+    if type(value) is not int:
+        raise ValueError("id is not an integer")
+    return value
+
+def decode_cursor(cursor: str, *fields: Callable[[Any], Any]) -> List[Any]:
+    """
+    Values of a cursor from encode_cursor, each parsed by its field
+    function (timestamp_value, id_value). A tampered or truncated cursor
+    is a 400, never a query error.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValueError("wrong size")
+        return [field(value) for field, value in zip(fields, values)]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+import tempfile
+import urllib.request
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.gazetteer import BUNDLED_GAZETTEER, read_gazetteer_csv, write_gazetteer_csv
+
+# IBGE municipalities with coordinates (codigo_ibge, nome, latitude, longitude, ..., codigo_uf)
+DEFAULT_SOURCE = "https://raw.githubusercontent.com/kelvins/municipios-brasileiros/main/csv/municipios.csv"
+# Brazil has ~5,570 municipalities; fewer means a truncated or wrong download
+MIN_MUNICIPALITIES = 5500
+
+def update(source: str, output: str, min_rows: int = MIN_MUNICIPALITIES) -> int:
+    """Rewrite output from a local CSV or a URL; returns the municipalities written"""
+    if os.path.exists(source):
+        rows = read_gazetteer_csv(source)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "municipios.csv")
+            urllib.request.urlretrieve(source, path)
+            rows = read_gazetteer_csv(path)
+    if len(rows) < min_rows:
+        raise ValueError(f"{source} has {len(rows)} municipalities, expected at least {min_rows}")
+    write_gazetteer_csv(rows, output)
+    return len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the bundled municipality list")
+    parser.add_argument("--source", default=DEFAULT_SOURCE, help="CSV path or URL (nome, uf or codigo_uf, latitude, longitude)")
+    parser.add_argument("--output", default=BUNDLED_GAZETTEER)
+    args = parser.parse_args()
+    count = update(args.source, args.output)
+    print(f"Wrote {count} municipalities to {args.output}")
+
+if __name__ == "__main__":
+    main()
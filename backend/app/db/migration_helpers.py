@@ -0,0 +1,29 @@
+"""
+Checks for idempotent Alembic migrations. Databases created before
+migrations existed (create_all / create_missing_tables.py) already have
+some of these objects, so every step checks first.
+"""
+from alembic import op
+import sqlalchemy as sa
+import warnings
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+def table_exists(table: str) -> bool:
+    return _inspector().has_table(table)
+
+def column_exists(table: str, column: str) -> bool:
+    return any(c["name"] == column for c in _inspector().get_columns(table))
+
+def _indexes(table: str):
+    # SQLite expression indexes can't be reflected; they are created with IF NOT EXISTS instead
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "Skipped unsupported reflection of expression-based index", sa.exc.SAWarning)
+        return _inspector().get_indexes(table)
+
+def index_exists(table: str, index: str) -> bool:
+    return any(i["name"] == index for i in _indexes(table))
+
+def index_is_unique(table: str, index: str) -> bool:
+    return any(i["name"] == index and i["unique"] for i in _indexes(table))
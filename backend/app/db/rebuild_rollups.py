@@ -0,0 +1,18 @@
+import asyncio
+import sys
+import os
+
+# Add the parent directory to sys.path to allow imports from app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.db.session import AsyncSessionLocal
+from app.services.analytics_service import rebuild_rollups
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        print("Rebuilding conversation rollups...")
+        rows = await rebuild_rollups(db)
+        print(f"Rebuild completed! {rows} rollup rows")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 
 from app.db.session import AsyncSessionLocal
 from app.models.conversation import Conversation
+from app.services.analytics_service import rebuild_rollups
 
 STATES = ['SP', 'MG', 'GO', 'MT', 'PR', 'RS', 'BA', 'MS']
 PROBLEMS = ['Praga', 'Doença', 'Clima', 'Nutrição', 'Plantio', 'Colheita']
@@ -27,6 +28,8 @@ async def seed_analytics():
             db.add(conversation)
         
         await db.commit()
+        # Rows were inserted directly, so recount the dashboard rollups
+        await rebuild_rollups(db)
         print("Seeding completed!")
 
 if __name__ == "__main__":
@@ -13,12 +13,12 @@ async def seed_professionals():
         print("Seeding professionals data...")
         
         professionals = [
-            Professional(name="Dr. João Silva", type="Veterinário", state="SP", city="Ribeirão Preto", phone="(16) 99999-1111", specialties="Gado de corte, Equinos"),
-            Professional(name="Dra. Maria Oliveira", type="Veterinário", state="SP", city="Campinas", phone="(19) 98888-2222", specialties="Pequenos animais, Clínica geral"),
-            Professional(name="Eng. Pedro Santos", type="Agrônomo", state="MT", city="Sinop", phone="(66) 97777-3333", specialties="Soja, Milho, Pragas"),
-            Professional(name="Tec. Carlos Souza", type="Técnico Agrícola", state="MG", city="Uberaba", phone="(34) 96666-4444", specialties="Cafeicultura"),
-            Professional(name="AgroShop Insumos", type="Fornecedor", state="GO", city="Rio Verde", phone="(64) 3621-5555", specialties="Defensivos, Fertilizantes"),
-            Professional(name="Dr. Roberto Costa", type="Veterinário", state="MG", city="Belo Horizonte", phone="(31) 95555-6666", specialties="Gado de leite"),
+            Professional(name="Dr. João Silva", type="Veterinário", state="SP", city="Ribeirão Preto", latitude=-21.1775, longitude=-47.8103, phone="(16) 99999-1111", specialties="Gado de corte, Equinos"),
+            Professional(name="Dra. Maria Oliveira", type="Veterinário", state="SP", city="Campinas", latitude=-22.9056, longitude=-47.0608, phone="(19) 98888-2222", specialties="Pequenos animais, Clínica geral"),
+            Professional(name="Eng. Pedro Santos", type="Agrônomo", state="MT", city="Sinop", latitude=-11.8642, longitude=-55.5066, phone="(66) 97777-3333", specialties="Soja, Milho, Pragas"),
+            Professional(name="Tec. Carlos Souza", type="Técnico Agrícola", state="MG", city="Uberaba", latitude=-19.7472, longitude=-47.9381, phone="(34) 96666-4444", specialties="Cafeicultura"),
+            Professional(name="AgroShop Insumos", type="Fornecedor", state="GO", city="Rio Verde", latitude=-17.7923, longitude=-50.9192, phone="(64) 3621-5555", specialties="Defensivos, Fertilizantes"),
+            Professional(name="Dr. Roberto Costa", type="Veterinário", state="MG", city="Belo Horizonte", latitude=-19.9167, longitude=-43.9345, phone="(31) 95555-6666", specialties="Gado de leite"),
         ]
         
         for p in professionals:
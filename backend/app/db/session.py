@@ -1,6 +1,10 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import func
 from app.core.config import settings
+from datetime import datetime
 import re
 
 # Mask password for logging
@@ -16,3 +20,23 @@ AsyncSessionLocal = sessionmaker(
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
+
+def is_postgres() -> bool:
+    return settings.DATABASE_URL.startswith("postgresql")
+
+def dialect_insert(table):
+    """INSERT supporting on_conflict_do_nothing/do_update on both Postgres and SQLite"""
+    return pg_insert(table) if is_postgres() else sqlite_insert(table)
+
+def sortable_timestamp(expr):
+    """
+    Timestamp expression safe for keyset comparisons. SQLite keeps
+    timestamps as text in more than one format ("12:00:00" from
+    CURRENT_TIMESTAMP, "12:00:00.000000" from Python), so normalize there;
+    the SQLite-only expression indexes in models/conversation.py cover it.
+    """
+    return expr if is_postgres() else func.datetime(expr)
+
+def sortable_timestamp_param(value: datetime):
+    """Bind a cursor timestamp (see pagination.timestamp_value) for comparison with sortable_timestamp()"""
+    return value if is_postgres() else func.datetime(value.isoformat(" "))
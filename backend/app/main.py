@@ -1,11 +1,33 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.api_v1.api import api_router
+from app.services.config_service import config_cache
+from app.services.graph_api import start_graph_client, close_graph_client
+from app.services.ai_service import close_openai_clients
+from app.services.document_text import shutdown_extraction_pool
+from app.services.image_preprocessing import shutdown_image_pool
+from app.services.whatsapp_service import inbound_queue
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Per-worker resources
+    await config_cache.start_listener()
+    await start_graph_client()
+    await inbound_queue.start()
+    yield
+    await inbound_queue.stop()
+    await close_openai_clients()
+    await close_graph_client()
+    shutdown_extraction_pool()
+    shutdown_image_pool()
+    await config_cache.stop_listener()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Set all CORS enabled origins
@@ -1,3 +1,7 @@
 from .user import User
 from .conversation import Conversation, Message
-from .system_config import SystemConfig
+from .system_config import SystemConfig, SystemConfigVersion
+from .job import InboundJob
+from .analytics import ConversationRollup, TrendBaseline
+from .response_cache import ResponseCacheEntry
+from .image_cache import ImageAnalysisCacheEntry
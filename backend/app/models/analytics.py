@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Date, Float, UniqueConstraint
+from app.db.base import Base
+
+class ConversationRollup(Base):
+    """
+    Conversation counts per day, state and problem category, kept in step
+    with conversations by app.services.analytics_service.
+    """
+    __tablename__ = "conversation_rollups"
+    __table_args__ = (UniqueConstraint("bucket", "location_state", "problem_category", name="uq_conversation_rollup_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    bucket = Column(Date, nullable=False, index=True) # Day the conversation started (UTC)
+    location_state = Column(String, nullable=False, default="") # "" when unknown
+    problem_category = Column(String, nullable=False, default="") # "" when unknown
+    count = Column(Integer, nullable=False, default=0)
+
+class TrendBaseline(Base):
+    """
+    Exponentially weighted mean and variance of daily conversation counts
+    per state and problem category, advanced one day at a time up to
+    last_bucket.
+    """
+    __tablename__ = "trend_baselines"
+    __table_args__ = (UniqueConstraint("location_state", "problem_category", name="uq_trend_baseline_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    location_state = Column(String, nullable=False)
+    problem_category = Column(String, nullable=False)
+    mean = Column(Float, nullable=False, default=0.0)
+    variance = Column(Float, nullable=False, default=0.0)
+    observations = Column(Integer, nullable=False, default=0) # Days folded into the baseline
+    last_bucket = Column(Date, nullable=False) # Last day folded in
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+
+# Lookup bands per entry; near-duplicates share at least one
+NUM_BANDS = 8
+
+class CacheEntryMixin:
+    """
+    Columns shared by the AI response caches: an exact key, the namespace
+    the entry may be reused in, and the bands near-duplicate lookups
+    search by. Each cache adds the columns its distance is computed from.
+    """
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, nullable=False)
+    namespace = Column(String, nullable=False, index=True) # Prompt hash : knowledge sources hash
+    response = Column(Text, nullable=False)
+    band_0 = Column(String, nullable=False, index=True)
+    band_1 = Column(String, nullable=False, index=True)
+    band_2 = Column(String, nullable=False, index=True)
+    band_3 = Column(String, nullable=False, index=True)
+    band_4 = Column(String, nullable=False, index=True)
+    band_5 = Column(String, nullable=False, index=True)
+    band_6 = Column(String, nullable=False, index=True)
+    band_7 = Column(String, nullable=False, index=True)
+    hits = Column(Integer, nullable=False, default=0)
+
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    last_used_at = Column(DateTime(timezone=True), nullable=False, index=True) # LRU eviction
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
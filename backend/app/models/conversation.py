@@ -1,19 +1,38 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
 
+# Where location_state came from, most reliable last
+LOCATION_SOURCE_DDD = "ddd" # Area code of the WhatsApp number
+LOCATION_SOURCE_TEXT = "text" # State named in a message
+LOCATION_SOURCE_CITY = "city" # Municipality named in a message
+
 class Conversation(Base):
     __tablename__ = "conversations"
 
     id = Column(Integer, primary_key=True, index=True)
-    whatsapp_id = Column(String, index=True) # Phone number
+    whatsapp_id = Column(String, unique=True, index=True) # Phone number
     started_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Analytics fields
     location_state = Column(String, nullable=True, index=True) # UF (SP, MG, etc.)
     problem_category = Column(String, nullable=True, index=True) # Praga, Doença, etc.
+    location_source = Column(String, nullable=True) # ddd, text or city
+    location_city = Column(String, nullable=True) # Municipality from the gazetteer
+    latitude = Column(Float, nullable=True) # Municipality centroid
+    longitude = Column(Float, nullable=True)
+
+    # Denormalized for the chat list, updated with every message insert
+    last_message_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_message_preview = Column(String, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Rolling summary of the turns that no longer fit the prompt history
+    summary = Column(Text, nullable=True)
+    summary_through_id = Column(Integer, nullable=True) # Last message folded into the summary
+    summary_message_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     messages = relationship("Message", back_populates="conversation")
 
@@ -25,6 +44,19 @@ class Message(Base):
     content = Column(Text)
     role = Column(String) # user or assistant
     media_url = Column(String, nullable=True)
+    # WhatsApp message id of user messages, so a retried job doesn't log them twice
+    external_id = Column(String, unique=True, index=True, nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
     
     conversation = relationship("Conversation", back_populates="messages")
+
+# Keyset pagination: conversations by last message, messages by time within a conversation
+Index("ix_conversations_last_message_at", Conversation.last_message_at, Conversation.id)
+Index("ix_messages_conversation_timestamp", Message.conversation_id, Message.timestamp, Message.id)
+# SQLite orders by datetime(...) (see sortable_timestamp), which the plain indexes can't serve
+Index(
+    "ix_conversations_last_message_datetime", func.datetime(Conversation.last_message_at), Conversation.id
+).ddl_if(dialect="sqlite")
+Index(
+    "ix_messages_conversation_datetime", Message.conversation_id, func.datetime(Message.timestamp), Message.id
+).ddl_if(dialect="sqlite")
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, String
+from app.db.base import Base
+from app.models.cache_entry import CacheEntryMixin
+
+class ImageAnalysisCacheEntry(CacheEntryMixin, Base):
+    """
+    Vision analysis of an image, shared by every worker. band_* are the
+    bytes of the image's dHash, so near-duplicates share at least one.
+    """
+    __tablename__ = "image_analysis_cache_entries"
+
+    # key: namespace:dhash
+    dhash = Column(String, nullable=False) # 16 hex digits
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+class InboundJob(Base):
+    __tablename__ = "inbound_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dedup_key = Column(String, unique=True, nullable=True) # WhatsApp message id, makes webhook retries idempotent
+    group_key = Column(String, nullable=True, index=True) # Sender wa_id: jobs of a group are handled together
+    payload = Column(Text, nullable=False) # JSON message from the webhook
+    status = Column(String, nullable=False, default="pending", index=True) # pending, running, done, dead
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime(timezone=True), nullable=False, index=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True) # Visibility timeout while running
+    last_error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
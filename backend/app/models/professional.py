@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float
 from sqlalchemy.sql import func
 from app.db.base import Base
 
@@ -13,6 +13,8 @@ class Professional(Base):
     phone = Column(String, nullable=True)
     email = Column(String, nullable=True)
     specialties = Column(Text, nullable=True) # JSON or comma-separated string
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
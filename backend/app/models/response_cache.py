@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Text
+from app.db.base import Base
+from app.models.cache_entry import CacheEntryMixin
+
+class ResponseCacheEntry(CacheEntryMixin, Base):
+    """
+    AI answer to a question, shared by every worker. band_* hold the LSH
+    bands of the question's MinHash signature for near-duplicate lookups.
+    """
+    __tablename__ = "response_cache_entries"
+
+    # key: hash of namespace and normalized question
+    question = Column(Text, nullable=False) # Normalized question
@@ -8,3 +8,10 @@ class SystemConfig(Base):
     key = Column(String, unique=True, index=True, nullable=False)
     value = Column(Text, nullable=True)
     description = Column(String, nullable=True)
+
+class SystemConfigVersion(Base):
+    __tablename__ = "system_config_versions"
+
+    # Single row (id=1) bumped on every config write so workers can detect changes
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
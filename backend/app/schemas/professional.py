@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
@@ -10,6 +10,8 @@ class ProfessionalBase(BaseModel):
     phone: Optional[str] = None
     email: Optional[str] = None
     specialties: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class ProfessionalCreate(ProfessionalBase):
     pass
@@ -1,36 +1,202 @@
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional, Union
 from openai import AsyncOpenAI
 from app.core.config import settings
+from app.services.config_service import config_cache
+from app.services.image_preprocessing import PreparedImage
+import httpx
+import logging
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+logger = logging.getLogger(__name__)
 
-async def analyze_text(text: str, context: str = "", api_key: str = None) -> str:
+TEXT_SYSTEM_PROMPT = "Você é o AgenteAgro, um assistente especialista em agricultura e veterinária. Forneça conselhos práticos e técnicos. "
+TEXT_ERROR_REPLY = "Desculpe, estou com dificuldades para processar sua mensagem no momento."
+TEXT_INTERRUPTED_NOTE = "(Resposta interrompida. Por favor, envie a pergunta novamente.)"
+IMAGE_SYSTEM_PROMPT = "Você é um especialista agrícola. Analise esta imagem detalhadamente. Se for uma planta ou animal, identifique possíveis doenças, pragas ou problemas nutricionais. Se for um documento, transcreva e resuma o conteúdo."
+IMAGE_ERROR_REPLY = "Desculpe, não consegui analisar a imagem enviada."
+
+# Shared connection pool for every registered client
+_http_client: Optional[httpx.AsyncClient] = None
+# api_key -> client, least recently used first
+_clients: "OrderedDict[str, AsyncOpenAI]" = OrderedDict()
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+    return _http_client
+
+def get_openai_client(api_key: str) -> AsyncOpenAI:
+    """
+    Return a warm client for this API key. The key may come from the DB or
+    from env, so clients are kept per key in a bounded LRU registry.
+    """
+    client = _clients.get(api_key)
+    if client is not None:
+        _clients.move_to_end(api_key)
+        return client
+
+    client = AsyncOpenAI(api_key=api_key, http_client=_get_http_client())
+    _clients[api_key] = client
+    while len(_clients) > settings.OPENAI_CLIENT_REGISTRY_SIZE:
+        _clients.popitem(last=False)
+    return client
+
+def evict_openai_client(api_key: str):
+    _clients.pop(api_key, None)
+
+async def close_openai_clients():
+    global _http_client
+    _clients.clear()
+    http_client, _http_client = _http_client, None
+    if http_client is not None:
+        await http_client.aclose()
+
+def _on_config_change(key: str, old_value: Optional[str], new_value: Optional[str]):
+    # Drop the client of a rotated key (runs in every worker on reload)
+    if key == "openai_api_key" and old_value:
+        evict_openai_client(old_value)
+
+config_cache.on_change(_on_config_change)
+
+class StreamInterrupted(Exception):
+    """A streamed completion failed after some text had been produced"""
+
+async def _stream_completion(client: AsyncOpenAI, messages: List[dict]) -> AsyncIterator[str]:
     """
-    Analyze text using OpenAI GPT.
+    Text deltas of a streamed completion; the error reply if it fails before
+    any text, StreamInterrupted if it fails midway.
+    """
+    produced = False
+    try:
+        stream = await client.chat.completions.create(model="gpt-4o", messages=messages, stream=True)
+        async for event in stream:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                produced = True
+                yield delta
+    except Exception as e:
+        logger.error(f"Error streaming from OpenAI: {e}")
+        if produced:
+            raise StreamInterrupted(str(e)) from e
+        yield TEXT_ERROR_REPLY
+
+async def _single_chunk(text: str) -> AsyncIterator[str]:
+    yield text
+
+async def analyze_text(
+    text: str,
+    context: str = "",
+    api_key: str = None,
+    history: Optional[List[dict]] = None,
+    stream: bool = False,
+) -> Union[str, AsyncIterator[str]]:
+    """
+    Analyze text using OpenAI GPT. history holds earlier chat messages
+    ({"role", "content"}, oldest first) sent between the system prompt and text.
+    With stream=True, returns an async iterator of text deltas instead,
+    which raises StreamInterrupted if the answer is cut short.
     """
     current_api_key = api_key or settings.OPENAI_API_KEY
     
     if not current_api_key:
         debug_msg = f"Simulated AI Response: OpenAI API Key not configured. [Context: {context}]"
-        return debug_msg
+        return _single_chunk(debug_msg) if stream else debug_msg
 
+    messages = [
+        {"role": "system", "content": TEXT_SYSTEM_PROMPT + context},
+        *(history or []),
+        {"role": "user", "content": text}
+    ]
     try:
-        local_client = AsyncOpenAI(api_key=current_api_key)
+        client = get_openai_client(current_api_key)
+        if stream:
+            return _stream_completion(client, messages)
         
-        response = await local_client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="gpt-4o", # Upgraded to 4o for better reasoning
-            messages=[
-                {"role": "system", "content": "Você é o AgenteAgro, um assistente especialista em agricultura e veterinária. Forneça conselhos práticos e técnicos. " + context},
-                {"role": "user", "content": text}
-            ]
+            messages=messages
         )
         return response.choices[0].message.content
     except Exception as e:
         print(f"Error calling OpenAI: {e}")
-        return "Desculpe, estou com dificuldades para processar sua mensagem no momento."
+        return _single_chunk(TEXT_ERROR_REPLY) if stream else TEXT_ERROR_REPLY
+
+async def summarize_conversation(previous_summary: Optional[str], transcript: str, api_key: str = None) -> Optional[str]:
+    """
+    Fold a transcript of older turns into the running conversation summary.
+    Returns None when there is no API key or the call fails.
+    """
+    current_api_key = api_key or settings.OPENAI_API_KEY
+    if not current_api_key:
+        return None
 
-async def analyze_image(base64_image: str, context: str = "", api_key: str = None) -> str:
+    instruction = (
+        "Resuma a conversa entre um produtor rural e o AgenteAgro em poucas frases, "
+        "mantendo cultura ou criação, local, problemas relatados, recomendações dadas e pendências."
+    )
+    if previous_summary:
+        instruction += f"\n\nResumo anterior:\n{previous_summary}"
+
+    try:
+        client = get_openai_client(current_api_key)
+
+        response = await client.chat.completions.create(
+            model="gpt-4o-mini", # Summaries don't need the larger model
+            messages=[
+                {"role": "system", "content": instruction},
+                {"role": "user", "content": transcript}
+            ],
+            max_tokens=settings.SUMMARY_MAX_TOKENS
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"Error summarizing conversation: {e}")
+        return None
+
+async def extract_document_notes(chunk: str, instruction: str, part: int, parts: int, api_key: str = None) -> Optional[str]:
     """
-    Analyze image using OpenAI Vision.
+    Map step of long document analysis: the facts in one chunk, as short
+    notes. Returns None when there is no API key or the call fails.
+    """
+    current_api_key = api_key or settings.OPENAI_API_KEY
+    if not current_api_key:
+        return None
+
+    system_instruction = (
+        f"Você está lendo a parte {part} de {parts} de um documento agrícola. "
+        "Extraia em tópicos curtos tudo o que for relevante: valores de tabelas e análises "
+        "(com unidades), diagnósticos, recomendações, doses e datas. Não invente dados."
+    )
+    if instruction:
+        system_instruction += f" Pedido do usuário: {instruction}"
+
+    try:
+        client = get_openai_client(current_api_key)
+
+        response = await client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {"role": "system", "content": system_instruction},
+                {"role": "user", "content": chunk}
+            ],
+            max_tokens=settings.DOCUMENT_MAP_MAX_TOKENS
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"Error extracting document notes: {e}")
+        return None
+
+async def analyze_image(base64_image: Union[str, List[str], PreparedImage, List[PreparedImage]], context: str = "", api_key: str = None) -> str:
+    """
+    Analyze image using OpenAI Vision. Accepts several images sent together,
+    as base64 JPEG or preprocessed (which also sets the detail level).
     """
     current_api_key = api_key or settings.OPENAI_API_KEY
     
@@ -38,25 +204,31 @@ async def analyze_image(base64_image: str, context: str = "", api_key: str = Non
         return "Simulated Vision Response: OpenAI API Key not configured."
 
     try:
-        local_client = AsyncOpenAI(api_key=current_api_key)
+        client = get_openai_client(current_api_key)
         
-        system_instruction = "Você é um especialista agrícola. Analise esta imagem detalhadamente. Se for uma planta ou animal, identifique possíveis doenças, pragas ou problemas nutricionais. Se for um documento, transcreva e resuma o conteúdo."
+        images = base64_image if isinstance(base64_image, list) else [base64_image]
+
+        system_instruction = IMAGE_SYSTEM_PROMPT
         if context:
             system_instruction += f" {context}"
 
-        response = await local_client.chat.completions.create(
+        response = await client.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {
                     "role": "user",
                     "content": [
-                        {"type": "text", "text": system_instruction},
+                        {"type": "text", "text": system_instruction}
+                    ] + [
                         {
                             "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
+                            "image_url": (
+                                {"url": image.data_url(), "detail": image.detail}
+                                if isinstance(image, PreparedImage)
+                                else {"url": f"data:image/jpeg;base64,{image}"}
+                            )
                         }
+                        for image in images
                     ]
                 }
             ],
@@ -65,4 +237,4 @@ async def analyze_image(base64_image: str, context: str = "", api_key: str = Non
         return response.choices[0].message.content
     except Exception as e:
         print(f"Error calling OpenAI Vision: {e}")
-        return "Desculpe, não consegui analisar a imagem enviada."
+        return IMAGE_ERROR_REPLY
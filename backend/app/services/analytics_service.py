@@ -0,0 +1,318 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, func, insert, text, tuple_, update
+from app.core.config import settings
+from app.db.session import dialect_insert, is_postgres
+from app.models.analytics import ConversationRollup, TrendBaseline
+from app.models.conversation import Conversation
+from app.models.professional import Professional
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from math import sqrt
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rollup key for a missing state or category
+UNKNOWN = ""
+
+def rollup_bucket(started_at: Optional[datetime]) -> date:
+    """UTC day a conversation is counted in"""
+    if started_at is None:
+        return datetime.now(timezone.utc).date()
+    if started_at.tzinfo is not None:
+        started_at = started_at.astimezone(timezone.utc)
+    return started_at.date()
+
+async def _add_to_rollup(db: AsyncSession, bucket: date, state: Optional[str], category: Optional[str], delta: int):
+    key = dict(bucket=bucket, location_state=state or UNKNOWN, problem_category=category or UNKNOWN)
+    if delta > 0:
+        await db.execute(
+            dialect_insert(ConversationRollup)
+            .values(**key, count=delta)
+            .on_conflict_do_update(
+                index_elements=["bucket", "location_state", "problem_category"],
+                set_={"count": ConversationRollup.count + delta},
+            )
+        )
+    else:
+        await db.execute(
+            update(ConversationRollup)
+            .where(
+                ConversationRollup.bucket == key["bucket"],
+                ConversationRollup.location_state == key["location_state"],
+                ConversationRollup.problem_category == key["problem_category"],
+            )
+            .values(count=ConversationRollup.count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+async def count_conversations(db: AsyncSession) -> int:
+    """Total conversations from the rollups, without scanning conversations"""
+    result = await db.execute(select(func.coalesce(func.sum(ConversationRollup.count), 0)))
+    return result.scalar()
+
+async def record_new_conversation(db: AsyncSession, started_at: Optional[datetime], state: Optional[str], category: Optional[str] = None):
+    """
+    Count a new conversation. Call in the transaction that inserts it.
+    """
+    await _add_to_rollup(db, rollup_bucket(started_at), state, category, 1)
+
+async def record_reclassification(
+    db: AsyncSession,
+    started_at: Optional[datetime],
+    old: Tuple[Optional[str], Optional[str]],
+    new: Tuple[Optional[str], Optional[str]],
+):
+    """
+    Move a conversation from its old (state, category) counter to the new
+    one. Call in the transaction that updates the conversation.
+    """
+    if (old[0] or UNKNOWN, old[1] or UNKNOWN) == (new[0] or UNKNOWN, new[1] or UNKNOWN):
+        return
+    bucket = rollup_bucket(started_at)
+    await _add_to_rollup(db, bucket, old[0], old[1], -1)
+    await _add_to_rollup(db, bucket, new[0], new[1], 1)
+
+async def rebuild_rollups(db: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    Recompute all rollups from the conversations table and commit.
+    Returns the number of rollup rows written.
+    """
+    if is_postgres():
+        # Writers that update a conversation wait here, and apply their
+        # delta on top of the rebuilt counts
+        await db.execute(text("LOCK TABLE conversation_rollups IN EXCLUSIVE MODE"))
+    await db.execute(delete(ConversationRollup))
+
+    counts: Counter = Counter()
+    result = await db.stream(select(Conversation.started_at, Conversation.location_state, Conversation.problem_category))
+    async for started_at, state, category in result:
+        counts[(rollup_bucket(started_at), state or UNKNOWN, category or UNKNOWN)] += 1
+
+    rows = [
+        {"bucket": bucket, "location_state": state, "problem_category": category, "count": count}
+        for (bucket, state, category), count in counts.items()
+    ]
+    for start in range(0, len(rows), batch_size):
+        await db.execute(insert(ConversationRollup), rows[start:start + batch_size])
+    await db.commit()
+    logger.info(f"Rebuilt {len(rows)} conversation rollups")
+    return len(rows)
+
+# Day through which this worker already advanced the trend baselines
+_baselines_through: Optional[date] = None
+
+async def advance_trend_baselines(db: AsyncSession, through: date, alpha: float = settings.TREND_EWMA_ALPHA) -> int:
+    """
+    Fold every day up to and including `through` into the EWMA baselines
+    and commit. Each baseline only reads the days after its last_bucket,
+    so history is read once. Returns the number of baselines advanced.
+    """
+    global _baselines_through
+    if _baselines_through is not None and _baselines_through >= through:
+        return 0
+
+    first_day = (await db.execute(select(func.min(ConversationRollup.bucket)))).scalar()
+    if first_day is None:
+        return 0
+    known = (ConversationRollup.location_state != UNKNOWN, ConversationRollup.problem_category != UNKNOWN)
+
+    result = await db.execute(
+        select(TrendBaseline.location_state, TrendBaseline.problem_category, TrendBaseline.mean,
+               TrendBaseline.variance, TrendBaseline.observations, TrendBaseline.last_bucket)
+    )
+    baselines = {(row[0], row[1]): list(row[2:]) for row in result.all()}
+    # Pairs seen for the first time start from the first day of data with a zero baseline
+    result = await db.execute(
+        select(ConversationRollup.location_state, ConversationRollup.problem_category)
+        .where(*known, ConversationRollup.bucket <= through)
+        .distinct()
+    )
+    new_keys = [tuple(key) for key in result.all() if tuple(key) not in baselines]
+
+    pair = tuple_(ConversationRollup.location_state, ConversationRollup.problem_category)
+    columns = (ConversationRollup.bucket, ConversationRollup.location_state, ConversationRollup.problem_category, ConversationRollup.count)
+    counts: Dict[Tuple[date, str, str], int] = {}
+    # Known pairs continue from their own last_bucket (they normally share one)
+    pending = [b[3] for b in baselines.values() if b[3] < through]
+    if pending:
+        query = select(*columns).where(*known, ConversationRollup.bucket > min(pending), ConversationRollup.bucket <= through)
+        if new_keys:
+            query = query.where(pair.not_in(new_keys))
+        result = await db.execute(query)
+        counts.update({(row[0], row[1], row[2]): row[3] for row in result.all()})
+    # Only new pairs read their whole history
+    if new_keys:
+        result = await db.execute(select(*columns).where(pair.in_(new_keys), ConversationRollup.bucket <= through))
+        counts.update({(row[0], row[1], row[2]): row[3] for row in result.all()})
+        for key in new_keys:
+            baselines[key] = [0.0, 0.0, 0, first_day - timedelta(days=1)]
+
+    keys = list(baselines)
+    means = [baselines[k][0] for k in keys]
+    variances = [baselines[k][1] for k in keys]
+    observations = [baselines[k][2] for k in keys]
+    last = [baselines[k][3] for k in keys]
+    advanced = [False] * len(keys)
+    for i, (state, category) in enumerate(keys):
+        day = last[i] + timedelta(days=1)
+        while day <= through:
+            diff = counts.get((day, state, category), 0) - means[i]
+            increment = alpha * diff
+            means[i] += increment
+            variances[i] = (1 - alpha) * (variances[i] + diff * increment)
+            observations[i] += 1
+            last[i] = day
+            advanced[i] = True
+            day += timedelta(days=1)
+
+    rows = [
+        {"location_state": k[0], "problem_category": k[1], "mean": means[i], "variance": variances[i],
+         "observations": observations[i], "last_bucket": last[i]}
+        for i, k in enumerate(keys) if advanced[i]
+    ]
+    if rows:
+        stmt = dialect_insert(TrendBaseline).values(rows)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["location_state", "problem_category"],
+                set_={c: stmt.excluded[c] for c in ("mean", "variance", "observations", "last_bucket")},
+                # Another worker may have advanced further already
+                where=TrendBaseline.last_bucket < stmt.excluded.last_bucket,
+            )
+        )
+    await db.commit()
+    _baselines_through = through
+    return len(rows)
+
+def period_start(day: date, granularity: str) -> date:
+    """First day of the day or ISO week (Monday) containing `day`"""
+    return day - timedelta(days=day.weekday()) if granularity == "week" else day
+
+async def get_trends(
+    db: AsyncSession,
+    granularity: str = "day",
+    periods: int = 14,
+    state: Optional[str] = None,
+    category: Optional[str] = None,
+    threshold: float = settings.TREND_ANOMALY_Z,
+    min_history: int = settings.TREND_MIN_HISTORY_DAYS,
+) -> Dict[str, Any]:
+    """
+    Conversation counts per state x category over the last `periods` days
+    or weeks, with a z-score of the current period against the EWMA
+    baseline of completed days. Series are sorted by z-score, highest first.
+    """
+    today = datetime.now(timezone.utc).date()
+    await advance_trend_baselines(db, today - timedelta(days=1))
+
+    step = timedelta(days=7 if granularity == "week" else 1)
+    current = period_start(today, granularity)
+    starts = [current - step * k for k in range(periods - 1, -1, -1)]
+    position = {start: i for i, start in enumerate(starts)}
+
+    filters = [ConversationRollup.location_state != UNKNOWN, ConversationRollup.problem_category != UNKNOWN]
+    if state:
+        filters.append(ConversationRollup.location_state == state)
+    if category:
+        filters.append(ConversationRollup.problem_category == category)
+    result = await db.execute(
+        select(ConversationRollup.bucket, ConversationRollup.location_state, ConversationRollup.problem_category, ConversationRollup.count)
+        .where(*filters, ConversationRollup.bucket >= starts[0])
+    )
+    series: Dict[Tuple[str, str], List[int]] = {}
+    for bucket, row_state, row_category, count in result.all():
+        i = position.get(period_start(bucket, granularity))
+        if i is not None:
+            series.setdefault((row_state, row_category), [0] * periods)[i] += count
+
+    result = await db.execute(
+        select(TrendBaseline.location_state, TrendBaseline.problem_category, TrendBaseline.mean,
+               TrendBaseline.variance, TrendBaseline.observations)
+    )
+    baselines = {(row[0], row[1]): row[2:] for row in result.all()}
+
+    # The current period is still running: compare with the days elapsed so far
+    elapsed = (today - current).days + 1
+    items = []
+    for (row_state, row_category), counts in series.items():
+        mean, variance, observations = baselines.get((row_state, row_category), (0.0, 0.0, 0))
+        expected = mean * elapsed
+        z_score = None
+        if observations >= min_history:
+            # Poisson floor keeps a couple of reports on a quiet baseline from looking huge
+            z_score = round((counts[-1] - expected) / sqrt(max(variance * elapsed, expected, 1.0)), 2)
+        items.append({
+            "state": row_state,
+            "category": row_category,
+            "counts": counts,
+            "current": counts[-1],
+            "expected": round(expected, 2),
+            "z_score": z_score,
+            "anomaly": z_score is not None and z_score >= threshold,
+        })
+    items.sort(key=lambda item: (item["z_score"] is None, -(item["z_score"] or 0), -item["current"]))
+
+    return {
+        "granularity": granularity,
+        "periods": [start.isoformat() for start in starts],
+        "series": items,
+    }
+
+async def get_dashboard_summary(db: AsyncSession, days: int = 7) -> Dict[str, Any]:
+    """
+    Aggregates for the dashboard cards and chart. Everything except the
+    active counts comes from the rollups.
+    """
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    first_day = today - timedelta(days=days - 1)
+
+    result = await db.execute(
+        select(ConversationRollup.location_state, ConversationRollup.problem_category, func.sum(ConversationRollup.count))
+        .group_by(ConversationRollup.location_state, ConversationRollup.problem_category)
+    )
+    total = 0
+    by_state: Counter = Counter()
+    by_category: Counter = Counter()
+    for state, category, count in result.all():
+        total += count
+        if state != UNKNOWN:
+            by_state[state] += count
+        if category != UNKNOWN:
+            by_category[category] += count
+
+    daily = {first_day + timedelta(days=i): {"conversations": 0, "with_problem": 0} for i in range(days)}
+    result = await db.execute(
+        select(ConversationRollup.bucket, ConversationRollup.problem_category, ConversationRollup.count)
+        .where(ConversationRollup.bucket >= first_day)
+    )
+    for bucket, category, count in result.all():
+        if bucket in daily:
+            daily[bucket]["conversations"] += count
+            if category != UNKNOWN:
+                daily[bucket]["with_problem"] += count
+
+    # One conversation per WhatsApp number, so active conversations are active users
+    last_activity = Conversation.last_message_at
+    start_of_today = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+    result = await db.execute(
+        select(
+            func.count(Conversation.id).filter(last_activity >= start_of_today),
+            func.count(Conversation.id).filter(last_activity >= now - timedelta(days=days)),
+        )
+    )
+    active_today, active_week = result.one()
+    professionals = (await db.execute(select(func.count(Professional.id)))).scalar()
+
+    return {
+        "generated_at": now.isoformat(),
+        "totals": {"conversations": total, "professionals": professionals},
+        "today": {"new_conversations": daily[today]["conversations"], "active_conversations": active_today},
+        "week": {"new_conversations": sum(d["conversations"] for d in daily.values()), "active_users": active_week},
+        "by_category": [{"category": c, "count": n} for c, n in by_category.most_common()],
+        "by_state": [{"state": s, "count": n} for s, n in by_state.most_common()],
+        "daily": [{"date": d.isoformat(), **counts} for d, counts in daily.items()],
+    }
@@ -0,0 +1,29 @@
+from typing import Optional
+
+# Brazilian DDD (area code) -> UF. DDD 61 also covers part of Goiás around
+# Brasília; it is mapped to DF.
+DDD_STATES = {
+    **{ddd: 'SP' for ddd in (11, 12, 13, 14, 15, 16, 17, 18, 19)},
+    **{ddd: 'RJ' for ddd in (21, 22, 24)},
+    **{ddd: 'ES' for ddd in (27, 28)},
+    **{ddd: 'MG' for ddd in (31, 32, 33, 34, 35, 37, 38)},
+    **{ddd: 'PR' for ddd in (41, 42, 43, 44, 45, 46)},
+    **{ddd: 'SC' for ddd in (47, 48, 49)},
+    **{ddd: 'RS' for ddd in (51, 53, 54, 55)},
+    61: 'DF', 62: 'GO', 64: 'GO', 63: 'TO', 65: 'MT', 66: 'MT', 67: 'MS', 68: 'AC', 69: 'RO',
+    **{ddd: 'BA' for ddd in (71, 73, 74, 75, 77)},
+    79: 'SE', 81: 'PE', 87: 'PE', 82: 'AL', 83: 'PB', 84: 'RN', 85: 'CE', 88: 'CE', 86: 'PI', 89: 'PI',
+    **{ddd: 'PA' for ddd in (91, 93, 94)},
+    92: 'AM', 97: 'AM', 95: 'RR', 96: 'AP', 98: 'MA', 99: 'MA',
+}
+
+def state_from_whatsapp_id(wa_id: Optional[str]) -> Optional[str]:
+    """
+    UF for a Brazilian WhatsApp id (55 + DDD + 8 or 9 digit number), else None.
+    """
+    if not wa_id:
+        return None
+    digits = "".join(c for c in wa_id if c.isdigit())
+    if not digits.startswith("55") or len(digits) not in (12, 13):
+        return None
+    return DDD_STATES.get(int(digits[2:4]))
@@ -0,0 +1,263 @@
+from collections import OrderedDict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, func, or_, update
+from app.db.session import dialect_insert
+from app.models.cache_entry import NUM_BANDS
+from app.models.system_config import SystemConfig
+from app.services.config_service import bump_config_version, config_cache
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Max candidates checked per near-duplicate lookup in the DB
+DB_CANDIDATES = 20
+# Puts between two trims of the shared table (expired rows are never
+# returned meanwhile, so trimming only bounds its size)
+TRIM_EVERY = 50
+
+class CacheLookup(NamedTuple):
+    key: str
+    namespace: str
+    features: Any # What distance() compares (shingle set, dHash)
+    bands: List[str]
+    columns: Dict[str, Any] # The cache's own columns for a new entry
+
+class _Entry(NamedTuple):
+    namespace: str
+    features: Any
+    bands: List[str]
+    response: str
+    expires_at: float # time.time()
+
+class BandedCache:
+    """
+    Cache of AI responses with near-duplicate lookups.
+
+    An exact match on the key is tried first, then the closest entry within
+    max_distance among those sharing a band with the lookup. Each worker
+    keeps an LRU in memory in front of the shared DB table (a
+    CacheEntryMixin model); both tiers expire entries after the TTL, and every
+    trim_every puts the table is trimmed to its least recently used
+    max_db_entries. A flush bumps generation_key in SystemConfig so every
+    worker drops its memory.
+
+    Subclasses build the CacheLookups and define distance() and how
+    features are read back from their own columns.
+    """
+
+    model: Any = None
+    generation_key = ""
+    label = "" # e.g. "response cache", for the generation description
+
+    def __init__(self, max_entries: int, max_db_entries: int, ttl: float, max_distance: float):
+        self.max_entries = max_entries
+        self.max_db_entries = max_db_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.trim_every = TRIM_EVERY
+        self._puts_since_trim = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._band_index: Dict[Tuple[str, int, str], Set[str]] = {}
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def distance(self, a: Any, b: Any) -> float:
+        raise NotImplementedError
+
+    def row_features(self, row) -> Any:
+        """Features of a stored entry, from the subclass's own columns"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, float]:
+        """Counters of this worker since start (or the last flush)"""
+        hits = self.exact_hits + self.near_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "memory_entries": len(self._entries),
+        }
+
+    def clear_memory(self):
+        self._entries.clear()
+        self._band_index.clear()
+
+    def reset_stats(self):
+        self.exact_hits = self.near_hits = self.misses = self.stores = self.evictions = 0
+
+    def on_config_change(self, key: str, old_value: Optional[str], new_value: Optional[str]):
+        # Another worker flushed the cache
+        if key == self.generation_key:
+            self.clear_memory()
+
+    def _remember(self, key: str, entry: _Entry):
+        self._forget(key)
+        self._entries[key] = entry
+        for i, band in enumerate(entry.bands):
+            self._band_index.setdefault((entry.namespace, i, band), set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._forget(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for i, band in enumerate(entry.bands):
+            keys = self._band_index.get((entry.namespace, i, band))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._band_index[(entry.namespace, i, band)]
+
+    def _closest(self, lookup: CacheLookup, candidates) -> Any:
+        """The (features, item) candidate closest to lookup within max_distance"""
+        best, best_distance = None, None
+        for features, item in candidates:
+            distance = self.distance(lookup.features, features)
+            if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                best, best_distance = item, distance
+        return best
+
+    def _memory_get(self, lookup: CacheLookup, now: float) -> Tuple[Optional[str], bool]:
+        """(response, exact) from this worker's memory"""
+        entry = self._entries.get(lookup.key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(lookup.key)
+                return entry.response, True
+            self._forget(lookup.key)
+
+        candidates: Set[str] = set()
+        for i, band in enumerate(lookup.bands):
+            candidates |= self._band_index.get((lookup.namespace, i, band), set())
+        best_key = self._closest(
+            lookup,
+            ((self._entries[key].features, key) for key in candidates if self._entries[key].expires_at > now),
+        )
+        if best_key is None:
+            return None, False
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key].response, False
+
+    async def _db_get(self, db: AsyncSession, lookup: CacheLookup, now: datetime) -> Tuple[Any, bool]:
+        model = self.model
+        result = await db.execute(select(model).where(model.key == lookup.key, model.expires_at > now))
+        row = result.scalars().first()
+        if row is not None:
+            return row, True
+
+        band_columns = [getattr(model, f"band_{i}") for i in range(NUM_BANDS)]
+        result = await db.execute(
+            select(model)
+            .where(
+                model.namespace == lookup.namespace,
+                model.expires_at > now,
+                or_(*[column == band for column, band in zip(band_columns, lookup.bands)]),
+            )
+            .order_by(model.last_used_at.desc())
+            .limit(DB_CANDIDATES)
+        )
+        return self._closest(lookup, ((self.row_features(row), row) for row in result.scalars().all())), False
+
+    async def _get(self, db: AsyncSession, lookup: CacheLookup) -> Optional[str]:
+        """
+        Cached response for lookup (or a near-identical one), None on a miss.
+        A DB hit refreshes the entry's LRU position; the caller commits.
+        """
+        response, exact = self._memory_get(lookup, time.time())
+        if response is None:
+            now = datetime.now(timezone.utc)
+            row, exact = await self._db_get(db, lookup, now)
+            if row is not None:
+                response = row.response
+                await db.execute(
+                    update(self.model)
+                    .where(self.model.id == row.id)
+                    .values(hits=self.model.hits + 1, last_used_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+                expires_at = row.expires_at if row.expires_at.tzinfo else row.expires_at.replace(tzinfo=timezone.utc)
+                bands = [getattr(row, f"band_{i}") for i in range(NUM_BANDS)]
+                self._remember(row.key, _Entry(row.namespace, self.row_features(row), bands, response, expires_at.timestamp()))
+
+        if response is None:
+            self.misses += 1
+        elif exact:
+            self.exact_hits += 1
+        else:
+            self.near_hits += 1
+        return response
+
+    async def _put(self, db: AsyncSession, lookup: CacheLookup, response: str):
+        """Store a response in memory and in the shared table. The caller commits."""
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+        self._remember(lookup.key, _Entry(lookup.namespace, lookup.features, lookup.bands, response, expires_at.timestamp()))
+        self.stores += 1
+
+        values = dict(
+            namespace=lookup.namespace,
+            response=response,
+            last_used_at=now,
+            expires_at=expires_at,
+            **lookup.columns,
+            **{f"band_{i}": band for i, band in enumerate(lookup.bands)},
+        )
+        await db.execute(
+            dialect_insert(self.model)
+            .values(key=lookup.key, hits=0, created_at=now, **values)
+            .on_conflict_do_update(index_elements=["key"], set_=values)
+        )
+        self._puts_since_trim += 1
+        if self._puts_since_trim >= self.trim_every:
+            await self._trim(db, now)
+
+    async def _trim(self, db: AsyncSession, now: datetime):
+        self._puts_since_trim = 0
+        model = self.model
+        await db.execute(delete(model).where(model.expires_at <= now))
+        count = (await db.execute(select(func.count(model.id)))).scalar() or 0
+        excess = count - self.max_db_entries
+        if excess > 0:
+            oldest = select(model.id).order_by(model.last_used_at.asc()).limit(excess)
+            await db.execute(
+                delete(model)
+                .where(model.id.in_(oldest.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+
+    async def count_db_entries(self, db: AsyncSession) -> int:
+        result = await db.execute(select(func.count(self.model.id)))
+        return result.scalar() or 0
+
+    async def flush(self, db: AsyncSession) -> int:
+        """
+        Drop every cached response: the shared table now, the memory of other
+        workers on their next config reload. Returns the rows deleted.
+        """
+        result = await db.execute(delete(self.model))
+        generation = str(time.time_ns())
+        await db.execute(
+            dialect_insert(SystemConfig)
+            .values(key=self.generation_key, value=generation, description=f"Bumped when the {self.label} is flushed")
+            .on_conflict_do_update(index_elements=["key"], set_={"value": generation})
+        )
+        await bump_config_version(db)
+        await db.commit()
+        config_cache.invalidate()
+        self.clear_memory()
+        self.reset_stats()
+        return result.rowcount
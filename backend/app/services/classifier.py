@@ -0,0 +1,229 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import json
+import logging
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# SystemConfig key holding an optional JSON lexicon, e.g.
+# {"categories": {"Praga": ["praga", "lagarta"]}, "states": {"MT": ["nortao"]}}
+CLASSIFIER_CONFIG_KEY = "classifier_keywords"
+
+STATE_NAMES = {
+    'AC': 'Acre', 'AL': 'Alagoas', 'AP': 'Amapá', 'AM': 'Amazonas', 'BA': 'Bahia',
+    'CE': 'Ceará', 'DF': 'Distrito Federal', 'ES': 'Espírito Santo', 'GO': 'Goiás',
+    'MA': 'Maranhão', 'MT': 'Mato Grosso', 'MS': 'Mato Grosso do Sul', 'MG': 'Minas Gerais',
+    'PA': 'Pará', 'PB': 'Paraíba', 'PR': 'Paraná', 'PE': 'Pernambuco', 'PI': 'Piauí',
+    'RJ': 'Rio de Janeiro', 'RN': 'Rio Grande do Norte', 'RS': 'Rio Grande do Sul',
+    'RO': 'Rondônia', 'RR': 'Roraima', 'SC': 'Santa Catarina', 'SP': 'São Paulo',
+    'SE': 'Sergipe', 'TO': 'Tocantins'
+}
+
+BRAZIL_STATES = list(STATE_NAMES)
+
+DEFAULT_STATE_ALIASES = {uf: [name] for uf, name in STATE_NAMES.items()}
+# "Pará" folds to "para", which is far more common as a preposition
+DEFAULT_STATE_ALIASES['PA'] = ['estado do Pará']
+
+DEFAULT_CATEGORIES = {
+    'Praga': ['praga', 'inseto', 'lagarta', 'bicho', 'mosca', 'pulgão', 'pulgões'],
+    'Doença': ['doença', 'fungo', 'bactéria', 'virus', 'vírus', 'ferrugem', 'mancha'],
+    'Clima': ['clima', 'chuva', 'seca', 'sol', 'geada', 'granizo', 'tempo'],
+    'Nutrição': ['nutrição', 'adubo', 'fertilizante', 'calcário', 'deficiência', 'amarelando'],
+    'Plantio': ['plantio', 'semear', 'semeadura', 'espaçamento', 'semente'],
+    'Colheita': ['colheita', 'colher', 'produção', 'produtividade', 'safra']
+}
+
+# UF codes that are also common words ("se", "to", "pa") when a message is in all caps
+AMBIGUOUS_CODES = {'AC', 'AL', 'AM', 'ES', 'MA', 'PA', 'PI', 'SE', 'TO'}
+# UF codes that are words or chat shorthand once lowercased and accent-folded
+# ("pé", "tô", "cê", "má", "go"), so they only count in uppercase
+LOWERCASE_AMBIGUOUS_CODES = {'AM', 'AP', 'CE', 'ES', 'GO', 'MA', 'PA', 'PE', 'SE', 'TO'}
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents (drops other non-ASCII characters)"""
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+
+def _word_table(lower: bool) -> bytes:
+    """
+    bytes.translate table over Latin-1: accented letters become their base
+    letter ("ã" -> "a"), anything that isn't a letter or digit a space.
+    """
+    table = bytearray(b" " * 256)
+    for code in range(256):
+        base = unicodedata.normalize("NFKD", chr(code)).encode("ascii", "ignore")
+        if len(base) == 1 and base.isalnum():
+            table[code] = base.lower()[0] if lower else base[0]
+    return bytes(table)
+
+_WORDS = _word_table(lower=False)
+_LOWER_WORDS = _word_table(lower=True)
+
+# Lowercased UF code -> the code as written
+_UF_CODES = {code.lower().encode(): code.encode() for code in STATE_NAMES}
+_LOWER_UF_CODES = frozenset(_UF_CODES)
+_AMBIGUOUS_UF_CODES = frozenset(code.lower().encode() for code in AMBIGUOUS_CODES)
+_CASELESS_UF_CODES = _LOWER_UF_CODES - frozenset(code.lower().encode() for code in LOWERCASE_AMBIGUOUS_CODES)
+
+def _find_word(raw: bytes, word: bytes) -> int:
+    """Offset of word as a whole word in the Latin-1 text raw, or -1"""
+    start = raw.find(word)
+    while start != -1:
+        end = start + len(word)
+        if (start == 0 or _WORDS[raw[start - 1]] == 32) and (end == len(raw) or _WORDS[raw[end]] == 32):
+            return start
+        start = raw.find(word, start + 1)
+    return -1
+
+def _phrase_words(phrase: str) -> Tuple[bytes, ...]:
+    """A lexicon entry split the way messages are ("bicho-mineiro" -> bicho, mineiro)"""
+    return tuple(fold(phrase).encode("ascii").translate(_LOWER_WORDS).split())
+
+class Classification(NamedTuple):
+    state: Optional[str]
+    category: Optional[str]
+    scores: Dict[str, int]
+
+class TextClassifier:
+    """
+    Keyword matcher for state and problem category.
+
+    A message is split into accent-folded words with one Latin-1
+    encode/translate/split (characters outside Latin-1 separate words)
+    and intersected with the set of words that can start a keyword or
+    state name, all in C, so the Python work only grows with the words
+    that matter. Keywords also match their plural (-s/-es), and the
+    longest phrase wins ("mato grosso do sul").
+
+    UF codes match in any case ("sinop mt"), except those that are also
+    words when lowercased: "GO" is Goiás, "go" or "Go" are not.
+    """
+
+    def __init__(self, categories: Dict[str, List[str]], state_aliases: Dict[str, List[str]]):
+        self.categories = list(categories)
+        lookup: Dict[Tuple[bytes, ...], Tuple[bool, str]] = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                lookup.setdefault(_phrase_words(keyword), (False, category))
+        for uf, names in state_aliases.items():
+            for name in names:
+                lookup[_phrase_words(name)] = (True, uf)
+        lookup.pop((), None)
+
+        # First word (or its plural, for one-word phrases) -> (rest of the
+        # phrase, is_state, label), longest phrase first
+        self._phrases: Dict[bytes, List[Tuple[Tuple[bytes, ...], bool, str]]] = {}
+        for phrase, (is_state, label) in sorted(lookup.items(), key=lambda item: -len(item[0])):
+            first, rest = phrase[0], phrase[1:]
+            variants = (first,) if rest else (first, first + b"s", first + b"es")
+            for word in variants:
+                candidates = self._phrases.setdefault(word, [])
+                if word == first or all(r != rest for r, _, _ in candidates):
+                    candidates.append((rest, is_state, label))
+        # One-word category keywords are just counted
+        self._counted: Dict[bytes, str] = {}
+        for word, candidates in list(self._phrases.items()):
+            if len(candidates) == 1 and not candidates[0][0] and not candidates[0][1]:
+                self._counted[word] = candidates[0][2]
+                del self._phrases[word]
+        self._scan_words = frozenset(self._counted) | frozenset(self._phrases) | _LOWER_UF_CODES
+
+    @staticmethod
+    def _rest_matches(words: List[bytes], start: int, rest: Tuple[bytes, ...]) -> bool:
+        if start + len(rest) > len(words):
+            return False
+        for offset, expected in enumerate(rest):
+            word = words[start + offset]
+            if word != expected and not (offset == len(rest) - 1 and word in (expected + b"s", expected + b"es")):
+                return False
+        return True
+
+    def classify(self, text: str) -> Classification:
+        if not text:
+            return Classification(None, None, {})
+
+        raw = text.encode("latin-1", "replace")
+        words = raw.translate(_LOWER_WORDS).split()
+
+        # The only per-word Python work: one set lookup
+        scan = self._scan_words
+        hits = [word for word in words if word in scan]
+
+        state = None
+        state_pos = None
+        scores: Dict[str, int] = {}
+        phrase_starts = set()
+        lower_codes = set()
+        for word in hits:
+            label = self._counted.get(word)
+            if label is not None:
+                scores[label] = scores.get(label, 0) + 1
+            elif word in self._phrases:
+                phrase_starts.add(word)
+            if word in _LOWER_UF_CODES:
+                lower_codes.add(word)
+
+        for word in phrase_starts:
+            candidates = self._phrases[word]
+            position = words.index(word)
+            while True:
+                for rest, is_state, label in candidates:
+                    if self._rest_matches(words, position + 1, rest):
+                        if not is_state:
+                            scores[label] = scores.get(label, 0) + 1
+                        elif state_pos is None or position < state_pos:
+                            state, state_pos = label, position
+                        break
+                try:
+                    position = words.index(word, position + 1)
+                except ValueError:
+                    break
+
+        # Codes that are also words only count in uppercase: those are
+        # checked against the original text
+        code, code_pos = None, None
+        original = None
+        for lower_code in lower_codes:
+            if lower_code in _CASELESS_UF_CODES:
+                position = words.index(lower_code)
+            else:
+                upper_code = _UF_CODES[lower_code]
+                if _find_word(raw, upper_code) == -1:
+                    continue
+                # In an all-caps message "SE", "TO" etc. are just words
+                if lower_code in _AMBIGUOUS_UF_CODES and text.upper() == text:
+                    continue
+                if original is None:
+                    original = raw.translate(_WORDS).split()
+                position = original.index(upper_code)
+            if code_pos is None or position < code_pos:
+                code, code_pos = _UF_CODES[lower_code].decode(), position
+        # Both a state name and a code: the first one in the text wins
+        if code is not None and (state_pos is None or code_pos < state_pos):
+            state = code
+
+        category = None
+        if scores:
+            # Highest score; ties go to the category listed first
+            category = max(scores, key=lambda c: (scores[c], -self.categories.index(c)))
+        return Classification(state, category, scores)
+
+default_classifier = TextClassifier(DEFAULT_CATEGORIES, DEFAULT_STATE_ALIASES)
+
+def build_classifier(raw_config: Optional[str]) -> TextClassifier:
+    """
+    Build a classifier from the classifier_keywords config value. Categories
+    replace the defaults; state aliases are added to the default names.
+    """
+    if not raw_config:
+        return default_classifier
+    try:
+        data = json.loads(raw_config)
+        categories = data.get("categories") or DEFAULT_CATEGORIES
+        state_aliases = {uf: list(names) for uf, names in DEFAULT_STATE_ALIASES.items()}
+        for uf, names in (data.get("states") or {}).items():
+            state_aliases.setdefault(uf.upper(), []).extend(names)
+        return TextClassifier(categories, state_aliases)
+    except Exception as e:
+        logger.error(f"Invalid {CLASSIFIER_CONFIG_KEY} config, using defaults: {e}")
+        return default_classifier
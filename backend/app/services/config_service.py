@@ -0,0 +1,168 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import text
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+from app.db.session import dialect_insert, is_postgres
+from app.models.system_config import SystemConfig, SystemConfigVersion
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel used to tell every worker that system_configs changed
+NOTIFY_CHANNEL = "system_config_changed"
+
+# Keys that fall back to environment variables when not set in the DB
+ENV_FALLBACKS = {
+    "whatsapp_access_token": "WHATSAPP_ACCESS_TOKEN",
+    "whatsapp_number_id": "WHATSAPP_NUMBER_ID",
+    "openai_api_key": "OPENAI_API_KEY",
+}
+
+class ConfigCache:
+    """
+    In-memory snapshot of the whole system_configs table.
+
+    The snapshot is reloaded when the TTL expires or when another worker
+    changed the config. Changes are detected through Postgres LISTEN/NOTIFY
+    when available, otherwise by polling the system_config_versions row.
+    """
+
+    def __init__(self, ttl: float, poll_interval: float):
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._values: Dict[str, Optional[str]] = {}
+        self._parsed: Dict[str, Any] = {}
+        self._version: Optional[int] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._stale = True
+        self._invalidations = 0 # Bumped by invalidate(), to spot one during a reload
+        self._listening = False
+        self._listener_conn = None
+        self._change_callbacks: List[Callable[[str, Optional[str], Optional[str]], None]] = []
+
+    def invalidate(self, *args):
+        """Force a reload on the next access. Also used as the NOTIFY callback."""
+        self._invalidations += 1
+        self._stale = True
+
+    def on_change(self, callback: Callable[[str, Optional[str], Optional[str]], None]):
+        """Register callback(key, old_value, new_value) fired when a reload changes a key."""
+        self._change_callbacks.append(callback)
+
+    async def get(self, db: AsyncSession, key: str) -> Optional[str]:
+        await self._ensure_fresh(db)
+        value = self._values.get(key)
+        if value:
+            return value
+        env_attr = ENV_FALLBACKS.get(key)
+        if env_attr:
+            return getattr(settings, env_attr)
+        return None
+
+    async def get_parsed(self, db: AsyncSession, key: str, parser: Callable[[Optional[str]], Any]) -> Any:
+        """
+        Return parser(value) for a key, parsing only once per snapshot.
+        """
+        await self._ensure_fresh(db)
+        if key not in self._parsed:
+            self._parsed[key] = parser(await self.get(db, key))
+        return self._parsed[key]
+
+    async def _ensure_fresh(self, db: AsyncSession):
+        now = time.monotonic()
+        if not self._stale and now - self._loaded_at < self.ttl:
+            if self._listening or now - self._checked_at < self.poll_interval:
+                return
+            self._checked_at = now
+            if await self._read_version(db) == self._version:
+                return
+        await self._reload(db)
+
+    async def _read_version(self, db: AsyncSession) -> int:
+        result = await db.execute(select(SystemConfigVersion.version).filter(SystemConfigVersion.id == 1))
+        return result.scalar() or 0
+
+    async def _reload(self, db: AsyncSession):
+        invalidations = self._invalidations
+        version = await self._read_version(db)
+        result = await db.execute(select(SystemConfig.key, SystemConfig.value))
+        values = {row[0]: row[1] for row in result.all()}
+
+        old_values = self._values
+        had_snapshot = self._version is not None
+        self._values = values
+        self._parsed = {}
+        self._version = version
+        self._loaded_at = self._checked_at = time.monotonic()
+        # A NOTIFY that arrived while reading may describe a newer write
+        self._stale = self._invalidations != invalidations
+
+        if had_snapshot:
+            for key in set(old_values) | set(values):
+                if old_values.get(key) != values.get(key):
+                    for callback in self._change_callbacks:
+                        try:
+                            callback(key, old_values.get(key), values.get(key))
+                        except Exception as e:
+                            logger.error(f"Error in config change callback for {key}: {e}")
+
+    async def start_listener(self):
+        """
+        LISTEN for config changes on Postgres. On SQLite (or if the connection
+        fails) the cache keeps polling the version row instead.
+        """
+        if not is_postgres():
+            return
+        try:
+            import asyncpg
+            dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+            self._listener_conn = await asyncpg.connect(dsn)
+            await self._listener_conn.add_listener(NOTIFY_CHANNEL, self.invalidate)
+            self._listener_conn.add_termination_listener(self._on_listener_terminated)
+            self._listening = True
+            logger.info(f"Listening for config changes on '{NOTIFY_CHANNEL}'")
+        except Exception as e:
+            logger.warning(f"Could not LISTEN for config changes, falling back to polling: {e}")
+            self._listening = False
+
+    def _on_listener_terminated(self, *args):
+        logger.warning("Config listener connection lost, falling back to polling")
+        self._listening = False
+        self._listener_conn = None
+        self.invalidate()
+
+    async def stop_listener(self):
+        conn = self._listener_conn
+        self._listening = False
+        self._listener_conn = None
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.error(f"Error closing config listener: {e}")
+
+config_cache = ConfigCache(
+    ttl=settings.CONFIG_CACHE_TTL_SECONDS,
+    poll_interval=settings.CONFIG_VERSION_POLL_SECONDS,
+)
+
+async def bump_config_version(db: AsyncSession):
+    """
+    Mark the config as changed for all workers. Call inside the same
+    transaction as the config write, before commit: the version bump and the
+    NOTIFY only become visible to other workers once the write commits.
+    """
+    # Upsert: the first two writers must not both insert the row
+    await db.execute(
+        dialect_insert(SystemConfigVersion)
+        .values(id=1, version=1)
+        .on_conflict_do_update(index_elements=["id"], set_={"version": SystemConfigVersion.version + 1})
+    )
+    if is_postgres():
+        await db.execute(text("SELECT pg_notify(:channel, '')"), {"channel": NOTIFY_CHANNEL})
+
+async def get_system_config(db: AsyncSession, key: str) -> Optional[str]:
+    return await config_cache.get(db, key)
@@ -0,0 +1,160 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update
+from app.core.config import settings
+from app.db.session import sortable_timestamp
+from app.models import Conversation, Message
+from app.services.ai_service import summarize_conversation
+from typing import Dict, List, NamedTuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Messages per turn: the user's question and the reply
+MESSAGES_PER_TURN = 2
+
+class ConversationContext(NamedTuple):
+    summary: Optional[str]
+    messages: List[Dict[str, str]] # Chat completion messages, oldest first
+
+    def summary_prompt(self) -> str:
+        if not self.summary:
+            return ""
+        return f"\n\nRESUMO DA CONVERSA ATÉ AQUI:\n{self.summary}"
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token plus per-message overhead),
+    close enough to keep prompts bounded without a tokenizer dependency.
+    """
+    return (len(text) + 3) // 4 + 4
+
+def _message_text(content: Optional[str], media_url: Optional[str]) -> str:
+    return content or ("[mídia]" if media_url else "")
+
+def window_size(texts: List[str], max_messages: int, token_budget: int) -> int:
+    """How many of the messages, from the first, fit max_messages and token_budget"""
+    count = 0
+    for text in texts[:max_messages]:
+        token_budget -= estimate_tokens(text)
+        if token_budget < 0:
+            break
+        count += 1
+    return count
+
+async def build_context(
+    db: AsyncSession,
+    conversation: Conversation,
+    before_id: Optional[int] = None,
+    max_messages: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> ConversationContext:
+    """
+    Rolling summary plus the most recent messages not folded into it, newest
+    first until max_messages or the token budget is reached. Messages from
+    before_id on (the turn being answered) are left out.
+    """
+    max_messages = settings.HISTORY_MAX_MESSAGES if max_messages is None else max_messages
+    token_budget = settings.HISTORY_TOKEN_BUDGET if token_budget is None else token_budget
+    if max_messages <= 0:
+        return ConversationContext(conversation.summary, [])
+
+    query = select(Message.role, Message.content, Message.media_url).where(Message.conversation_id == conversation.id)
+    if conversation.summary_through_id is not None:
+        query = query.where(Message.id > conversation.summary_through_id)
+    if before_id is not None:
+        query = query.where(Message.id < before_id)
+    query = query.order_by(sortable_timestamp(Message.timestamp).desc(), Message.id.desc()).limit(max_messages)
+
+    rows = (await db.execute(query)).all()
+    history = [
+        {"role": "assistant" if role == "assistant" else "user", "content": _message_text(content, media_url)}
+        for role, content, media_url in rows
+    ]
+    history = history[:window_size([m["content"] for m in history], max_messages, token_budget)]
+    history.reverse()
+    return ConversationContext(conversation.summary, history)
+
+async def refresh_summary(db: AsyncSession, conversation_id: int, api_key: Optional[str] = None) -> bool:
+    """
+    Fold the messages that have fallen out of the history window (by count
+    or by token budget) into the rolling summary, once SUMMARY_REFRESH_TURNS
+    turns of them have accumulated, so the summarizer runs every few turns
+    rather than on each one. Each refresh folds at most one batch, the
+    oldest SUMMARY_BATCH_MESSAGES within SUMMARY_BATCH_TOKEN_BUDGET, so a
+    long backlog is caught up over several refreshes.
+    The caller commits. Returns whether the summary changed.
+    """
+    if not (api_key or settings.OPENAI_API_KEY):
+        return False
+
+    result = await db.execute(
+        select(
+            Conversation.message_count,
+            Conversation.summary,
+            Conversation.summary_through_id,
+            Conversation.summary_message_count,
+        ).where(Conversation.id == conversation_id)
+    )
+    row = result.first()
+    if row is None:
+        return False
+    message_count, summary, through_id, folded_count = row
+
+    threshold = settings.SUMMARY_REFRESH_TURNS * MESSAGES_PER_TURN
+    if message_count - folded_count < threshold:
+        return False
+
+    def unfolded():
+        query = select(Message.id, Message.role, Message.content, Message.media_url).where(Message.conversation_id == conversation_id)
+        if through_id is not None:
+            query = query.where(Message.id > through_id)
+        return query
+
+    # The window is whatever build_context would send, which the token
+    # budget can make shorter than HISTORY_MAX_MESSAGES
+    window_query = unfolded().order_by(sortable_timestamp(Message.timestamp).desc(), Message.id.desc())
+    window_rows = (await db.execute(window_query.limit(settings.HISTORY_MAX_MESSAGES))).all()
+    in_window = window_size(
+        [_message_text(content, media_url) for _, _, content, media_url in window_rows],
+        settings.HISTORY_MAX_MESSAGES,
+        settings.HISTORY_TOKEN_BUDGET,
+    )
+    window_ids = [message_id for message_id, _, _, _ in window_rows[:in_window]]
+
+    batch_query = unfolded().order_by(sortable_timestamp(Message.timestamp).asc(), Message.id.asc())
+    if window_ids:
+        batch_query = batch_query.where(Message.id.not_in(window_ids))
+    rows = (await db.execute(batch_query.limit(max(settings.SUMMARY_BATCH_MESSAGES, threshold)))).all()
+    if len(rows) < threshold:
+        return False
+    # The batch: oldest first, within the message and token caps (at least one message)
+    batch_size = window_size(
+        [_message_text(content, media_url) for _, _, content, media_url in rows],
+        settings.SUMMARY_BATCH_MESSAGES,
+        settings.SUMMARY_BATCH_TOKEN_BUDGET,
+    )
+    rows = rows[:max(batch_size, 1)]
+
+    transcript = "\n".join(
+        f"{'Assistente' if role == 'assistant' else 'Usuário'}: {_message_text(content, media_url)}"
+        for _, role, content, media_url in rows
+    )
+    new_summary = await summarize_conversation(summary, transcript, api_key=api_key)
+    if not new_summary:
+        return False
+
+    # Guarded on the fold count in case another worker refreshed meanwhile
+    result = await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id, Conversation.summary_message_count == folded_count)
+        .values(
+            summary=new_summary,
+            summary_through_id=rows[-1][0],
+            summary_message_count=folded_count + len(rows),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        logger.info(f"Conversation {conversation_id}: folded {len(rows)} messages into the summary")
+    return bool(result.rowcount)
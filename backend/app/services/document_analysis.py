@@ -0,0 +1,64 @@
+from app.core.config import settings
+from app.services.ai_service import extract_document_notes
+from app.services.message_chunks import split_message
+from typing import List, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Same estimate as the conversation history budget
+CHARS_PER_TOKEN = 4
+
+def document_char_limit() -> int:
+    """Characters read from a document: the whole token cap when map-reduce is on"""
+    if settings.DOCUMENT_MAP_REDUCE_ENABLED:
+        return settings.DOCUMENT_MAX_TOKENS * CHARS_PER_TOKEN
+    return settings.DOCUMENT_PROMPT_CHARS
+
+def split_document(text: str, chunk_tokens: int) -> List[str]:
+    """Chunks of about chunk_tokens, cut on paragraph or sentence boundaries (lines kept for tables)"""
+    return split_message(text, chunk_tokens * CHARS_PER_TOKEN)
+
+async def map_document(text: str, instruction: str = "", api_key: Optional[str] = None) -> Optional[str]:
+    """
+    Map step over a long document: notes are extracted from every chunk
+    concurrently, at most DOCUMENT_MAP_CONCURRENCY calls at a time, so the
+    whole step takes about as long as the slowest chunk. Returns the notes
+    labelled by part, in document order, or None if every chunk failed.
+    """
+    chunks = split_document(text, settings.DOCUMENT_CHUNK_TOKENS)
+    semaphore = asyncio.Semaphore(settings.DOCUMENT_MAP_CONCURRENCY)
+
+    async def notes_for(part: int, chunk: str) -> Optional[str]:
+        async with semaphore:
+            return await extract_document_notes(chunk, instruction, part, len(chunks), api_key=api_key)
+
+    notes = await asyncio.gather(*[notes_for(i + 1, chunk) for i, chunk in enumerate(chunks)])
+    parts = [f"[Parte {i + 1}/{len(chunks)}]\n{note.strip()}" for i, note in enumerate(notes) if note]
+    if not parts:
+        return None
+    if len(parts) < len(chunks):
+        logger.warning(f"Document map step: {len(chunks) - len(parts)} of {len(chunks)} chunks failed")
+    return "\n\n".join(parts)
+
+async def build_document_prompt(doc_text: str, user_text: str = "", api_key: Optional[str] = None) -> str:
+    """
+    Prompt for the answering (reduce) call: the text itself when it fits
+    DOCUMENT_PROMPT_CHARS, otherwise the notes of the map step (falling
+    back to the beginning of the text if the map step fails).
+    """
+    notes = None
+    if len(doc_text) > settings.DOCUMENT_PROMPT_CHARS and settings.DOCUMENT_MAP_REDUCE_ENABLED:
+        notes = await map_document(doc_text, user_text, api_key)
+
+    if notes:
+        prompt = (
+            "Analise este documento. Ele é longo e foi lido por partes; "
+            f"estas são as notas extraídas de cada parte:\n\n{notes}"
+        )
+    else:
+        prompt = f"Analise este documento.\n\nConteúdo extraído:\n{doc_text[:settings.DOCUMENT_PROMPT_CHARS]}"
+    if user_text:
+        prompt += f"\n\nLegenda/Instrução do usuário: {user_text}"
+    return prompt
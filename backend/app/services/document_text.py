@@ -0,0 +1,212 @@
+from collections import OrderedDict
+from app.core.config import settings
+from typing import Iterator, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+from pypdf import PdfReader
+
+logger = logging.getLogger(__name__)
+
+PDF_READ_ERROR = "Erro ao ler PDF."
+PDF_TIMEOUT_ERROR = "[PDF muito grande ou complexo para leitura automática]"
+PDF_TOO_LARGE_ERROR = "[PDF acima do tamanho máximo aceito]"
+BINARY_ERROR = "[Conteúdo binário não suportado para leitura direta]"
+EXTRACTION_ERRORS = frozenset([PDF_READ_ERROR, PDF_TIMEOUT_ERROR, PDF_TOO_LARGE_ERROR, BINARY_ERROR])
+
+def iter_pdf_pages(content: bytes, max_pages: int) -> Iterator[str]:
+    """Text of each page, parsed lazily one page at a time, up to max_pages"""
+    reader = PdfReader(io.BytesIO(content))
+    for number, page in enumerate(reader.pages):
+        if number >= max_pages:
+            return
+        yield page.extract_text() or ""
+
+def extract_text_from_pdf(content: bytes, max_chars: Optional[int] = None, max_pages: Optional[int] = None) -> str:
+    """
+    Extract text from PDF bytes, stopping at the first page that completes
+    max_chars. Runs in the extraction worker processes.
+    """
+    max_pages = settings.PDF_MAX_PAGES if max_pages is None else max_pages
+    try:
+        parts, length = [], 0
+        for text in iter_pdf_pages(content, max_pages):
+            parts.append(text)
+            length += len(text) + 1
+            if max_chars is not None and length >= max_chars:
+                break
+        text = "\n".join(parts)
+        return text[:max_chars] if max_chars is not None else text
+    except Exception as e:
+        logger.error(f"Error reading PDF: {e}")
+        return PDF_READ_ERROR
+
+# Max wait for a new worker process to import its modules
+WORKER_START_TIMEOUT = 60.0
+
+class ExtractionTimeout(Exception):
+    """A job ran past its timeout; its worker process was terminated"""
+
+def _worker_main(conn):
+    """Extraction worker process: run the jobs received over conn until it closes"""
+    conn.send(None) # Ready: imports are done
+    while True:
+        try:
+            func, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, func(*args)))
+        except Exception as e:
+            conn.send((False, e))
+
+class _Worker:
+    """One worker process, running one job at a time"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.started = False
+        self.alive = True
+
+    def run(self, func, args: tuple, timeout: float):
+        """Blocking: runs in a thread. The timeout only covers the job itself."""
+        try:
+            if not self.started:
+                if not self.conn.poll(WORKER_START_TIMEOUT):
+                    raise ExtractionTimeout("worker did not start")
+                self.conn.recv()
+                self.started = True
+            self.conn.send((func, args))
+            if not self.conn.poll(timeout):
+                raise ExtractionTimeout(f"no result after {timeout}s")
+            ok, result = self.conn.recv()
+        except BaseException:
+            self.kill()
+            raise
+        if not ok:
+            raise result
+        return result
+
+    def kill(self):
+        self.alive = False
+        self.process.terminate()
+        self.conn.close()
+
+class ExtractionPool:
+    """
+    Up to `size` worker processes, started on demand and reused. A job
+    waits for an idle worker, then gets `timeout` seconds; a job that runs
+    over has its own process terminated, leaving the other workers and
+    their jobs alone.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        # spawn: don't fork a process holding the event loop and DB connections
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: List[_Worker] = []
+        self._busy: Set[_Worker] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def run(self, func, *args, timeout: float):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            worker = self._idle.pop() if self._idle else _Worker(self._context)
+            self._busy.add(worker)
+            try:
+                return await loop.run_in_executor(None, worker.run, func, args, timeout)
+            except asyncio.CancelledError:
+                # The thread sees the process exit and closes the pipe
+                worker.alive = False
+                worker.process.terminate()
+                raise
+            finally:
+                self._busy.discard(worker)
+                if worker.alive:
+                    self._idle.append(worker)
+
+    def shutdown(self):
+        for worker in self._idle:
+            worker.kill()
+        for worker in self._busy:
+            # Their threads close the pipes once the processes exit
+            worker.alive = False
+            worker.process.terminate()
+        self._idle, self._busy = [], set()
+
+_pool: Optional[ExtractionPool] = None
+# (sha256, max_chars) -> text, least recently used first
+_text_cache: "OrderedDict[Tuple[str, Optional[int]], str]" = OrderedDict()
+
+def _get_pool() -> ExtractionPool:
+    global _pool
+    if _pool is None:
+        _pool = ExtractionPool(settings.PDF_EXTRACTION_WORKERS)
+    return _pool
+
+def shutdown_extraction_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+def _cache_get(key: Tuple[str, Optional[int]]) -> Optional[str]:
+    text = _text_cache.get(key)
+    if text is not None:
+        _text_cache.move_to_end(key)
+    return text
+
+def _cache_put(key: Tuple[str, Optional[int]], text: str):
+    _text_cache[key] = text
+    while len(_text_cache) > settings.PDF_TEXT_CACHE_ENTRIES:
+        _text_cache.popitem(last=False)
+
+async def extract_pdf_text(content: bytes, max_chars: Optional[int] = None) -> str:
+    """
+    PDF text up to max_chars, parsed in a worker process so the event loop
+    keeps serving other requests. Results are cached by content hash.
+    """
+    if len(content) > settings.PDF_MAX_BYTES:
+        return PDF_TOO_LARGE_ERROR
+    digest = hashlib.sha256(content).hexdigest()
+    key = (digest, max_chars)
+    cached = _cache_get(key)
+    if cached is None and max_chars is not None:
+        # A full extraction serves any budget
+        full = _cache_get((digest, None))
+        cached = full[:max_chars] if full is not None else None
+    if cached is not None:
+        return cached
+
+    timeout = settings.PDF_EXTRACTION_TIMEOUT_SECONDS
+    try:
+        text = await _get_pool().run(extract_text_from_pdf, content, max_chars, settings.PDF_MAX_PAGES, timeout=timeout)
+    except ExtractionTimeout:
+        logger.error(f"PDF extraction timed out after {timeout}s")
+        return PDF_TIMEOUT_ERROR
+    except Exception as e:
+        # e.g. EOFError when the worker process died; it is not reused
+        logger.error(f"PDF extraction failed: {e}")
+        return PDF_READ_ERROR
+
+    if text != PDF_READ_ERROR:
+        _cache_put(key, text)
+    return text
+
+async def read_document_text(mime_type: str, media_content: bytes, max_chars: Optional[int] = None) -> str:
+    """Text of a PDF or text document, up to max_chars"""
+    if "pdf" in mime_type:
+        return await extract_pdf_text(media_content, max_chars)
+    # Try decoding as text
+    try:
+        text = media_content.decode('utf-8')
+    except UnicodeDecodeError:
+        return BINARY_ERROR
+    return text[:max_chars] if max_chars is not None else text
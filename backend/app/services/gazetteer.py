@@ -0,0 +1,165 @@
+from array import array
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+import csv
+import logging
+import os
+import re
+import sys
+from app.core.config import settings
+from app.services.classifier import STATE_NAMES, fold
+
+logger = logging.getLogger(__name__)
+
+BUNDLED_GAZETTEER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "municipios.csv")
+
+# IBGE numeric state codes, for files that carry codigo_uf instead of the UF
+IBGE_UF_CODES = {
+    11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO',
+    21: 'MA', 22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA',
+    31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP', 41: 'PR', 42: 'SC', 43: 'RS',
+    50: 'MS', 51: 'MT', 52: 'GO', 53: 'DF',
+}
+
+# Words that introduce a place: "aqui em Sinop", "perto de Rio Verde", "sou de Jataí"
+PLACE_CUES = {'em', 'no', 'na', 'perto', 'proximo', 'proxima', 'cidade', 'municipio', 'regiao', 'moro', 'aqui'}
+PLACE_CUES_BEFORE_DE = {'sou', 'perto', 'proximo', 'proxima', 'cidade', 'municipio', 'regiao', 'lado'}
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+_END = ""
+
+class Place(NamedTuple):
+    name: str
+    state: str
+    latitude: float
+    longitude: float
+
+class Gazetteer:
+    """
+    Offline municipality lookup.
+
+    Names are accent-folded and split into words, and stored in a trie
+    keyed by word, so a message is scanned once, left to right, taking the
+    longest name at each position ("Rio Verde de Mato Grosso" over
+    "Rio Verde"). Coordinates live in flat arrays indexed by trie leaves.
+
+    Many municipalities are also ordinary words ("Sorriso", "Natal",
+    "Lagarto"), so a name only counts when it is introduced by a place cue
+    ("em", "perto de", "sou de") or written capitalized mid-sentence.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[str, str, float, float]]):
+        self._names: List[str] = []
+        self._states: List[str] = []
+        self._lats = array("d")
+        self._lons = array("d")
+        self._trie: Dict[str, dict] = {}
+        state_names = {fold(name): uf for uf, name in STATE_NAMES.items()}
+
+        for name, uf, lat, lon in rows:
+            words = [sys.intern(w) for w in WORD_PATTERN.findall(fold(name))]
+            if not words:
+                continue
+            # "Tocantins" (MG) or "Paraná" (RN) in a message means the state
+            named_state = state_names.get(" ".join(words))
+            if named_state and named_state != uf:
+                continue
+            node = self._trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[_END] = node.get(_END, ()) + (len(self._names),)
+            self._names.append(name)
+            self._states.append(uf)
+            self._lats.append(lat)
+            self._lons.append(lon)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _place(self, i: int) -> Place:
+        return Place(self._names[i], self._states[i], self._lats[i], self._lons[i])
+
+    def find(self, text: str, state_hint: Optional[str] = None) -> Optional[Place]:
+        """
+        First municipality mentioned in text. Homonyms ("Bom Jesus", "Palmas")
+        are resolved with state_hint, otherwise only unambiguous names match.
+        """
+        if not text:
+            return None
+        matches = list(WORD_PATTERN.finditer(text))
+        words = [fold(m.group()) for m in matches]
+        all_caps = text.upper() == text
+
+        i = 0
+        while i < len(words):
+            node = self._trie
+            end, found = i, None
+            j = i
+            while j < len(words) and words[j] in node:
+                node = node[words[j]]
+                j += 1
+                if _END in node:
+                    end, found = j, node[_END]
+            if found is None or not self._introduced(text, matches, words, i, all_caps):
+                i += 1
+                continue
+
+            if len(found) == 1:
+                return self._place(found[0])
+            in_state = [k for k in found if self._states[k] == state_hint]
+            if len(in_state) == 1:
+                return self._place(in_state[0])
+            i = end
+        return None
+
+    @staticmethod
+    def _introduced(text: str, matches: list, words: List[str], i: int, all_caps: bool) -> bool:
+        if i > 0 and words[i - 1] in PLACE_CUES:
+            return True
+        if i > 1 and words[i - 1] in ('de', 'do', 'da') and words[i - 2] in PLACE_CUES_BEFORE_DE:
+            return True
+        if all_caps or i == 0 or not matches[i].group()[0].isupper():
+            return False
+        # Capitalized, but not just because it starts a sentence
+        before = text[:matches[i].start()].rstrip()
+        return bool(before) and before[-1] not in ".!?:\n"
+
+def read_gazetteer_csv(path: str) -> List[Tuple[str, str, float, float]]:
+    """
+    Read municipalities from CSV with nome, latitude, longitude and either
+    uf or codigo_uf columns, as in the public IBGE-derived municipality lists.
+    """
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            uf = (row.get("uf") or "").strip().upper()
+            if not uf and row.get("codigo_uf"):
+                uf = IBGE_UF_CODES.get(int(row["codigo_uf"]), "")
+            if not uf:
+                continue
+            rows.append((row["nome"].strip(), uf, float(row["latitude"]), float(row["longitude"])))
+    return rows
+
+def write_gazetteer_csv(rows: Iterable[Tuple[str, str, float, float]], path: str):
+    """Write municipalities in the bundled format (nome, uf, latitude, longitude), by UF and name"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["nome", "uf", "latitude", "longitude"])
+        for name, uf, lat, lon in sorted(rows, key=lambda row: (row[1], fold(row[0]))):
+            writer.writerow([name, uf, f"{lat:.4f}", f"{lon:.4f}"])
+    os.replace(tmp_path, path)
+
+_gazetteer: Optional[Gazetteer] = None
+
+def get_gazetteer() -> Gazetteer:
+    """Load the gazetteer on first use (GAZETTEER_PATH, or the bundled list)"""
+    global _gazetteer
+    if _gazetteer is None:
+        path = settings.GAZETTEER_PATH or BUNDLED_GAZETTEER
+        try:
+            _gazetteer = Gazetteer(read_gazetteer_csv(path))
+            logger.info(f"Gazetteer loaded from {path}: {len(_gazetteer)} municipalities")
+        except Exception as e:
+            logger.error(f"Could not load gazetteer from {path}: {e}")
+            _gazetteer = Gazetteer([])
+    return _gazetteer
@@ -1,35 +1,192 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import func
+from app.core.config import settings
 from app.models.professional import Professional
-from typing import List, Dict
+from app.services.spatial_index import GridIndex
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import time
 
-async def find_nearby_professionals(db: AsyncSession, lat: float, lon: float, profession: str = "veterinarian") -> List[Dict]:
+logger = logging.getLogger(__name__)
+
+def profession_type(profession: Optional[str]) -> Optional[str]:
+    """Map a free-form profession ("vet", "agronomist", ...) to a Professional.type"""
+    if not profession:
+        return None
+    prof_lower = profession.lower()
+    if "vet" in prof_lower:
+        return "Veterinário"
+    if "agro" in prof_lower:
+        return "Agrônomo"
+    if "tec" in prof_lower or "téc" in prof_lower:
+        return "Técnico Agrícola"
+    return None
+
+def _record(p: Professional) -> Dict[str, Any]:
+    return {
+        "id": p.id,
+        "name": p.name,
+        "type": p.type,
+        "address": f"{p.city} - {p.state}",
+        "contact": p.phone or p.email or "N/A",
+        "specialties": p.specialties,
+        "latitude": p.latitude,
+        "longitude": p.longitude,
+    }
+
+class ProfessionalIndex:
+    """
+    Per-worker spatial index of professionals, one grid per type.
+
+    Changes made through this worker are applied incrementally. Changes made
+    by other workers are picked up by comparing a cheap table fingerprint
+    (row count, max id, last update) every few seconds and reloading when it
+    differs.
+    """
+
+    def __init__(self, cell_degrees: float, check_interval: float):
+        self.cell_degrees = cell_degrees
+        self.check_interval = check_interval
+        self._grids: Dict[str, GridIndex] = {}
+        self._records: Dict[int, Dict[str, Any]] = {}
+        self._unlocated: Dict[int, Dict[str, Any]] = {}
+        self._fingerprint: Optional[Tuple] = None
+        self._checked_at = 0.0
+
+    async def _read_fingerprint(self, db: AsyncSession) -> Tuple:
+        result = await db.execute(
+            select(
+                func.count(Professional.id),
+                func.max(Professional.id),
+                func.max(func.coalesce(Professional.updated_at, Professional.created_at)),
+            )
+        )
+        return tuple(result.one())
+
+    async def ensure_fresh(self, db: AsyncSession):
+        now = time.monotonic()
+        if self._fingerprint is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        fingerprint = await self._read_fingerprint(db)
+        if fingerprint != self._fingerprint:
+            await self.rebuild(db, fingerprint)
+
+    async def rebuild(self, db: AsyncSession, fingerprint: Optional[Tuple] = None):
+        if fingerprint is None:
+            fingerprint = await self._read_fingerprint(db)
+        result = await db.execute(select(Professional))
+        grids: Dict[str, GridIndex] = {}
+        records: Dict[int, Dict[str, Any]] = {}
+        unlocated: Dict[int, Dict[str, Any]] = {}
+        for p in result.scalars().all():
+            records[p.id] = _record(p)
+            if p.latitude is not None and p.longitude is not None:
+                grids.setdefault(p.type, GridIndex(self.cell_degrees)).add(p.id, p.latitude, p.longitude)
+            else:
+                unlocated[p.id] = records[p.id]
+        self._grids, self._records, self._unlocated = grids, records, unlocated
+        self._fingerprint = fingerprint
+        logger.info(f"Professional index loaded: {len(records)} professionals")
+
+    def _discard(self, professional_id: int):
+        old = self._records.pop(professional_id, None)
+        self._unlocated.pop(professional_id, None)
+        if old is not None and old["type"] in self._grids:
+            self._grids[old["type"]].remove(professional_id)
+
+    async def _advance_fingerprint(self, db: AsyncSession, expected: Optional[Tuple]):
+        """
+        After a local change, keep the index only if the table fingerprint is
+        what that change alone predicts. Anything else means another worker
+        changed the table meanwhile, so reload instead of absorbing it.
+        """
+        fingerprint = await self._read_fingerprint(db)
+        if expected is not None and fingerprint == expected:
+            self._fingerprint = fingerprint
+        else:
+            await self.rebuild(db, fingerprint)
+
+    async def upsert(self, db: AsyncSession, p: Professional):
+        """Apply a committed create/update from this worker without a reload"""
+        created = p.id not in self._records
+        self._discard(p.id)
+        self._records[p.id] = _record(p)
+        if p.latitude is not None and p.longitude is not None:
+            self._grids.setdefault(p.type, GridIndex(self.cell_degrees)).add(p.id, p.latitude, p.longitude)
+        else:
+            self._unlocated[p.id] = self._records[p.id]
+        if self._fingerprint is None:
+            return
+        count, max_id, changed_at = self._fingerprint
+        result = await db.execute(
+            select(func.coalesce(Professional.updated_at, Professional.created_at)).filter(Professional.id == p.id)
+        )
+        own_changed_at = result.scalar()
+        expected = (
+            count + 1 if created else count,
+            p.id if max_id is None else max(max_id, p.id),
+            own_changed_at if changed_at is None else max(changed_at, own_changed_at),
+        )
+        await self._advance_fingerprint(db, expected)
+
+    async def remove(self, db: AsyncSession, professional_id: int):
+        """Apply a committed delete from this worker without a reload"""
+        existed = professional_id in self._records
+        self._discard(professional_id)
+        if self._fingerprint is None:
+            return
+        count, max_id, changed_at = self._fingerprint
+        # Deleting the newest row changes max(id) to a value we can't predict
+        predictable = existed and max_id is not None and professional_id < max_id
+        await self._advance_fingerprint(db, (count - 1, max_id, changed_at) if predictable else None)
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        type: Optional[str] = None,
+        limit: int = 10,
+        radius_km: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        grids = [self._grids[type]] if type in self._grids else ([] if type else list(self._grids.values()))
+        hits: List[Tuple[float, int]] = []
+        for grid in grids:
+            if radius_km is not None:
+                hits.extend(grid.within(lat, lon, radius_km))
+            else:
+                hits.extend(grid.nearest(lat, lon, limit))
+        if len(grids) > 1:
+            hits.sort()
+
+        results = [dict(self._records[key], distance=round(dist, 2)) for dist, key in hits[:limit]]
+
+        # Professionals without coordinates can't be ranked; list them after the located ones
+        if radius_km is None and len(results) < limit:
+            for record in self._unlocated.values():
+                if type is None or record["type"] == type:
+                    results.append(dict(record, distance=None))
+                    if len(results) == limit:
+                        break
+        return results
+
+professional_index = ProfessionalIndex(
+    cell_degrees=settings.GEO_INDEX_CELL_DEGREES,
+    check_interval=settings.GEO_INDEX_CHECK_SECONDS,
+)
+
+async def find_nearby_professionals(
+    db: AsyncSession,
+    lat: float,
+    lon: float,
+    profession: str = "veterinarian",
+    limit: int = 10,
+    radius_km: Optional[float] = None,
+) -> List[Dict]:
     """
-    Find nearby professionals from DB.
-    Currently returns all professionals matching the type as we don't have lat/lon in DB.
+    Professionals closest to (lat, lon), sorted by great-circle distance in km.
+    With radius_km, only those within the radius are returned.
     """
-    query = select(Professional)
-    
-    # Simple filtering based on profession/type
-    if profession:
-         prof_lower = profession.lower()
-         if "vet" in prof_lower:
-             query = query.filter(Professional.type == "Veterinário")
-         elif "agro" in prof_lower:
-             query = query.filter(Professional.type == "Agrônomo")
-         elif "tec" in prof_lower or "téc" in prof_lower:
-             query = query.filter(Professional.type == "Técnico Agrícola")
-    
-    result = await db.execute(query)
-    professionals = result.scalars().all()
-    
-    return [
-        {
-            "name": p.name,
-            "address": f"{p.city} - {p.state}",
-            "distance": "N/A", # We don't have lat/lon in DB yet
-            "contact": p.phone or p.email or "N/A",
-            "specialties": p.specialties
-        }
-        for p in professionals
-    ]
+    await professional_index.ensure_fresh(db)
+    return professional_index.nearest(lat, lon, profession_type(profession), limit, radius_km)
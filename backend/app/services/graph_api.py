@@ -0,0 +1,72 @@
+from typing import Optional
+from app.core.config import settings
+import logging
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GRAPH_API_BASE_URL = "https://graph.facebook.com"
+
+_client: Optional[httpx.AsyncClient] = None
+
+def _build_client() -> httpx.AsyncClient:
+    http2 = settings.GRAPH_API_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("GRAPH_API_HTTP2 is enabled but 'h2' is not installed, using HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(
+            settings.GRAPH_API_TIMEOUT_SECONDS,
+            connect=settings.GRAPH_API_CONNECT_TIMEOUT_SECONDS,
+        ),
+        limits=httpx.Limits(
+            max_connections=settings.GRAPH_API_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.GRAPH_API_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.GRAPH_API_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+
+async def start_graph_client():
+    """Create the worker's shared client. Called from the app lifespan."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+
+async def close_graph_client():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+def get_graph_client() -> httpx.AsyncClient:
+    """
+    Shared keep-alive client. Created lazily when used outside the app
+    lifespan (scripts, tests).
+    """
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+def graph_url(path: str) -> str:
+    return f"{GRAPH_API_BASE_URL}/{settings.GRAPH_API_VERSION}/{path.lstrip('/')}"
+
+def _auth_headers(access_token: str) -> dict:
+    return {"Authorization": f"Bearer {access_token}"}
+
+async def graph_get(path: str, access_token: str) -> httpx.Response:
+    """GET a Graph API object, e.g. graph_get(media_id, token)"""
+    return await get_graph_client().get(graph_url(path), headers=_auth_headers(access_token))
+
+async def graph_post(path: str, access_token: str, payload: dict) -> httpx.Response:
+    """POST JSON to a Graph API edge, e.g. graph_post(f"{number_id}/messages", ...)"""
+    return await get_graph_client().post(graph_url(path), json=payload, headers=_auth_headers(access_token))
+
+async def fetch_media_content(media_url: str, access_token: str) -> httpx.Response:
+    """Download media from the lookaside URL returned by the media object"""
+    return await get_graph_client().get(media_url, headers=_auth_headers(access_token))
@@ -0,0 +1,80 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.cache_entry import NUM_BANDS
+from app.models.image_cache import ImageAnalysisCacheEntry
+from app.services.ai_service import IMAGE_SYSTEM_PROMPT
+from app.services.banded_cache import BandedCache, CacheLookup
+from app.services.config_service import config_cache
+from typing import List, Optional
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# SystemConfig key bumped by a flush, so every worker drops its memory tier
+GENERATION_CONFIG_KEY = "image_cache_generation"
+
+# One band per byte of the 64-bit dHash: hashes within 7 bits of each other
+# always share a band (8 differing bits can't touch all 8 bytes otherwise)
+MAX_SUPPORTED_DISTANCE = NUM_BANDS - 1
+
+def dhash_bands(dhash: str) -> List[str]:
+    return [dhash[i * 2:i * 2 + 2] for i in range(NUM_BANDS)]
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+def image_namespace(caption: str, sources: str) -> str:
+    """Analyses are only reused under the same prompt, caption and knowledge sources"""
+    return f"{_digest(IMAGE_SYSTEM_PROMPT + (caption or '').strip().lower())}:{_digest(sources)}"
+
+class ImageAnalysisCache(BandedCache):
+    """
+    Cache of vision analyses keyed by the image's perceptual hash (dHash)
+    and a hash of the prompt, caption and knowledge sources, so the same
+    photo forwarded again or recompressed along the way is answered
+    without a vision call. Near-duplicates are hashes within max_distance
+    bits.
+    """
+
+    model = ImageAnalysisCacheEntry
+    generation_key = GENERATION_CONFIG_KEY
+    label = "image analysis cache"
+
+    def __init__(self, max_entries: int, max_db_entries: int, ttl: float, max_distance: int):
+        super().__init__(max_entries, max_db_entries, ttl, min(max_distance, MAX_SUPPORTED_DISTANCE))
+
+    def distance(self, a: str, b: str) -> int:
+        return hamming(a, b)
+
+    def row_features(self, row: ImageAnalysisCacheEntry) -> str:
+        return row.dhash
+
+    def _lookup(self, dhash: str, caption: str, sources: str) -> CacheLookup:
+        namespace = image_namespace(caption, sources)
+        return CacheLookup(f"{namespace}:{dhash}", namespace, dhash, dhash_bands(dhash), {"dhash": dhash})
+
+    async def get(self, db: AsyncSession, dhash: str, caption: str = "", sources: str = "") -> Optional[str]:
+        """
+        Cached analysis of the image (or a near-identical one), None on a
+        miss. A DB hit refreshes the entry's LRU position; the caller commits.
+        """
+        return await self._get(db, self._lookup(dhash, caption, sources))
+
+    async def put(self, db: AsyncSession, dhash: str, response: str, caption: str = "", sources: str = ""):
+        """Store an analysis in memory and in the shared table. The caller commits."""
+        if not response:
+            return
+        await self._put(db, self._lookup(dhash, caption, sources), response)
+
+image_cache = ImageAnalysisCache(
+    max_entries=settings.IMAGE_CACHE_MEMORY_ENTRIES,
+    max_db_entries=settings.IMAGE_CACHE_DB_MAX_ENTRIES,
+    ttl=settings.IMAGE_CACHE_TTL_SECONDS,
+    max_distance=settings.IMAGE_CACHE_MAX_DISTANCE,
+)
+
+config_cache.on_change(image_cache.on_config_change)
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+from typing import Dict, NamedTuple, Optional, Tuple
+import asyncio
+import base64
+import io
+import logging
+import time
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# The vision model fits "high" detail images in 2048x2048, then scales the
+# shortest side to 768; pixels beyond that only cost upload time
+VISION_MAX_SIDE = 2048
+VISION_SHORT_SIDE = 768
+# At or below this size a single "low" detail tile sees the whole image
+LOW_DETAIL_SIDE = 512
+
+DHASH_SIZE = 8
+
+OUTPUT_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    detail: str
+    width: int
+    height: int
+    dhash: Optional[str] = None # Perceptual hash, 16 hex digits
+
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode('utf-8')}"
+
+def _target_size(width: int, height: int) -> Tuple[int, int]:
+    scale = min(1.0, VISION_MAX_SIDE / max(width, height), VISION_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def dhash(image: Image.Image) -> str:
+    """
+    64-bit difference hash: whether each pixel of a 9x8 grayscale thumbnail
+    is brighter than its right neighbour. Recompressed or resized copies of
+    a photo differ in a few bits at most.
+    """
+    pixels = list(image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            offset = row * (DHASH_SIZE + 1) + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return f"{bits:016x}"
+
+def preprocess_image(content: bytes) -> PreparedImage:
+    """
+    Decode, apply the EXIF orientation, downscale to what the vision model
+    uses, re-encode without metadata and hash the result. Runs in the
+    preprocessing threads.
+    """
+    fmt, mime_type = OUTPUT_FORMATS.get(settings.IMAGE_OUTPUT_FORMAT.lower(), OUTPUT_FORMATS["jpeg"])
+    with Image.open(io.BytesIO(content)) as image:
+        # Let JPEG decode at a reduced scale instead of resizing the full photo
+        image.draft("RGB", _target_size(*image.size))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        size = _target_size(*image.size)
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+        output = io.BytesIO()
+        # No exif/icc arguments: the saved image carries no metadata
+        image.save(output, fmt, quality=settings.IMAGE_QUALITY, optimize=True)
+        image_hash = dhash(image)
+    detail = "low" if max(size) <= LOW_DETAIL_SIDE else "high"
+    return PreparedImage(output.getvalue(), mime_type, detail, size[0], size[1], image_hash)
+
+class ImagePreprocessStats:
+    """Counters of this worker since start"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.images = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def record(self, bytes_in: int, bytes_out: int, seconds: float):
+        self.images += 1
+        self.bytes_in += bytes_in
+        self.bytes_out += bytes_out
+        self.seconds += seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "images": self.images,
+            "failures": self.failures,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "size_ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+            "avg_ms": round(self.seconds * 1000 / self.images, 2) if self.images else 0.0,
+        }
+
+image_stats = ImagePreprocessStats()
+_pool: Optional[ThreadPoolExecutor] = None
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Pillow releases the GIL while decoding, resizing and encoding
+        _pool = ThreadPoolExecutor(max_workers=settings.IMAGE_PREPROCESS_WORKERS, thread_name_prefix="image")
+    return _pool
+
+def shutdown_image_pool():
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+async def prepare_image(content: bytes) -> PreparedImage:
+    """
+    The image as it should be sent to the vision model. Images Pillow can't
+    read are passed through unchanged with "auto" detail.
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        prepared = await loop.run_in_executor(_get_pool(), preprocess_image, content)
+    except Exception as e:
+        logger.warning(f"Image preprocessing failed, sending original: {e}")
+        image_stats.failures += 1
+        return PreparedImage(content, "image/jpeg", "auto", 0, 0)
+    elapsed = time.perf_counter() - started
+    image_stats.record(len(content), len(prepared.data), elapsed)
+    logger.info(
+        f"Image preprocessed: {len(content)} -> {len(prepared.data)} bytes, "
+        f"{prepared.width}x{prepared.height} {prepared.detail}, {elapsed * 1000:.0f}ms"
+    )
+    return prepared
@@ -0,0 +1,384 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import and_, or_, exists, func, update, delete, text
+from sqlalchemy.orm import aliased
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional, Tuple
+from app.core.config import settings
+from app.models.job import InboundJob
+from app.db.session import is_postgres, dialect_insert
+import asyncio
+import json
+import logging
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_DEAD = "dead"
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+# Hot set of recently enqueued dedup keys; the unique column is the source of truth
+_recent_keys: "OrderedDict[str, None]" = OrderedDict()
+
+def _remember_key(dedup_key: str):
+    _recent_keys[dedup_key] = None
+    _recent_keys.move_to_end(dedup_key)
+    while len(_recent_keys) > settings.WEBHOOK_DEDUP_LRU_SIZE:
+        _recent_keys.popitem(last=False)
+
+def seen_recently(dedup_key: Optional[str]) -> bool:
+    """Fast path for webhook retries already handled by this worker."""
+    return dedup_key is not None and dedup_key in _recent_keys
+
+async def enqueue_jobs(
+    db: AsyncSession,
+    jobs: List[Tuple[dict, Optional[str], Optional[str]]],
+    delay: float = 0,
+    max_wait: float = 0,
+) -> List[int]:
+    """
+    Insert (payload, dedup_key, group_key) triples as pending jobs in one
+    statement. Returns the ids of the inserted jobs; keys already queued
+    (in any worker) are skipped.
+
+    With a delay, jobs of a group are debounced: each new job pushes the
+    pending jobs of its group back by `delay`, unless they have already
+    waited `max_wait`, so a burst is claimed and handled together.
+    """
+    now = utcnow()
+    rows = []
+    batch_keys = set()
+    group_keys = set()
+    for payload, dedup_key, group_key in jobs:
+        if dedup_key is not None:
+            if seen_recently(dedup_key) or dedup_key in batch_keys:
+                continue
+            batch_keys.add(dedup_key)
+        if group_key is not None:
+            group_keys.add(group_key)
+        rows.append({
+            "dedup_key": dedup_key,
+            "group_key": group_key,
+            "payload": json.dumps(payload),
+            "status": JOB_PENDING,
+            "attempts": 0,
+            "run_after": now + timedelta(seconds=delay),
+            "created_at": now,
+        })
+    if not rows:
+        return []
+
+    stmt = (
+        dialect_insert(InboundJob)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["dedup_key"])
+        .returning(InboundJob.id)
+    )
+    job_ids = list((await db.execute(stmt)).scalars().all())
+
+    if job_ids and delay and group_keys:
+        await db.execute(
+            update(InboundJob)
+            .where(InboundJob.status == JOB_PENDING)
+            .where(InboundJob.group_key.in_(group_keys))
+            .where(InboundJob.created_at >= now - timedelta(seconds=max_wait))
+            .where(InboundJob.run_after < now + timedelta(seconds=delay))
+            .values(run_after=now + timedelta(seconds=delay))
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    for dedup_key in batch_keys:
+        _remember_key(dedup_key)
+    return job_ids
+
+async def enqueue_job(
+    db: AsyncSession,
+    payload: dict,
+    dedup_key: Optional[str] = None,
+    group_key: Optional[str] = None,
+    delay: float = 0,
+    max_wait: float = 0,
+) -> Optional[int]:
+    """Single-job enqueue. Returns None if dedup_key is already queued."""
+    job_ids = await enqueue_jobs(db, [(payload, dedup_key, group_key)], delay=delay, max_wait=max_wait)
+    return job_ids[0] if job_ids else None
+
+async def purge_finished_jobs(db: AsyncSession, retention_days: int) -> int:
+    """Delete done/dead jobs older than the retention window (Meta stops retrying by then)."""
+    result = await db.execute(
+        delete(InboundJob)
+        .where(InboundJob.status.in_([JOB_DONE, JOB_DEAD]))
+        .where(InboundJob.run_after < utcnow() - timedelta(days=retention_days))
+    )
+    await db.commit()
+    return result.rowcount
+
+async def count_pending_jobs(db: AsyncSession) -> int:
+    result = await db.execute(select(func.count(InboundJob.id)).filter(InboundJob.status == JOB_PENDING))
+    return result.scalar() or 0
+
+def _claimable(now: datetime):
+    # Another worker holds a live lock on a job of the same group (same sender)
+    running = aliased(InboundJob)
+    group_busy = exists().where(
+        running.group_key == InboundJob.group_key,
+        running.status == JOB_RUNNING,
+        running.locked_until >= now,
+    )
+    return and_(
+        or_(
+            and_(InboundJob.status == JOB_PENDING, InboundJob.run_after <= now),
+            # Visibility timeout expired: the worker holding it died or hung
+            and_(InboundJob.status == JOB_RUNNING, InboundJob.locked_until < now),
+        ),
+        # One batch per group at a time keeps each sender's messages in order
+        ~group_busy,
+    )
+
+async def claim_next_job(db: AsyncSession, visibility_timeout: float) -> Optional[InboundJob]:
+    """
+    Atomically move the oldest runnable job to running. Jobs of a group
+    that is already being processed are skipped. Returns None when there is
+    nothing to do.
+    """
+    for _ in range(5):
+        now = utcnow()
+        query = select(InboundJob.id, InboundJob.group_key).filter(_claimable(now)).order_by(InboundJob.id).limit(1)
+        if is_postgres():
+            # Concurrent claimers skip the row instead of all racing for the oldest one
+            query = query.with_for_update(skip_locked=True, of=InboundJob)
+        candidate = (await db.execute(query)).first()
+        if candidate is None:
+            await db.rollback()
+            return None
+        job_id, group_key = candidate
+
+        if group_key is not None and is_postgres():
+            # Serialize claims per group across processes: the busy check below
+            # then sees any claim committed by another worker meanwhile
+            await db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": group_key})
+
+        # Conditional update so only one worker/process can claim it (SQLite has no SKIP LOCKED)
+        result = await db.execute(
+            update(InboundJob)
+            .where(InboundJob.id == job_id)
+            .where(_claimable(now))
+            .values(
+                status=JOB_RUNNING,
+                attempts=InboundJob.attempts + 1,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        if result.rowcount == 1:
+            return await db.get(InboundJob, job_id, populate_existing=True)
+    return None
+
+async def claim_next_batch(db: AsyncSession, visibility_timeout: float) -> List[InboundJob]:
+    """
+    Claim the oldest runnable job plus every other pending job of its group,
+    whether or not their debounce window has elapsed. Ordered by id.
+    """
+    lead = await claim_next_job(db, visibility_timeout)
+    if lead is None:
+        return []
+    jobs = [lead]
+    if lead.group_key is not None:
+        now = utcnow()
+        result = await db.execute(
+            update(InboundJob)
+            .where(InboundJob.status == JOB_PENDING)
+            .where(InboundJob.group_key == lead.group_key)
+            .values(
+                status=JOB_RUNNING,
+                attempts=InboundJob.attempts + 1,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+            )
+            .returning(InboundJob.id)
+            .execution_options(synchronize_session=False)
+        )
+        follower_ids = list(result.scalars().all())
+        await db.commit()
+        if follower_ids:
+            result = await db.execute(select(InboundJob).filter(InboundJob.id.in_(follower_ids)))
+            jobs.extend(result.scalars().all())
+    jobs.sort(key=lambda job: job.id)
+    return jobs
+
+async def complete_jobs(db: AsyncSession, job_ids: List[int]):
+    await db.execute(
+        update(InboundJob)
+        .where(InboundJob.id.in_(job_ids))
+        .values(status=JOB_DONE, locked_until=None, last_error=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+async def fail_job(db: AsyncSession, job_id: int, attempts: int, error: str, max_attempts: int, backoff: float, backoff_max: float):
+    """Schedule a retry with exponential backoff, or dead-letter the job."""
+    if attempts >= max_attempts:
+        values = {"status": JOB_DEAD, "locked_until": None, "last_error": error}
+        logger.error(f"Job {job_id} dead-lettered after {attempts} attempts: {error}")
+    else:
+        delay = min(backoff_max, backoff * (2 ** (attempts - 1)))
+        values = {
+            "status": JOB_PENDING,
+            "locked_until": None,
+            "last_error": error,
+            "run_after": utcnow() + timedelta(seconds=delay),
+        }
+        logger.warning(f"Job {job_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+    await db.execute(update(InboundJob).where(InboundJob.id == job_id).values(**values))
+    await db.commit()
+
+class JobWorkerPool:
+    """
+    Fixed number of worker tasks per process pulling jobs from inbound_jobs.
+
+    Concurrency is bounded by the number of workers, each holding at most
+    one batch (the jobs of one group). A group is only handled by one
+    worker at a time, in job order, while different groups run in
+    parallel. The handler receives the batch payloads as a list.
+
+    Jobs that fail are retried with exponential backoff and dead-lettered
+    after max_attempts; jobs whose worker died become claimable again once
+    their visibility timeout expires.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[AsyncSession, List[dict]], Awaitable[None]],
+        session_factory,
+        concurrency: int,
+        poll_interval: float,
+        visibility_timeout: float,
+        max_attempts: int,
+        backoff: float,
+        backoff_max: float,
+        max_pending: int,
+    ):
+        self.handler = handler
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.max_pending = max_pending
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pending_count = 0
+        self._pending_checked_at = 0.0
+        self._purged_at = time.monotonic()
+        # Per-group locks inside this process, dropped once no batch holds them
+        self._group_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+        logger.info(f"Started {self.concurrency} inbound job workers")
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def notify(self):
+        """Wake idle workers right after an enqueue instead of waiting for the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def is_saturated(self, db: AsyncSession) -> bool:
+        """Backpressure check for the webhook, refreshed at most once per second."""
+        now = time.monotonic()
+        if now - self._pending_checked_at >= 1.0:
+            self._pending_count = await count_pending_jobs(db)
+            self._pending_checked_at = now
+        return self._pending_count >= self.max_pending
+
+    async def _wait_for_work(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _purge_if_due(self, db: AsyncSession):
+        # Hourly, by whichever idle worker gets here first
+        if time.monotonic() - self._purged_at < 3600:
+            return
+        self._purged_at = time.monotonic()
+        purged = await purge_finished_jobs(db, settings.JOB_RETENTION_DAYS)
+        if purged:
+            logger.info(f"Purged {purged} finished inbound jobs")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                async with self.session_factory() as db:
+                    jobs = await claim_next_batch(db, self.visibility_timeout)
+                    if not jobs:
+                        await self._purge_if_due(db)
+                        await self._wait_for_work()
+                        continue
+                    await self._run(db, jobs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Inbound job worker {worker_id} error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _fail(self, db: AsyncSession, job_id: int, attempts: int, error: str):
+        await fail_job(db, job_id, attempts, error, self.max_attempts, self.backoff, self.backoff_max)
+
+    def _group_lock(self, group_key: str) -> asyncio.Lock:
+        lock = self._group_locks.get(group_key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._group_locks[group_key] = lock
+        return lock
+
+    async def _run(self, db: AsyncSession, jobs: List[InboundJob]):
+        group_key = jobs[0].group_key
+        if group_key is None:
+            await self._run_batch(db, jobs)
+            return
+        # The claim already excludes busy groups; this also orders batches of
+        # one sender within the process if a claim raced with a lock expiry
+        async with self._group_lock(group_key):
+            await self._run_batch(db, jobs)
+
+    async def _run_batch(self, db: AsyncSession, jobs: List[InboundJob]):
+        # Plain values: the handler may roll back and expire the instances
+        live = []
+        payloads = []
+        for job in jobs:
+            if job.attempts > self.max_attempts:
+                # Crashed or timed out on every attempt
+                await self._fail(db, job.id, job.attempts, job.last_error or "Visibility timeout exceeded")
+            else:
+                live.append((job.id, job.attempts))
+                payloads.append(json.loads(job.payload))
+        if not live:
+            return
+
+        try:
+            await asyncio.wait_for(self.handler(db, payloads), timeout=self.visibility_timeout)
+        except Exception as e:
+            await db.rollback()
+            for job_id, attempts in live:
+                await self._fail(db, job_id, attempts, f"{type(e).__name__}: {e}")
+        else:
+            await complete_jobs(db, [job_id for job_id, _ in live])
@@ -0,0 +1,445 @@
+from array import array
+from collections import Counter
+from app.core.config import settings
+from app.services.classifier import fold
+from app.services.conversation_memory import estimate_tokens
+from app.services.message_chunks import split_message
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import hashlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError: # Windows: single-process development only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+
+# Segment file: header, then u32 arrays (native byte order), then the term
+# and passage text blobs. Every array is indexed directly from the mmap.
+#   term_offsets[n_terms + 1]     into the term blob (terms sorted as UTF-8)
+#   term_postings[n_terms + 1]    into the postings arrays
+#   post_passages[n_postings]     passage number, ascending within a term
+#   post_tfs[n_postings]          term frequency in that passage
+#   passage_lengths[n_passages]   tokens per passage
+#   text_offsets[n_passages + 1]  into the text blob
+MAGIC = b"AGKI"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIIII") # magic, version, n_passages, n_terms, n_postings
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset("""
+a o e as os um uma uns umas de do da dos das em no na nos nas por pelo pela pelos pelas para pra
+com sem sob sobre entre ate que se nao sim ou mas como mais menos muito muita ja eu voce ele ela
+eles elas nos vos me te lhe isso isto esse essa este esta aquele aquela seu sua seus suas meu minha
+qual quais quando onde ser sao foi era tem ter ha ao aos
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Accent-folded words without stopwords; a trailing plural "s" is dropped"""
+    tokens = []
+    for word in WORD_PATTERN.findall(fold(text or "")):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+def chunk_text(text: str, chunk_chars: int) -> List[str]:
+    """
+    Passages of up to chunk_chars built from whole paragraphs; a paragraph
+    longer than that is split on sentence boundaries.
+    """
+    passages: List[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text or ""):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        for piece in split_message(paragraph, chunk_chars):
+            if current and len(current) + 1 + len(piece) > chunk_chars:
+                passages.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+def write_segment(path: str, passages: List[str]):
+    """Build the postings of passages and write them as a segment file"""
+    postings: Dict[bytes, List[Tuple[int, int]]] = {}
+    lengths = array("I")
+    for number, passage in enumerate(passages):
+        tokens = tokenize(passage)
+        lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            postings.setdefault(term.encode(), []).append((number, tf))
+
+    terms = sorted(postings)
+    term_offsets, term_postings = array("I", [0]), array("I", [0])
+    post_passages, post_tfs = array("I"), array("I")
+    for term in terms:
+        term_offsets.append(term_offsets[-1] + len(term))
+        for number, tf in postings[term]:
+            post_passages.append(number)
+            post_tfs.append(tf)
+        term_postings.append(len(post_passages))
+
+    texts = [p.encode() for p in passages]
+    text_offsets = array("I", [0])
+    for text in texts:
+        text_offsets.append(text_offsets[-1] + len(text))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(passages), len(terms), len(post_passages)))
+        for section in (term_offsets, term_postings, post_passages, post_tfs, lengths, text_offsets):
+            f.write(section.tobytes())
+        f.write(b"".join(terms))
+        f.write(b"".join(texts))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class Segment:
+    """
+    Read-only, memory-mapped view of one segment file. Searches hold it with
+    acquire()/release(); a segment dropped from the index is retire()d and
+    only closed once the last search using it releases it.
+    """
+
+    def __init__(self, path: str):
+        self._users = 0
+        self._retired = False
+        self._ref_lock = threading.Lock()
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_passages, self.n_terms, n_postings = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a knowledge segment (version {FORMAT_VERSION})")
+
+        self._views: List[memoryview] = []
+        position = HEADER.size
+
+        def u32(count: int) -> memoryview:
+            nonlocal position
+            view = memoryview(self._mmap)[position:position + 4 * count].cast("I")
+            self._views.append(view)
+            position += 4 * count
+            return view
+
+        self._term_offsets = u32(self.n_terms + 1)
+        self._term_postings = u32(self.n_terms + 1)
+        self._post_passages = u32(n_postings)
+        self._post_tfs = u32(n_postings)
+        self.passage_lengths = u32(self.n_passages)
+        self._text_offsets = u32(self.n_passages + 1)
+        self._terms_start = position
+        self._texts_start = position + self._term_offsets[self.n_terms]
+        self.total_length = sum(self.passage_lengths)
+
+    def _term(self, i: int) -> bytes:
+        start = self._terms_start
+        return self._mmap[start + self._term_offsets[i]:start + self._term_offsets[i + 1]]
+
+    def _find(self, term: bytes) -> int:
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < term:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.n_terms and self._term(lo) == term else -1
+
+    def postings(self, term: str) -> Tuple[memoryview, memoryview]:
+        """(passage numbers, term frequencies) of term, empty if absent"""
+        i = self._find(term.encode())
+        if i < 0:
+            return self._post_passages[0:0], self._post_tfs[0:0]
+        start, end = self._term_postings[i], self._term_postings[i + 1]
+        return self._post_passages[start:end], self._post_tfs[start:end]
+
+    def passage(self, number: int) -> str:
+        start = self._texts_start
+        return self._mmap[start + self._text_offsets[number]:start + self._text_offsets[number + 1]].decode()
+
+    def acquire(self):
+        with self._ref_lock:
+            self._users += 1
+
+    def release(self):
+        with self._ref_lock:
+            self._users -= 1
+            unused = self._retired and not self._users
+        if unused:
+            self.close()
+
+    def retire(self):
+        """Close now, or when the last search using the segment releases it"""
+        with self._ref_lock:
+            self._retired = True
+            unused = not self._users
+        if unused:
+            self.close()
+
+    def close(self):
+        for view in getattr(self, "_views", []):
+            view.release()
+        self._views = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A caller still holds postings slices; the map goes away with them
+            pass
+        self._file.close()
+
+class Passage(NamedTuple):
+    doc_id: str
+    name: str
+    text: str
+    score: float
+
+def document_id(name: str) -> str:
+    """Stable id: ingesting a document with the same name replaces it"""
+    return hashlib.sha1(name.strip().lower().encode()).hexdigest()[:12]
+
+class KnowledgeIndex:
+    """
+    BM25 inverted index of knowledge source passages, kept on disk.
+
+    Each document is an immutable segment file, memory-mapped by every
+    worker; a JSON manifest lists the live segments. Adding, replacing or
+    removing a document writes at most one segment and swaps the manifest
+    atomically under a file lock, and other workers pick up the change on
+    their next search by checking whether the manifest file changed. Statistics (N,
+    average length, document frequencies) are combined across segments at
+    query time, so scores don't depend on how documents were ingested.
+    """
+
+    def __init__(self, directory: str, chunk_chars: int):
+        self.directory = directory
+        self.chunk_chars = chunk_chars
+        self._segments: Dict[str, Segment] = {} # file name -> segment
+        self._manifest: dict = {"generation": 0, "documents": []}
+        self._manifest_version: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Changes whenever documents are added or removed"""
+        self._refresh()
+        return self._manifest["generation"]
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Digest of the live documents and their segments. generation starts
+        over when the index directory is recreated, so an unrelated index
+        could repeat an earlier value; this can't.
+        """
+        self._refresh()
+        live = sorted(f"{doc['id']}:{doc['segment']}" for doc in self._manifest["documents"])
+        return hashlib.sha256("\n".join(live).encode()).hexdigest()[:16]
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._path(MANIFEST_NAME), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "documents": []}
+
+    def _refresh(self):
+        """Reopen segments if another worker (or process) changed the manifest"""
+        try:
+            # The manifest is replaced, never rewritten: a new inode means a new version
+            stat = os.stat(self._path(MANIFEST_NAME))
+            version = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            version = None
+        with self._lock:
+            if version == self._manifest_version and (version is not None or not self._segments):
+                return
+            manifest = self._read_manifest()
+            wanted = {doc["segment"] for doc in manifest["documents"]}
+            segments = {name: seg for name, seg in self._segments.items() if name in wanted}
+            for name in wanted - set(segments):
+                try:
+                    segments[name] = Segment(self._path(name))
+                except (OSError, ValueError) as e:
+                    logger.error(f"Could not open knowledge segment {name}: {e}")
+            for name, segment in self._segments.items():
+                if name not in wanted:
+                    segment.retire()
+            self._segments, self._manifest, self._manifest_version = segments, manifest, version
+
+    def _write_manifest(self, manifest: dict):
+        tmp_path = self._path(MANIFEST_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path(MANIFEST_NAME))
+
+    def _locked_update(self, change) -> dict:
+        """Apply change(manifest) -> dropped segment names under the cross-process lock"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(LOCK_NAME), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                manifest = self._read_manifest()
+                dropped = change(manifest)
+                manifest["generation"] += 1
+                self._write_manifest(manifest)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._refresh()
+        # Workers that still map a dropped file keep reading it until they refresh
+        for name in dropped:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+        return manifest
+
+    def documents(self) -> List[dict]:
+        self._refresh()
+        return list(self._manifest["documents"])
+
+    def add_document(self, name: str, text: str, source: Optional[str] = None) -> dict:
+        """Chunk and index a document, replacing any document with the same name"""
+        passages = chunk_text(text, self.chunk_chars)
+        if not passages:
+            raise ValueError("Document has no text to index")
+        doc_id = document_id(name)
+        os.makedirs(self.directory, exist_ok=True)
+        segment_name = f"{doc_id}-{time.time_ns()}.seg"
+        write_segment(self._path(segment_name), passages)
+
+        entry = {
+            "id": doc_id,
+            "name": name.strip(),
+            "source": source,
+            "segment": segment_name,
+            "passages": len(passages),
+            "characters": len(text),
+            "added_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+
+        def change(manifest: dict) -> List[str]:
+            dropped = [d["segment"] for d in manifest["documents"] if d["id"] == doc_id]
+            manifest["documents"] = [d for d in manifest["documents"] if d["id"] != doc_id] + [entry]
+            return dropped
+
+        self._locked_update(change)
+        logger.info(f"Indexed knowledge document '{name}': {len(passages)} passages")
+        return entry
+
+    def remove_document(self, doc_id: str) -> bool:
+        removed = []
+
+        def change(manifest: dict) -> List[str]:
+            removed.extend(d for d in manifest["documents"] if d["id"] == doc_id)
+            manifest["documents"] = [d for d in manifest["documents"] if d["id"] != doc_id]
+            return [d["segment"] for d in removed]
+
+        self._locked_update(change)
+        return bool(removed)
+
+    def search(self, query: str, k: int) -> List[Passage]:
+        """Top k passages for query by BM25, best first"""
+        self._refresh()
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+        # Held until the search ends: add/remove in another thread may drop them
+        with self._lock:
+            docs = [(doc, self._segments.get(doc["segment"])) for doc in self._manifest["documents"]]
+            docs = [(doc, segment) for doc, segment in docs if segment is not None]
+            for _, segment in docs:
+                segment.acquire()
+        try:
+            return self._search(docs, terms, k)
+        finally:
+            for _, segment in docs:
+                segment.release()
+
+    @staticmethod
+    def _search(docs: List[Tuple[dict, Segment]], terms: set, k: int) -> List[Passage]:
+        n_passages = sum(segment.n_passages for _, segment in docs)
+        if not n_passages:
+            return []
+        avg_length = sum(segment.total_length for _, segment in docs) / n_passages
+
+        postings = {term: [segment.postings(term) for _, segment in docs] for term in terms}
+        idf = {}
+        for term, lists in postings.items():
+            df = sum(len(numbers) for numbers, _ in lists)
+            if df:
+                idf[term] = math.log(1 + (n_passages - df + 0.5) / (df + 0.5))
+
+        best: List[Tuple[float, int, int]] = [] # min-heap of (score, doc index, passage)
+        for d, (doc, segment) in enumerate(docs):
+            scores: Dict[int, float] = {}
+            lengths = segment.passage_lengths
+            for term, weight in idf.items():
+                numbers, tfs = postings[term][d]
+                for number, tf in zip(numbers, tfs):
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[number] / avg_length)
+                    scores[number] = scores.get(number, 0.0) + weight * tf * (BM25_K1 + 1) / (tf + norm)
+            for number, score in scores.items():
+                if len(best) < k:
+                    heapq.heappush(best, (score, d, number))
+                elif score > best[0][0]:
+                    heapq.heapreplace(best, (score, d, number))
+
+        return [
+            Passage(docs[d][0]["id"], docs[d][0]["name"], docs[d][1].passage(number), round(score, 4))
+            for score, d, number in sorted(best, reverse=True)
+        ]
+
+knowledge_index = KnowledgeIndex(settings.KNOWLEDGE_INDEX_DIR, settings.KNOWLEDGE_CHUNK_CHARS)
+
+def retrieve_knowledge(query: str, top_k: int, token_budget: int) -> str:
+    """
+    Prompt fragment with the best passages for query, best first, stopping
+    before the token budget (~4 characters per token) is exceeded.
+    """
+    try:
+        passages = knowledge_index.search(query, top_k)
+    except Exception as e:
+        logger.error(f"Knowledge search failed: {e}")
+        return ""
+    parts = []
+    for passage in passages:
+        part = f"[{passage.name}] {passage.text}"
+        cost = estimate_tokens(part)
+        if cost > token_budget:
+            break
+        token_budget -= cost
+        parts.append(part)
+    if not parts:
+        return ""
+    return "\n\nTRECHOS DAS FONTES DE CONHECIMENTO (fundamente a resposta neles e cite a fonte):\n" + "\n\n".join(parts)
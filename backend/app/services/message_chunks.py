@@ -0,0 +1,86 @@
+from typing import List, Optional
+import re
+
+# WhatsApp rejects text messages longer than this
+WHATSAPP_TEXT_LIMIT = 4096
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"[.!?…:;](?=\s)|\n")
+WORD_BREAK = re.compile(r"\s")
+
+def _cut_point(text: str, limit: int) -> int:
+    """
+    Where to split text so the first part fits in limit: the last paragraph
+    break, else the last sentence end, else the last space, ignoring breaks
+    in the first quarter (they would leave a tiny chunk).
+    """
+    window = text[:limit + 1]
+    for pattern in (PARAGRAPH_BREAK, SENTENCE_END, WORD_BREAK):
+        cut = None
+        for match in pattern.finditer(window):
+            if match.end() <= limit:
+                cut = match.end()
+        if cut is not None and cut > limit // 4:
+            return cut
+    return limit
+
+def split_message(text: str, limit: int = WHATSAPP_TEXT_LIMIT) -> List[str]:
+    """Split text into pieces of at most limit characters on natural boundaries"""
+    chunks = []
+    text = (text or "").strip()
+    while len(text) > limit:
+        cut = _cut_point(text, limit)
+        chunks.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        chunks.append(text)
+    return chunks
+
+class ChunkAssembler:
+    """
+    Groups streamed text into WhatsApp messages. A chunk is complete at the
+    first paragraph break after first_chars (chunk_chars for later chunks),
+    or when it would exceed the WhatsApp limit, so the first part of a long
+    answer goes out while the rest is still being generated.
+    """
+
+    def __init__(self, first_chars: int, chunk_chars: int, limit: int = WHATSAPP_TEXT_LIMIT):
+        self.first_chars = first_chars
+        self.chunk_chars = chunk_chars
+        self.limit = limit
+        self._buffer = ""
+        self._emitted = False
+        self.text = "" # Everything fed so far
+
+    def _next_cut(self) -> Optional[int]:
+        target = self.chunk_chars if self._emitted else self.first_chars
+        if len(self._buffer) > self.limit:
+            return _cut_point(self._buffer, self.limit)
+        if len(self._buffer) > target:
+            match = PARAGRAPH_BREAK.search(self._buffer, target)
+            if match and match.end() < len(self._buffer):
+                return match.end()
+        return None
+
+    def _take(self, cut: int) -> str:
+        chunk, self._buffer = self._buffer[:cut].strip(), self._buffer[cut:].lstrip()
+        self._emitted = True
+        return chunk
+
+    def feed(self, delta: str) -> List[str]:
+        """Add streamed text and return the chunks now complete"""
+        self.text += delta
+        self._buffer += delta
+        chunks = []
+        cut = self._next_cut()
+        while cut is not None:
+            chunk = self._take(cut)
+            if chunk:
+                chunks.append(chunk)
+            cut = self._next_cut()
+        return chunks
+
+    def flush(self) -> List[str]:
+        """The remaining text, split if it is still over the limit"""
+        rest, self._buffer = self._buffer, ""
+        return split_message(rest, self.limit)
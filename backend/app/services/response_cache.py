@@ -0,0 +1,150 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.cache_entry import NUM_BANDS
+from app.models.response_cache import ResponseCacheEntry
+from app.services.ai_service import TEXT_SYSTEM_PROMPT
+from app.services.banded_cache import BandedCache, CacheLookup
+from app.services.classifier import fold
+from app.services.config_service import config_cache
+from typing import FrozenSet, List, NamedTuple, Optional, Tuple
+import hashlib
+import logging
+import random
+import re
+import struct
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# SystemConfig key bumped by a flush, so every worker drops its memory tier
+GENERATION_CONFIG_KEY = "response_cache_generation"
+
+SHINGLE_SIZE = 4
+ROWS_PER_BAND = 4
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed: signatures must agree across workers and restarts
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+# Words that flip a question's meaning while barely changing its shingles
+NEGATION_WORDS = frozenset(["nao", "nem", "nunca", "jamais", "sem"])
+
+class QuestionFeatures(NamedTuple):
+    shingles: FrozenSet[int]
+    anchors: Tuple[str, ...] # Numbers and negation words, which must match exactly
+
+def normalize_question(text: str) -> str:
+    """Accent-folded lowercase words separated by single spaces"""
+    return " ".join(WORD_PATTERN.findall(fold(text or "")))
+
+def shingles(normalized: str) -> FrozenSet[int]:
+    """CRC32 of every character 4-gram ("como controlar" -> "como", "omo ", ...)"""
+    if len(normalized) <= SHINGLE_SIZE:
+        return frozenset([zlib.crc32(normalized.encode())])
+    return frozenset(
+        zlib.crc32(normalized[i:i + SHINGLE_SIZE].encode())
+        for i in range(len(normalized) - SHINGLE_SIZE + 1)
+    )
+
+def anchors(normalized: str) -> Tuple[str, ...]:
+    """Numbers and negation words of a normalized question, in order"""
+    return tuple(word for word in normalized.split() if word.isdigit() or word in NEGATION_WORDS)
+
+def question_features(normalized: str) -> QuestionFeatures:
+    return QuestionFeatures(shingles(normalized), anchors(normalized))
+
+def minhash_bands(shingle_set: FrozenSet[int]) -> List[str]:
+    """
+    MinHash signature split into LSH bands. Two questions share at least
+    one band with high probability when their shingle Jaccard is above
+    ~0.6, so bands are the lookup keys and candidates are then checked.
+    """
+    signature = [min((a * s + b) % _MERSENNE_PRIME for s in shingle_set) for a, b in _PERMUTATIONS]
+    return [
+        hashlib.blake2b(
+            struct.pack(f"<{ROWS_PER_BAND}Q", *signature[i * ROWS_PER_BAND:(i + 1) * ROWS_PER_BAND]),
+            digest_size=8,
+        ).hexdigest()
+        for i in range(NUM_BANDS)
+    ]
+
+def jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+def cache_namespace(prompt: str, sources: str) -> str:
+    """Answers are only reused under the same system prompt and knowledge sources"""
+    return f"{_digest(TEXT_SYSTEM_PROMPT + prompt)}:{_digest(sources)}"
+
+class ResponseCache(BandedCache):
+    """
+    Cache of AI answers keyed by normalized question, system prompt hash and
+    knowledge sources hash. Near-duplicates are candidates sharing a MinHash
+    band whose character shingles reach the Jaccard similarity threshold and
+    whose numbers and negation words are the same ("10 hectares" is not a
+    near-duplicate of "100 hectares", nor "posso" of "não posso").
+    """
+
+    model = ResponseCacheEntry
+    generation_key = GENERATION_CONFIG_KEY
+    label = "response cache"
+
+    def __init__(self, max_entries: int, max_db_entries: int, ttl: float, similarity: float):
+        super().__init__(max_entries, max_db_entries, ttl, max_distance=1 - similarity)
+        self.similarity = similarity
+
+    def distance(self, a: QuestionFeatures, b: QuestionFeatures) -> float:
+        if a.anchors != b.anchors:
+            return float("inf")
+        return 1 - jaccard(a.shingles, b.shingles)
+
+    def row_features(self, row: ResponseCacheEntry) -> QuestionFeatures:
+        return question_features(row.question)
+
+    def _lookup(self, question: str, prompt: str, sources: str) -> Optional[CacheLookup]:
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        namespace = cache_namespace(prompt, sources)
+        features = question_features(normalized)
+        return CacheLookup(
+            _digest(f"{namespace}:{normalized}"),
+            namespace,
+            features,
+            minhash_bands(features.shingles),
+            {"question": normalized},
+        )
+
+    async def get(self, db: AsyncSession, question: str, prompt: str = "", sources: str = "") -> Optional[str]:
+        """
+        Cached answer to question (or a near-identical one), None on a miss.
+        A DB hit refreshes the entry's LRU position; the caller commits.
+        """
+        lookup = self._lookup(question, prompt, sources)
+        return await self._get(db, lookup) if lookup is not None else None
+
+    async def put(self, db: AsyncSession, question: str, response: str, prompt: str = "", sources: str = ""):
+        """Store an answer in memory and in the shared table. The caller commits."""
+        lookup = self._lookup(question, prompt, sources)
+        if lookup is None or not response:
+            return
+        await self._put(db, lookup, response)
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MEMORY_ENTRIES,
+    max_db_entries=settings.RESPONSE_CACHE_DB_MAX_ENTRIES,
+    ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+    similarity=settings.RESPONSE_CACHE_SIMILARITY,
+)
+
+config_cache.on_change(response_cache.on_config_change)
@@ -0,0 +1,159 @@
+from math import asin, cos, floor, radians, sin, sqrt
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+import heapq
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = EARTH_RADIUS_KM * 3.141592653589793 / 180
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in km between two points given in degrees"""
+    phi1, phi2 = radians(lat1), radians(lat2)
+    a = sin((phi2 - phi1) / 2) ** 2 + cos(phi1) * cos(phi2) * sin(radians(lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+# A stored point: (key, lat_rad, lon_rad, cos_lat), trig precomputed once on insert
+_Point = Tuple[Hashable, float, float, float]
+
+def _distances_km(phi: float, lam: float, cos_phi: float, points: Iterable[_Point]) -> List[Tuple[float, Hashable]]:
+    """
+    Haversine from one query point to many stored points in a single
+    comprehension, reusing the precomputed radians and cosines.
+    """
+    d = 2 * EARTH_RADIUS_KM
+    return [
+        (d * asin(min(1.0, sqrt(sin((p_phi - phi) / 2) ** 2 + cos_phi * p_cos * sin((p_lam - lam) / 2) ** 2))), key)
+        for key, p_phi, p_lam, p_cos in points
+    ]
+
+class GridIndex:
+    """
+    Points bucketed into fixed lat/lon cells.
+
+    k-nearest expands square rings of cells around the query until the
+    k-th best distance is below the distance to anything not yet scanned,
+    so a query only touches a handful of cells. Points are added, moved
+    and removed individually; there is nothing to rebuild.
+    Longitudes are not wrapped at the antimeridian.
+    """
+
+    def __init__(self, cell_degrees: float = 0.25):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, _Point]] = {}
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return floor(lat / self.cell_degrees), floor(lon / self.cell_degrees)
+
+    def add(self, key: Hashable, lat: float, lon: float):
+        """Insert a point, or move it if the key is already indexed"""
+        self.remove(key)
+        cell = self._cell(lat, lon)
+        phi = radians(lat)
+        self._cells.setdefault(cell, {})[key] = (key, phi, radians(lon), cos(phi))
+        self._where[key] = cell
+
+    def remove(self, key: Hashable):
+        cell = self._where.pop(key, None)
+        if cell is None:
+            return
+        bucket = self._cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self._cells[cell]
+
+    def _unscanned_bound_km(self, lat: float, lon: float, ci: int, cj: int, r: int) -> float:
+        """Lower bound on the distance to any point outside rings 0..r"""
+        size = self.cell_degrees
+        south, north = (ci - r) * size, (ci + r + 1) * size
+        west, east = (cj - r) * size, (cj + r + 1) * size
+        # Outside the latitude band: at least the meridian distance
+        lat_gap = min(lat - south, north - lat) * KM_PER_DEGREE
+        # Inside the band but east/west of it: the widest latitude gives the shortest arc
+        lon_gap_deg = min(lon - west, east - lon)
+        if lon_gap_deg >= 180:
+            return lat_gap
+        widest = min(90.0, max(abs(south), abs(north)))
+        a = cos(radians(lat)) * cos(radians(widest)) * sin(radians(lon_gap_deg) / 2) ** 2
+        lon_gap = 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+        return min(lat_gap, lon_gap)
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        max_km: Optional[float] = None,
+        predicate: Optional[Callable[[Hashable], bool]] = None,
+    ) -> List[Tuple[float, Hashable]]:
+        """
+        The k closest points as (distance_km, key), closest first, optionally
+        limited to max_km and to keys accepted by predicate.
+        """
+        if k <= 0 or not self._where:
+            return []
+        phi, lam = radians(lat), radians(lon)
+        cos_phi = cos(phi)
+        ci, cj = self._cell(lat, lon)
+        cells = self._cells
+        best: List[Tuple[float, Hashable]] = []  # max-heap of (-distance, key)
+
+        def consider(bucket: Dict[Hashable, _Point]):
+            for dist, key in _distances_km(phi, lam, cos_phi, bucket.values()):
+                if max_km is not None and dist > max_km:
+                    continue
+                if predicate is not None and not predicate(key):
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-dist, key))
+                elif dist < -best[0][0]:
+                    heapq.heapreplace(best, (-dist, key))
+
+        r = 0
+        while True:
+            ring_cells = 1 if r == 0 else 8 * r
+            if ring_cells > len(cells):
+                # Sparse data far away: visiting every occupied cell is cheaper than more rings
+                for (i, j), bucket in cells.items():
+                    if max(abs(i - ci), abs(j - cj)) >= r:
+                        consider(bucket)
+                break
+            if r == 0:
+                bucket = cells.get((ci, cj))
+                if bucket:
+                    consider(bucket)
+            else:
+                for dj in range(-r, r + 1):
+                    for i in (ci - r, ci + r):
+                        bucket = cells.get((i, cj + dj))
+                        if bucket:
+                            consider(bucket)
+                for di in range(-r + 1, r):
+                    for j in (cj - r, cj + r):
+                        bucket = cells.get((ci + di, j))
+                        if bucket:
+                            consider(bucket)
+
+            bound = self._unscanned_bound_km(lat, lon, ci, cj, r)
+            if max_km is not None and bound > max_km:
+                break
+            if len(best) == k and -best[0][0] <= bound:
+                break
+            r += 1
+
+        return sorted((-neg, key) for neg, key in best)
+
+    def within(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        predicate: Optional[Callable[[Hashable], bool]] = None,
+    ) -> List[Tuple[float, Hashable]]:
+        """Every point within radius_km as (distance_km, key), closest first"""
+        return self.nearest(lat, lon, len(self._where), max_km=radius_km, predicate=predicate)
@@ -0,0 +1,32 @@
+from typing import List, NamedTuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WebhookBatch(NamedTuple):
+    messages: List[dict]
+    statuses: List[dict]
+
+def parse_webhook(data: dict) -> WebhookBatch:
+    """
+    Collect every message and status event of a webhook POST. Meta may
+    batch several entries, and several changes per entry, in one delivery.
+    """
+    messages = []
+    statuses = []
+    for entry in data.get("entry") or []:
+        for change in entry.get("changes") or []:
+            if change.get("field", "messages") != "messages":
+                continue
+            value = change.get("value") or {}
+            messages.extend(value.get("messages") or [])
+            statuses.extend(value.get("statuses") or [])
+    return WebhookBatch(messages, statuses)
+
+def log_statuses(statuses: List[dict]):
+    """Delivery receipts (sent/delivered/read/failed) for our outbound messages."""
+    for status in statuses:
+        if status.get("status") == "failed":
+            logger.warning(f"Message {status.get('id')} to {status.get('recipient_id')} failed: {status.get('errors')}")
+        else:
+            logger.debug(f"Message {status.get('id')} to {status.get('recipient_id')}: {status.get('status')}")
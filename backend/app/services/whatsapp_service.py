@@ -1,84 +1,81 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import or_
+from sqlalchemy import func, or_, update
 from app.models import Conversation, Message
+from app.models.conversation import LOCATION_SOURCE_CITY, LOCATION_SOURCE_DDD, LOCATION_SOURCE_TEXT
 from app.models.professional import Professional
-from app.models.system_config import SystemConfig
-from app.services.ai_service import analyze_text, analyze_image
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, dialect_insert
+from app.services.ai_service import (
+    IMAGE_ERROR_REPLY, TEXT_ERROR_REPLY, TEXT_INTERRUPTED_NOTE, StreamInterrupted, analyze_text, analyze_image,
+)
+from app.services.analytics_service import record_new_conversation, record_reclassification
+from app.services.config_service import config_cache, get_system_config
+from app.services.conversation_memory import build_context, refresh_summary
+from app.services.document_analysis import build_document_prompt, document_char_limit
+from app.services.document_text import read_document_text
+from app.services.classifier import CLASSIFIER_CONFIG_KEY, build_classifier
+from app.services.area_codes import state_from_whatsapp_id
+from app.services.gazetteer import get_gazetteer
+from app.services.geo_service import professional_index
+from app.services.graph_api import graph_get, graph_post, fetch_media_content
+from app.services.image_cache import image_cache
+from app.services.image_preprocessing import prepare_image
+from app.services.job_queue import JobWorkerPool
+from app.services.knowledge_index import knowledge_index, retrieve_knowledge
+from app.services.message_chunks import ChunkAssembler, split_message
+from app.services.response_cache import response_cache
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
 import logging
-import re
-import httpx
-import base64
-import io
-from pypdf import PdfReader
+import json
 
 logger = logging.getLogger(__name__)
 
-async def get_system_config(db: AsyncSession, key: str):
-    result = await db.execute(select(SystemConfig).filter(SystemConfig.key == key))
-    config = result.scalars().first()
-    
-    if config and config.value:
-        return config.value
-        
-    # Fallback to Environment Variables
-    from app.core.config import settings
-    if key == "whatsapp_access_token":
-        return settings.WHATSAPP_ACCESS_TOKEN
-    if key == "whatsapp_number_id":
-        return settings.WHATSAPP_NUMBER_ID
-    if key == "openai_api_key":
-        return settings.OPENAI_API_KEY
-        
-    return None
+def build_sources_context(knowledge_sources_json: str) -> str:
+    """Build the knowledge sources prompt fragment from the raw config value"""
+    if not knowledge_sources_json:
+        return ""
+    try:
+        sources_list = json.loads(knowledge_sources_json)
+        if isinstance(sources_list, list) and sources_list:
+            return "\n\nFONTES DE CONHECIMENTO RECOMENDADAS: Baseie suas respostas técnicas nestas fontes confiáveis: " + ", ".join(sources_list)
+        return ""
+    except:
+        # If not JSON, use raw text
+        return f"\n\nFONTES DE CONHECIMENTO RECOMENDADAS: {knowledge_sources_json}"
 
 async def download_media(media_id: str, access_token: str) -> bytes:
     """Download media from WhatsApp API"""
-    async with httpx.AsyncClient() as client:
+    try:
         # 1. Get Media URL
-        try:
-            url_response = await client.get(
-                f"https://graph.facebook.com/v17.0/{media_id}",
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
-            if url_response.status_code != 200:
-                logger.error(f"Error getting media URL: {url_response.text}")
-                return None
-                
-            data = url_response.json()
-            media_url = data.get("url")
-            if not media_url:
-                return None
-                
-            # 2. Download Media
-            media_response = await client.get(
-                media_url,
-                headers={"Authorization": f"Bearer {access_token}"}
-            )
-            if media_response.status_code != 200:
-                logger.error(f"Error downloading media: {media_response.text}")
-                return None
-                
-            return media_response.content
-        except Exception as e:
-            logger.error(f"Exception downloading media: {e}")
+        url_response = await graph_get(media_id, access_token)
+        if url_response.status_code != 200:
+            logger.error(f"Error getting media URL: {url_response.text}")
             return None
 
-def extract_text_from_pdf(content: bytes) -> str:
-    """Extract text from PDF bytes"""
-    try:
-        reader = PdfReader(io.BytesIO(content))
-        text = ""
-        for page in reader.pages:
-            text += (page.extract_text() or "") + "\n"
-        return text
+        data = url_response.json()
+        media_url = data.get("url")
+        if not media_url:
+            return None
+
+        # 2. Download Media (same pooled connection to Meta's CDN)
+        media_response = await fetch_media_content(media_url, access_token)
+        if media_response.status_code != 200:
+            logger.error(f"Error downloading media: {media_response.text}")
+            return None
+
+        return media_response.content
     except Exception as e:
-        logger.error(f"Error reading PDF: {e}")
-        return "Erro ao ler PDF."
+        logger.error(f"Exception downloading media: {e}")
+        return None
 
 async def send_whatsapp_message(db: AsyncSession, to: str, text: str):
     """
-    Send message to WhatsApp API using credentials from DB.
+    Send message to WhatsApp API using credentials from DB. Text over the
+    WhatsApp limit is sent as several messages split on paragraph or
+    sentence boundaries.
     """
     try:
         token = await get_system_config(db, "whatsapp_access_token")
@@ -88,75 +85,124 @@ async def send_whatsapp_message(db: AsyncSession, to: str, text: str):
             logger.error("WhatsApp credentials not found in database.")
             return
 
-        # Use v19.0 as it is more recent, or stick to v17.0 but ensure it's valid
-        url = f"https://graph.facebook.com/v19.0/{number_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "messaging_product": "whatsapp",
-            "to": to,
-            "type": "text",
-            "text": {"body": text}
-        }
-        
-        logger.info(f"Sending message to {to} using number_id {number_id}")
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers)
+        for part in split_message(text):
+            payload = {
+                "messaging_product": "whatsapp",
+                "to": to,
+                "type": "text",
+                "text": {"body": part}
+            }
+
+            logger.info(f"Sending message to {to} using number_id {number_id}")
+
+            response = await graph_post(f"{number_id}/messages", token, payload)
             if response.status_code not in [200, 201]:
                 logger.error(f"WhatsApp API Error ({response.status_code}): {response.text}")
-            else:
-                logger.info(f"Message sent to {to} successfully: {response.json()}")
+                return
+            logger.info(f"Message sent to {to} successfully: {response.json()}")
                 
     except Exception as e:
         logger.error(f"Error sending WhatsApp message: {e}")
 
-BRAZIL_STATES = [
-    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 
-    'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 'RJ', 'RN', 
-    'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'
-]
+async def stream_reply(db: AsyncSession, to: str, deltas: AsyncIterator[str]) -> Tuple[str, bool]:
+    """
+    Send a streamed answer in WhatsApp-sized parts, each as soon as it is
+    complete. Returns (text, complete): when the stream breaks off, what was
+    produced is sent followed by a note, and both make up the text.
+    """
+    assembler = ChunkAssembler(settings.WHATSAPP_FIRST_CHUNK_CHARS, settings.WHATSAPP_CHUNK_CHARS)
+    complete = True
+    try:
+        async for delta in deltas:
+            for chunk in assembler.feed(delta):
+                await send_whatsapp_message(db, to, chunk)
+    except StreamInterrupted:
+        complete = False
+    for chunk in assembler.flush():
+        await send_whatsapp_message(db, to, chunk)
+    text = assembler.text.strip()
+    if not complete:
+        await send_whatsapp_message(db, to, TEXT_INTERRUPTED_NOTE)
+        text = f"{text}\n\n{TEXT_INTERRUPTED_NOTE}"
+    return text, complete
+
+class Answer(NamedTuple):
+    text: str
+    sent: bool # Already sent to the user and stored as the assistant message
+    complete: bool = True # False when the stream broke off midway
+
+async def generate_answer(
+    db: AsyncSession,
+    conversation: Conversation,
+    prompt: str,
+    context: str,
+    api_key: Optional[str],
+    history: List[dict],
+) -> Answer:
+    """
+    Answer prompt with the text model. With WHATSAPP_STREAM_REPLIES the
+    answer is sent while streaming; its assistant message is committed
+    before the first part goes out, so a retried job sees the turn as
+    answered instead of sending it again. Until the stream completes the
+    message holds the interrupted note; the final text gets a new
+    timestamp, so polling for newer messages picks it up again.
+    """
+    if not settings.WHATSAPP_STREAM_REPLIES:
+        return Answer(await analyze_text(prompt, context=context, api_key=api_key, history=history), False)
+    deltas = await analyze_text(prompt, context=context, api_key=api_key, history=history, stream=True)
+
+    reply = Message(content=TEXT_INTERRUPTED_NOTE, role="assistant")
+    await append_messages(db, conversation, [reply])
+    await db.commit()
+
+    text, complete = await stream_reply(db, conversation.whatsapp_id, deltas)
+    # Strictly after the placeholder even where timestamps compare to the
+    # second (SQLite), or pollers past the placeholder would miss the text
+    now = max(datetime.now(timezone.utc), reply.timestamp + timedelta(seconds=1))
+    reply.content = text
+    reply.timestamp = now
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation.id)
+        .values(last_message_at=now, last_message_preview=text[:MESSAGE_PREVIEW_CHARS])
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return Answer(text, True, complete)
 
 async def extract_and_update_state(db: AsyncSession, conversation: Conversation, text: str):
     """
-    Extract state and problem category from text and update conversation.
+    Extract state, municipality and problem category from text and update conversation.
     """
     if not text: return conversation.location_state
+    old_classification = (conversation.location_state, conversation.problem_category)
     
-    text_upper = text.upper()
-    text_lower = text.lower()
-    
-    # 1. Extract State
-    found_state = None
-    # Check for 2-letter codes
-    words = re.findall(r'\b[A-Z]{2}\b', text_upper)
-    for w in words:
-        if w in BRAZIL_STATES:
-            found_state = w
-            break
-            
-    # 2. Extract Problem Category
-    found_category = None
-    categories = {
-        'Praga': ['praga', 'inseto', 'lagarta', 'bicho', 'mosca', 'pulgão'],
-        'Doença': ['doença', 'fungo', 'bactéria', 'virus', 'vírus', 'ferrugem', 'mancha'],
-        'Clima': ['clima', 'chuva', 'seca', 'sol', 'geada', 'granizo', 'tempo'],
-        'Nutrição': ['nutrição', 'adubo', 'fertilizante', 'calcário', 'deficiência', 'amarelando'],
-        'Plantio': ['plantio', 'semear', 'semeadura', 'espaçamento', 'semente'],
-        'Colheita': ['colheita', 'colher', 'produção', 'produtividade', 'safra']
-    }
-    
-    for cat, keywords in categories.items():
-        if any(k in text_lower for k in keywords):
-            found_category = cat
-            break
+    # Keyword lexicon can be overridden through the classifier_keywords config
+    classifier = await config_cache.get_parsed(db, CLASSIFIER_CONFIG_KEY, build_classifier)
+    found_state, found_category, _ = classifier.classify(text)
+
+    # A named state wins over a municipality elsewhere in the text
+    place = get_gazetteer().find(text, state_hint=found_state or conversation.location_state)
+    if place and found_state and place.state != found_state:
+        place = None
+    if place:
+        found_state = place.state
             
-    # Update DB if changes found
+    # Update DB if changes found. Text always overrides the area code guess.
     changed = False
-    if found_state and conversation.location_state != found_state:
+    if found_state and (conversation.location_state != found_state or conversation.location_source == LOCATION_SOURCE_DDD):
+        if conversation.location_state != found_state and not place:
+            # The old municipality belongs to the old state
+            conversation.location_city = conversation.latitude = conversation.longitude = None
         conversation.location_state = found_state
+        conversation.location_source = LOCATION_SOURCE_CITY if place else LOCATION_SOURCE_TEXT
+        changed = True
+
+    if place and conversation.location_city != place.name:
+        conversation.location_source = LOCATION_SOURCE_CITY
+        conversation.location_city = place.name
+        conversation.latitude = place.latitude
+        conversation.longitude = place.longitude
         changed = True
         
     if found_category and conversation.problem_category != found_category:
@@ -165,15 +211,20 @@ async def extract_and_update_state(db: AsyncSession, conversation: Conversation,
         
     if changed:
         db.add(conversation)
+        await record_reclassification(
+            db, conversation.started_at, old_classification,
+            (conversation.location_state, conversation.problem_category),
+        )
         await db.commit()
         await db.refresh(conversation)
         return found_state
     
     return conversation.location_state
 
-async def get_relevant_professionals(db: AsyncSession, state: str, text: str):
+async def get_relevant_professionals(db: AsyncSession, state: str, text: str, lat: Optional[float] = None, lon: Optional[float] = None):
     """
     Search for professionals based on state and keywords in text.
+    When the user's coordinates are known, the closest ones are returned.
     """
     text_lower = text.lower() if text else ""
     
@@ -184,6 +235,15 @@ async def get_relevant_professionals(db: AsyncSession, state: str, text: str):
     elif any(k in text_lower for k in ["agrônomo", "agronomo", "planta", "lavoura", "soja", "milho"]):
         prof_type = "Agrônomo"
     
+    if lat is not None and lon is not None:
+        await professional_index.ensure_fresh(db)
+        nearby = professional_index.nearest(lat, lon, prof_type, limit=3)
+        ids = [p["id"] for p in nearby if p["distance"] is not None]
+        if ids:
+            result = await db.execute(select(Professional).filter(Professional.id.in_(ids)))
+            by_id = {p.id: p for p in result.scalars().all()}
+            return [by_id[i] for i in ids if i in by_id]
+
     query = select(Professional)
     
     if state:
@@ -197,163 +257,316 @@ async def get_relevant_professionals(db: AsyncSession, state: str, text: str):
     result = await db.execute(query)
     return result.scalars().all()
 
+MESSAGE_PREVIEW_CHARS = 120
+
+async def append_messages(db: AsyncSession, conversation: Conversation, messages: List[Message]):
+    """
+    Add messages to a conversation and update its last_message_at,
+    last_message_preview and message_count in the same transaction.
+    The caller commits.
+    """
+    if not messages:
+        return
+    now = datetime.now(timezone.utc)
+    for message in messages:
+        message.conversation_id = conversation.id
+        if message.timestamp is None:
+            message.timestamp = now
+    db.add_all(messages)
+
+    last = messages[-1]
+    preview = last.content or ("[mídia]" if last.media_url else "")
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation.id)
+        .values(
+            message_count=Conversation.message_count + len(messages),
+            last_message_at=last.timestamp,
+            last_message_preview=preview[:MESSAGE_PREVIEW_CHARS],
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+async def _stored_message_ids(db: AsyncSession, messages: List[dict]) -> Dict[str, int]:
+    """WhatsApp message id -> Message.id of the messages already stored"""
+    message_ids = [m.get("id") for m in messages if m.get("id")]
+    result = await db.execute(select(Message.external_id, Message.id).filter(Message.external_id.in_(message_ids)))
+    return dict(result.all())
+
+async def unanswered_messages(db: AsyncSession, conversation: Conversation, messages: List[dict]) -> List[dict]:
+    """
+    The messages of a batch still waiting for an answer. On a retry, those
+    an earlier attempt stored before the conversation's last reply are
+    dropped (a sender's batches run one at a time, so that reply covers them).
+    """
+    stored = await _stored_message_ids(db, messages)
+    if not stored:
+        return messages
+    result = await db.execute(
+        select(func.max(Message.id)).filter(Message.conversation_id == conversation.id, Message.role == "assistant")
+    )
+    last_reply_id = result.scalar()
+    if last_reply_id is None:
+        return messages
+    return [m for m in messages if stored.get(m.get("id"), last_reply_id + 1) > last_reply_id]
+
+async def log_user_messages(db: AsyncSession, conversation: Conversation, messages: List[dict], contents: List[dict]) -> int:
+    """
+    Store the user messages of a turn, except those an earlier attempt
+    already stored, and commit. Returns the id of the turn's first message.
+    """
+    stored = await _stored_message_ids(db, messages)
+    new_messages = [
+        Message(content=content["body"], role="user", media_url=content["media_id"], external_id=message.get("id"))
+        for message, content in zip(messages, contents)
+        if message.get("id") not in stored
+    ]
+    await append_messages(db, conversation, new_messages)
+    await db.commit()
+    return min(list(stored.values()) + [m.id for m in new_messages])
+
+async def get_or_create_conversation(db: AsyncSession, wa_id: str) -> Conversation:
+    """
+    Atomic find-or-create on the unique whatsapp_id, safe when two workers
+    see the first messages of a new number at the same time. New
+    conversations start with the state of the number's area code.
+    """
+    result = await db.execute(select(Conversation).filter(Conversation.whatsapp_id == wa_id))
+    conversation = result.scalars().first()
+    if conversation:
+        return conversation
+
+    ddd_state = state_from_whatsapp_id(wa_id)
+    result = await db.execute(
+        dialect_insert(Conversation)
+        .values(
+            whatsapp_id=wa_id,
+            location_state=ddd_state,
+            location_source=LOCATION_SOURCE_DDD if ddd_state else None,
+            last_message_at=datetime.now(timezone.utc),
+        )
+        .on_conflict_do_nothing(index_elements=["whatsapp_id"])
+        .returning(Conversation.started_at)
+    )
+    inserted = result.first()
+    if inserted:
+        await record_new_conversation(db, inserted[0], ddd_state)
+    await db.commit()
+    result = await db.execute(select(Conversation).filter(Conversation.whatsapp_id == wa_id))
+    return result.scalars().one()
+
+async def read_documents(documents: List[dict], access_token: str) -> str:
+    """
+    Text of the documents of a burst, each up to the document character
+    limit. Without map-reduce the prompt only holds DOCUMENT_PROMPT_CHARS
+    in all, so the documents share that limit instead.
+    """
+    doc_texts = []
+    char_limit = document_char_limit()
+    if not settings.DOCUMENT_MAP_REDUCE_ENABLED:
+        char_limit //= len(documents)
+    for doc in documents:
+        media_content = await download_media(doc["media_id"], access_token)
+        if media_content:
+            doc_texts.append(await read_document_text(doc["mime_type"], media_content, char_limit))
+    return "\n\n".join(doc_texts)
+
+def parse_message_content(message_data: dict) -> dict:
+    """
+    Normalize an incoming WhatsApp message into the fields we use.
+    """
+    msg_type = message_data.get("type")
+    content = {"type": msg_type, "body": None, "media_id": None, "caption": None, "mime_type": ""}
+
+    if msg_type == "text":
+        content["body"] = message_data.get("text", {}).get("body")
+    elif msg_type == "image":
+        image_data = message_data.get("image", {})
+        content["media_id"] = image_data.get("id")
+        content["caption"] = image_data.get("caption")
+        content["body"] = content["caption"] or "[Imagem]"
+    elif msg_type == "document":
+        doc_data = message_data.get("document", {})
+        content["media_id"] = doc_data.get("id")
+        content["caption"] = doc_data.get("caption")
+        content["mime_type"] = doc_data.get("mime_type", "")
+        content["body"] = content["caption"] or f"[Documento: {doc_data.get('filename')}]"
+    else:
+        content["body"] = f"[{msg_type} não suportado]"
+    return content
+
 async def process_whatsapp_message(db: AsyncSession, message_data: dict):
     """
-    Process incoming WhatsApp message.
+    Process a single incoming WhatsApp message.
+    """
+    await process_whatsapp_messages(db, [message_data])
+
+async def process_whatsapp_messages(db: AsyncSession, messages: List[dict]):
+    """
+    Process a burst of messages from the same user as one turn: every
+    message is logged, but the AI is called and the reply sent only once.
     """
     try:
-        wa_id = message_data.get("from")
-        msg_type = message_data.get("type")
+        wa_id = messages[0].get("from") if messages else None
         
         if not wa_id:
             return
 
-        # Find or create conversation
-        result = await db.execute(select(Conversation).filter(Conversation.whatsapp_id == wa_id))
-        conversation = result.scalars().first()
-        
-        if not conversation:
-            conversation = Conversation(whatsapp_id=wa_id)
-            db.add(conversation)
-            await db.commit()
-            await db.refresh(conversation)
+        conversation = await get_or_create_conversation(db, wa_id)
+
+        # A retried job: don't answer (or log) the same messages twice
+        messages = await unanswered_messages(db, conversation, messages)
+        if not messages:
+            return
 
         # Extract content
-        msg_body = None
-        media_id = None
-        media_type = None
-        caption = None
-
-        if msg_type == "text":
-            msg_body = message_data.get("text", {}).get("body")
-        elif msg_type == "image":
-            image_data = message_data.get("image", {})
-            media_id = image_data.get("id")
-            caption = image_data.get("caption")
-            media_type = "image"
-            msg_body = caption or "[Imagem]"
-        elif msg_type == "document":
-            doc_data = message_data.get("document", {})
-            media_id = doc_data.get("id")
-            caption = doc_data.get("caption")
-            media_type = "document"
-            msg_body = caption or f"[Documento: {doc_data.get('filename')}]"
-        else:
-            msg_body = f"[{msg_type} não suportado]"
-
-        # Log User Message
-        user_msg = Message(
-            conversation_id=conversation.id,
-            content=msg_body,
-            role="user",
-            media_url=media_id
-        )
-        db.add(user_msg)
-        await db.commit()
+        contents = [parse_message_content(m) for m in messages]
+
+        # Log User Messages
+        first_message_id = await log_user_messages(db, conversation, messages, contents)
+
+        # Summary and recent turns, without the messages being answered
+        memory = await build_context(db, conversation, before_id=first_message_id)
 
         # Generate Response
         response_text = ""
+        sent = False
         openai_key = await get_system_config(db, "openai_api_key")
         whatsapp_token = await get_system_config(db, "whatsapp_access_token")
         
-        # Load Knowledge Sources (Updated)
-        knowledge_sources_json = await get_system_config(db, "knowledge_sources")
-        sources_context = ""
-        if knowledge_sources_json:
-            try:
-                import json
-                sources_list = json.loads(knowledge_sources_json)
-                if isinstance(sources_list, list) and sources_list:
-                    sources_context = "\n\nFONTES DE CONHECIMENTO RECOMENDADAS: Baseie suas respostas técnicas nestas fontes confiáveis: " + ", ".join(sources_list)
-            except:
-                # If not JSON, use raw text
-                sources_context = f"\n\nFONTES DE CONHECIMENTO RECOMENDADAS: {knowledge_sources_json}"
+        # Load Knowledge Sources (parsed once per config snapshot)
+        sources_context = await config_cache.get_parsed(db, "knowledge_sources", build_sources_context)
+
+        texts = [c["body"] for c in contents if c["type"] == "text" and c["body"]]
+        images = [c for c in contents if c["type"] == "image" and c["media_id"]]
+        documents = [c for c in contents if c["type"] == "document" and c["media_id"]]
+        # Text and captions of the whole burst in arrival order, e.g. photo + "soja" + "MT"
+        user_text = "\n".join(
+            c["body"] if c["type"] == "text" else c["caption"]
+            for c in contents
+            if (c["body"] if c["type"] == "text" else c["caption"])
+        )
 
         # Try to extract state/category from any available text
-        text_to_analyze = msg_body
-        if msg_type == "document":
-             # We'll update this later after extracting doc text
-             pass
-        else:
-             current_state = await extract_and_update_state(db, conversation, text_to_analyze)
+        # (document text is analyzed after extraction)
+        if user_text:
+            await extract_and_update_state(db, conversation, user_text)
+
+        # Documents are read first so a photo sent with a PDF sees both
+        doc_text = ""
+        if documents and whatsapp_token:
+            doc_text = await read_documents(documents, whatsapp_token)
+            if doc_text:
+                # Update state/category from doc text
+                await extract_and_update_state(db, conversation, doc_text[:1000] + user_text)
+
+        if (images or documents) and not whatsapp_token:
+            response_text = "Erro: Token do WhatsApp não configurado no sistema."
+
+        elif images:
+            media_contents = await asyncio.gather(*[download_media(c["media_id"], whatsapp_token) for c in images])
+            prepared_images = await asyncio.gather(*[prepare_image(m) for m in media_contents if m])
+            if prepared_images:
+                image_context = sources_context + memory.summary_prompt()
+                if user_text:
+                    image_context += f"\nLegenda do usuário: {user_text}"
+                if doc_text:
+                    image_context += "\n\nDocumento enviado junto com a imagem:\n" + await build_document_prompt(doc_text, "", openai_key)
+
+                # A single photo with no earlier context: the analysis only depends
+                # on the image, caption and prompt (forwarded or resent photos)
+                image_hash = prepared_images[0].dhash if len(prepared_images) == 1 and not documents else None
+                cacheable = settings.IMAGE_CACHE_ENABLED and image_hash is not None and not memory.summary
+                cached = await image_cache.get(db, image_hash, user_text, sources_context) if cacheable else None
+                if cached:
+                    response_text = cached
+                else:
+                    response_text = await analyze_image(list(prepared_images), context=image_context, api_key=openai_key)
+                    if cacheable and openai_key and response_text != IMAGE_ERROR_REPLY:
+                        await image_cache.put(db, image_hash, response_text, user_text, sources_context)
+            else:
+                response_text = "Não consegui baixar a imagem do WhatsApp."
+
+        elif documents:
+            if doc_text:
+                # Long documents: notes from every chunk, read concurrently
+                prompt = await build_document_prompt(doc_text, user_text, openai_key)
+                knowledge = retrieve_knowledge(
+                    user_text or doc_text[:1000], settings.KNOWLEDGE_TOP_K, settings.KNOWLEDGE_TOKEN_BUDGET
+                )
+                response_text, sent, _ = await generate_answer(
+                    db, conversation, prompt, sources_context + knowledge + memory.summary_prompt(), openai_key, memory.messages
+                )
+            else:
+                response_text = "Não consegui baixar o documento."
 
-        if msg_type == "text":
+        elif texts:
+            msg_body = user_text
             # 2. Check for professionals if state is known or implied
             context_info = sources_context # Start with sources
             if "contato" in msg_body.lower() or "ajuda" in msg_body.lower() or "preciso" in msg_body.lower() or "procurar" in msg_body.lower():
-                professionals = await get_relevant_professionals(db, conversation.location_state, msg_body)
+                professionals = await get_relevant_professionals(
+                    db, conversation.location_state, msg_body, conversation.latitude, conversation.longitude
+                )
                 if professionals:
                     prof_list = "\n".join([f"- {p.name} ({p.type}), {p.city}-{p.state}. Tel: {p.phone or 'N/A'}" for p in professionals])
                     context_info = f"\n\nCONTEXTO: Encontrei estes profissionais que podem ajudar o usuário. Se apropriado, sugira-os:\n{prof_list}"
             elif not conversation.location_state and ("onde" in msg_body.lower() or "região" in msg_body.lower() or "cidade" in msg_body.lower()):
-                 context_info = "\n\nCONTEXTO: Ainda não sei a região (Estado/UF) do usuário. Pergunte educadamente onde ele está para indicarmos profissionais próximos."
+                 context_info = "\n\nCONTEXTO: Ainda não sei a região do usuário. Pergunte educadamente em qual cidade ele está para indicarmos profissionais próximos."
 
-            response_text = await analyze_text(msg_body, context=context_info, api_key=openai_key)
-
-        elif msg_type == "image" and media_id:
-            if not whatsapp_token:
-                response_text = "Erro: Token do WhatsApp não configurado no sistema."
-            else:
-                media_content = await download_media(media_id, whatsapp_token)
-                if media_content:
-                    b64_img = base64.b64encode(media_content).decode('utf-8')
-                    # Pass caption as context if available (not currently supported in analyze_image but logic is self-contained there for now)
-                    # Actually analyze_image takes base64. We can update prompt inside analyze_image or just use generic one.
-                    # For better UX, let's just call analyze_image.
-                    image_context = sources_context
-                    if caption:
-                        image_context += f"\nLegenda do usuário: {caption}"
-                    
-                    response_text = await analyze_image(b64_img, context=image_context, api_key=openai_key)
-                else:
-                    response_text = "Não consegui baixar a imagem do WhatsApp."
-
-        elif msg_type == "document" and media_id:
-            if not whatsapp_token:
-                response_text = "Erro: Token do WhatsApp não configurado no sistema."
+            # Answers only depend on the question and prompt when there is no earlier context.
+            # Passages follow from the question, so the index fingerprint stands in for them.
+            cacheable = settings.RESPONSE_CACHE_ENABLED and not memory.messages and not memory.summary
+            cache_sources = f"{sources_context}#knowledge-{knowledge_index.fingerprint}"
+            cached = await response_cache.get(db, msg_body, context_info, cache_sources) if cacheable else None
+            if cached:
+                response_text = cached
             else:
-                media_content = await download_media(media_id, whatsapp_token)
-                if media_content:
-                    # Check if PDF
-                    mime_type = message_data.get("document", {}).get("mime_type", "")
-                    doc_text = ""
-                    if "pdf" in mime_type:
-                        doc_text = extract_text_from_pdf(media_content)
-                    else:
-                        # Try decoding as text
-                        try:
-                            doc_text = media_content.decode('utf-8')
-                        except:
-                            doc_text = "[Conteúdo binário não suportado para leitura direta]"
-                    
-                    # Update state/category from doc text
-                    await extract_and_update_state(db, conversation, doc_text[:1000] + (caption or ""))
-
-                    prompt = f"Analise este documento.\n\nConteúdo extraído:\n{doc_text[:4000]}" # Limit to 4000 chars
-                    if caption:
-                        prompt += f"\n\nLegenda/Instrução do usuário: {caption}"
-                    
-                    response_text = await analyze_text(prompt, context=sources_context, api_key=openai_key)
-                else:
-                    response_text = "Não consegui baixar o documento."
+                knowledge = retrieve_knowledge(msg_body, settings.KNOWLEDGE_TOP_K, settings.KNOWLEDGE_TOKEN_BUDGET)
+                response_text, sent, complete = await generate_answer(
+                    db, conversation, msg_body, context_info + knowledge + memory.summary_prompt(), openai_key, memory.messages
+                )
+                # A broken-off answer is neither cached nor reused
+                if cacheable and openai_key and complete and response_text != TEXT_ERROR_REPLY:
+                    await response_cache.put(db, msg_body, response_text, context_info, cache_sources)
 
-        
         else:
             response_text = "Desculpe, ainda não sei processar este tipo de mensagem."
 
-        # Log Assistant Message
-        assistant_msg = Message(
-            conversation_id=conversation.id,
-            content=response_text,
-            role="assistant"
-        )
-        db.add(assistant_msg)
+        # Log Assistant Message (streamed answers are already stored)
+        if not sent:
+            assistant_msg = Message(content=response_text, role="assistant")
+            await append_messages(db, conversation, [assistant_msg])
         await db.commit()
 
         # Send response back to WhatsApp
-        await send_whatsapp_message(db, wa_id, response_text)
+        if not sent:
+            await send_whatsapp_message(db, wa_id, response_text)
+
+        # Every few turns, fold older history into the summary (after the reply
+        # is out; a failure here must not make the queue resend the reply)
+        try:
+            if await refresh_summary(db, conversation.id, api_key=openai_key):
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Could not refresh summary of conversation {conversation.id}: {e}")
 
     except Exception as e:
         logger.error(f"Error processing message: {e}")
+        # Let the job queue retry it
+        raise
+
+inbound_queue = JobWorkerPool(
+    handler=process_whatsapp_messages,
+    session_factory=AsyncSessionLocal,
+    concurrency=settings.JOB_WORKER_CONCURRENCY,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+    visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    backoff=settings.JOB_RETRY_BACKOFF_SECONDS,
+    backoff_max=settings.JOB_RETRY_BACKOFF_MAX_SECONDS,
+    max_pending=settings.JOB_QUEUE_MAX_PENDING,
+)
 # Force update Sun Jan 11 19:50:16 -03 2026
 # Force update Sun Jan 11 19:50:22 -03 2026
@@ -0,0 +1,66 @@
+"""
+Benchmark of state/category extraction: the previous per-keyword scan vs.
+the classifier. Run from backend/: python benchmarks/bench_classifier.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.classifier import BRAZIL_STATES, DEFAULT_CATEGORIES, default_classifier
+
+def legacy_classify(text):
+    text_upper = text.upper()
+    text_lower = text.lower()
+    found_state = None
+    for w in re.findall(r'\b[A-Z]{2}\b', text_upper):
+        if w in BRAZIL_STATES:
+            found_state = w
+            break
+    found_category = None
+    for cat, keywords in DEFAULT_CATEGORIES.items():
+        if any(k in text_lower for k in keywords):
+            found_category = cat
+            break
+    return found_state, found_category
+
+SHORT = "Estou com lagarta na soja aqui em Sinop MT, o que aplicar?"
+DOCUMENT = (
+    "Boletim técnico de manejo integrado. A ferrugem asiática da soja é causada pelo fungo "
+    "Phakopsora pachyrhizi e se dissemina com chuva frequente e temperaturas amenas. "
+    "Recomenda-se o monitoramento semanal das lavouras a partir do estádio V4, a semeadura "
+    "dentro da janela recomendada e o uso de cultivares precoces. Em Mato Grosso e Goiás, "
+    "o vazio sanitário deve ser respeitado. Deficiência de potássio pode agravar sintomas. "
+) * 3
+DOCUMENT = DOCUMENT[:1000]
+# A typical mix of WhatsApp messages
+MESSAGES = [
+    "Bom dia",
+    "minha soja está com ferrugem, o que faço?",
+    "Estou com lagarta na soja aqui em Sinop MT, o que aplicar?",
+    "as folhas do milho estão amarelando, pode ser falta de adubo?",
+    "choveu muito essa semana aqui no Paraná",
+    "qual o espaçamento para plantio de feijão",
+    "obrigado!",
+    "preciso de um veterinário, a vaca está com mastite",
+]
+
+def main():
+    number = 20000
+    for label, text in (("short message", SHORT), ("1000-char document", DOCUMENT)):
+        legacy = timeit.timeit(lambda: legacy_classify(text), number=number)
+        current = timeit.timeit(lambda: default_classifier.classify(text), number=number)
+        print(f"{label}:")
+        print(f"  legacy   {legacy / number * 1e6:8.2f} us/op -> {legacy_classify(text)}")
+        print(f"  current  {current / number * 1e6:8.2f} us/op -> {default_classifier.classify(text)[:2]}")
+
+    legacy = timeit.timeit(lambda: [legacy_classify(m) for m in MESSAGES], number=number)
+    current = timeit.timeit(lambda: [default_classifier.classify(m) for m in MESSAGES], number=number)
+    print(f"{len(MESSAGES)} typical messages:")
+    print(f"  legacy   {legacy / number / len(MESSAGES) * 1e6:8.2f} us/msg")
+    print(f"  current  {current / number / len(MESSAGES) * 1e6:8.2f} us/msg")
+
+if __name__ == "__main__":
+    main()
@@ -4,5 +4,11 @@ set -o errexit
 
 pip install -r requirements.txt
 
-# Create tables
-python create_missing_tables.py
+# Apply schema migrations (databases created with create_all are adopted in place)
+alembic upgrade head
+
+# Recount dashboard rollups (creates them on first deploy)
+python app/db/rebuild_rollups.py
+
+# Full IBGE municipality list for the gazetteer (the repo ships a subset)
+python app/data/update_municipios.py || echo "Could not download the municipality list, keeping the bundled one"
@@ -11,7 +11,11 @@ from app.db.base import Base
 from app.models.user import User
 from app.models.conversation import Conversation, Message
 from app.models.professional import Professional
-from app.models.system_config import SystemConfig
+from app.models.system_config import SystemConfig, SystemConfigVersion
+from app.models.job import InboundJob
+from app.models.analytics import ConversationRollup, TrendBaseline
+from app.models.response_cache import ResponseCacheEntry
+from app.models.image_cache import ImageAnalysisCacheEntry
 
 async def create_tables():
     async with engine.begin() as conn:
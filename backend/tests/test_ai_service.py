@@ -0,0 +1,49 @@
+import pytest
+from types import SimpleNamespace
+from app.services import ai_service
+
+def test_openai_client_registry_is_bounded_lru(monkeypatch):
+    monkeypatch.setattr(ai_service.settings, "OPENAI_CLIENT_REGISTRY_SIZE", 2)
+    monkeypatch.setattr(ai_service, "_clients", ai_service.OrderedDict())
+
+    a = ai_service.get_openai_client("sk-a")
+    b = ai_service.get_openai_client("sk-b")
+    assert ai_service.get_openai_client("sk-a") is a
+    ai_service.get_openai_client("sk-c")
+
+    # "sk-b" was least recently used
+    assert list(ai_service._clients) == ["sk-a", "sk-c"]
+    assert a._client is b._client  # shared connection pool
+
+def test_rotated_key_is_evicted(monkeypatch):
+    monkeypatch.setattr(ai_service, "_clients", ai_service.OrderedDict())
+    ai_service.get_openai_client("sk-old")
+    ai_service._on_config_change("openai_api_key", "sk-old", "sk-new")
+    assert "sk-old" not in ai_service._clients
+
+def fake_client(deltas, fail_after):
+    async def events():
+        for delta in deltas:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+        if fail_after:
+            raise ConnectionError("connection reset")
+
+    async def create(**kwargs):
+        if not fail_after:
+            raise ConnectionError("connection refused")
+        return events()
+
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+@pytest.mark.asyncio
+async def test_stream_failure_before_text_yields_the_error_reply():
+    deltas = [d async for d in ai_service._stream_completion(fake_client([], fail_after=False), [])]
+    assert deltas == [ai_service.TEXT_ERROR_REPLY]
+
+@pytest.mark.asyncio
+async def test_stream_failure_midway_is_raised():
+    received = []
+    with pytest.raises(ai_service.StreamInterrupted):
+        async for delta in ai_service._stream_completion(fake_client(["Aplique ", "fungicida"], fail_after=True), []):
+            received.append(delta)
+    assert received == ["Aplique ", "fungicida"]
@@ -0,0 +1,122 @@
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy.future import select
+from app.api.api_v1.endpoints.analytics import get_problem_ranking, get_problem_trends, get_problems_by_region, get_state_ranking
+from app.models.analytics import ConversationRollup, TrendBaseline
+from app.services import analytics_service, whatsapp_service
+from app.services.analytics_service import rebuild_rollups
+
+async def snapshot(db):
+    return (
+        await get_state_ranking(db),
+        await get_problem_ranking(None, db),
+        await get_problem_ranking("GO", db),
+        await get_problems_by_region(db),
+    )
+
+@pytest.mark.asyncio
+async def test_rollups_follow_reclassification_and_match_rebuild(db):
+    whatsapp_service.config_cache.invalidate()
+    first = await whatsapp_service.get_or_create_conversation(db, "5566999990000")  # DDD 66: MT
+    second = await whatsapp_service.get_or_create_conversation(db, "5564999990000")  # DDD 64: GO
+    await whatsapp_service.get_or_create_conversation(db, "14155550100")  # Unknown state
+
+    ranking = await get_state_ranking(db)
+    assert sorted((r["state"], r["count"]) for r in ranking) == [("GO", 1), ("MT", 1)]
+
+    await whatsapp_service.extract_and_update_state(db, first, "lagarta na soja aqui em Rio Verde")
+    await whatsapp_service.extract_and_update_state(db, second, "ferrugem na folha")
+    await whatsapp_service.extract_and_update_state(db, second, "praga de lagarta, muita lagarta")
+
+    live = await snapshot(db)
+    assert live[0] == [{"state": "GO", "count": 2}]
+    assert live[1] == [{"problem": "Praga", "count": 2}]
+    assert live[3] == [{"state": "GO", "problems": [{"problem": "Praga", "count": 2}]}]
+
+    await rebuild_rollups(db)
+    assert await snapshot(db) == live
+
+async def add_rollups(db, rows):
+    db.add_all([ConversationRollup(bucket=b, location_state=s, problem_category=c, count=n) for b, s, c, n in rows])
+    await db.commit()
+
+@pytest.mark.asyncio
+async def test_trends_flag_spikes_against_ewma_baseline(db, monkeypatch):
+    monkeypatch.setattr(analytics_service, "_baselines_through", None)
+    today = datetime.now(timezone.utc).date()
+    history = []
+    for days_ago in range(1, 31):
+        day = today - timedelta(days=days_ago)
+        history += [(day, "MT", "Doença", 1), (day, "GO", "Praga", 2)]
+    await add_rollups(db, history + [(today, "MT", "Doença", 12), (today, "GO", "Praga", 2)])
+
+    trends = await get_problem_trends("day", 7, None, None, db)
+    assert len(trends["periods"]) == 7 and trends["periods"][-1] == today.isoformat()
+    first, second = trends["series"]
+    assert (first["state"], first["category"], first["anomaly"]) == ("MT", "Doença", True)
+    assert first["counts"] == [1, 1, 1, 1, 1, 1, 12]
+    assert (second["state"], second["anomaly"]) == ("GO", False)
+
+    weekly = await get_problem_trends("week", 2, "GO", None, db)
+    assert [s["state"] for s in weekly["series"]] == ["GO"]
+
+@pytest.mark.asyncio
+async def test_baselines_advance_incrementally(db, monkeypatch):
+    start = date(2026, 1, 1)
+    await add_rollups(db, [(start + timedelta(days=d), "SP", "Clima", d % 3) for d in range(20)])
+
+    monkeypatch.setattr(analytics_service, "_baselines_through", None)
+    await analytics_service.advance_trend_baselines(db, start + timedelta(days=9), alpha=0.2)
+    monkeypatch.setattr(analytics_service, "_baselines_through", None)
+    assert await analytics_service.advance_trend_baselines(db, start + timedelta(days=19), alpha=0.2) == 1
+    incremental = (await db.execute(select(TrendBaseline).execution_options(populate_existing=True))).scalars().one()
+
+    mean = variance = 0.0
+    for d in range(20):
+        diff = d % 3 - mean
+        mean += 0.2 * diff
+        variance = 0.8 * (variance + diff * 0.2 * diff)
+    assert incremental.observations == 20
+    assert incremental.last_bucket == start + timedelta(days=19)
+    assert incremental.mean == pytest.approx(mean)
+    assert incremental.variance == pytest.approx(variance)
+
+def ewma(counts, alpha=0.2):
+    mean = variance = 0.0
+    for count in counts:
+        diff = count - mean
+        mean += alpha * diff
+        variance = (1 - alpha) * (variance + diff * alpha * diff)
+    return mean, variance
+
+@pytest.mark.asyncio
+async def test_new_pair_reads_only_its_own_history(db, monkeypatch):
+    start = date(2026, 1, 1)
+    await add_rollups(db, [(start + timedelta(days=d), "SP", "Clima", d % 3) for d in range(10)])
+    monkeypatch.setattr(analytics_service, "_baselines_through", None)
+    await analytics_service.advance_trend_baselines(db, start + timedelta(days=9), alpha=0.2)
+
+    # A pair first seen now, with history going back to the first day
+    await add_rollups(db, [(start + timedelta(days=d), "GO", "Pragas", d % 2 + 1) for d in range(15)])
+    await add_rollups(db, [(start + timedelta(days=d), "SP", "Clima", d % 3) for d in range(10, 15)])
+
+    read = []
+    execute = db.execute
+    async def counting_execute(statement, *args, **kwargs):
+        result = await execute(statement, *args, **kwargs)
+        if "count" not in getattr(statement, "selected_columns", {}).keys():
+            return result
+        frozen = result.freeze()
+        read.extend(frozen().all())
+        return frozen()
+    monkeypatch.setattr(db, "execute", counting_execute)
+    monkeypatch.setattr(analytics_service, "_baselines_through", None)
+    assert await analytics_service.advance_trend_baselines(db, start + timedelta(days=14), alpha=0.2) == 2
+    result = await db.execute(select(TrendBaseline).execution_options(populate_existing=True))
+    baselines = {b.location_state: b for b in result.scalars().all()}
+
+    assert (baselines["SP"].mean, baselines["SP"].variance) == pytest.approx(ewma([d % 3 for d in range(15)]))
+    assert (baselines["GO"].mean, baselines["GO"].variance) == pytest.approx(ewma([d % 2 + 1 for d in range(15)]))
+    assert baselines["GO"].observations == baselines["SP"].observations == 15
+    # SP continues from its last bucket: only GO's history is read in full
+    assert len(read) == 5 + 15
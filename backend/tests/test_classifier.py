@@ -0,0 +1,44 @@
+import json
+from app.services.classifier import build_classifier, default_classifier
+
+def test_state_names_are_accent_and_case_insensitive():
+    assert default_classifier.classify("aqui em sao paulo").state == "SP"
+    assert default_classifier.classify("Fazenda no MATO GROSSO").state == "MT"
+    assert default_classifier.classify("mato grosso do sul").state == "MS"
+    assert default_classifier.classify("Goias e Minas Gerais").state == "GO"
+
+def test_codes_match_in_any_case_unless_they_are_words():
+    assert default_classifier.classify("se a folha secar, o que faço?").state is None
+    assert default_classifier.classify("adubo para o milho").state is None
+    assert default_classifier.classify("Sinop-MT").state == "MT"
+    assert default_classifier.classify("sinop mt").state == "MT"
+    assert default_classifier.classify("dourados ms, soja com ferrugem").state == "MS"
+    assert default_classifier.classify("cascavel pr").state == "PR"
+    # Lowercased, these are words: "go", "pé", "tô"
+    assert default_classifier.classify("vou plantar, go!").state is None
+    assert default_classifier.classify("o pé de milho tá amarelo").state is None
+    assert default_classifier.classify("tô sem chuva faz um mês").state is None
+    assert default_classifier.classify("Rio Verde GO").state == "GO"
+    # A state name before a code wins, and vice versa
+    assert default_classifier.classify("saí de Goiás, agora estou no MT").state == "GO"
+    assert default_classifier.classify("MT, perto de Goiás").state == "MT"
+    # All caps: "SE" is the word, not Sergipe
+    assert default_classifier.classify("SE CHOVER MUITO O QUE FAÇO").state is None
+
+def test_categories_are_scored_not_first_hit():
+    result = default_classifier.classify("tem chuva, mas as lagartas e os pulgões e insetos tomaram conta")
+    assert result.scores == {"Clima": 1, "Praga": 3}
+    assert result.category == "Praga"
+    assert default_classifier.classify("pulgão e mais pulgões").scores == {"Praga": 2}
+    # Whole words: "solo" is not "sol"
+    assert default_classifier.classify("análise de solo").category is None
+
+def test_lexicon_loaded_from_config():
+    classifier = build_classifier(json.dumps({
+        "categories": {"Pecuária": ["bezerro", "mastite"]},
+        "states": {"MT": ["nortão"]},
+    }))
+    result = classifier.classify("Bezerros com mastite no Nortao")
+    assert result.category == "Pecuária"
+    assert result.state == "MT"
+    assert build_classifier("not json") is default_classifier
@@ -0,0 +1,66 @@
+import pytest
+from app.models.system_config import SystemConfig
+from app.services.config_service import ConfigCache, bump_config_version
+
+@pytest.mark.asyncio
+async def test_config_cache_sees_changes_from_other_workers(session_factory):
+    cache = ConfigCache(ttl=300, poll_interval=0)
+    changes = []
+    cache.on_change(lambda key, old, new: changes.append((key, old, new)))
+
+    async with session_factory() as db:
+        db.add(SystemConfig(key="knowledge_sources", value='["Embrapa"]'))
+        await bump_config_version(db)
+        await db.commit()
+
+    async with session_factory() as db:
+        assert await cache.get(db, "knowledge_sources") == '["Embrapa"]'
+        parsed = await cache.get_parsed(db, "knowledge_sources", lambda v: v.upper())
+        assert parsed == '["EMBRAPA"]'
+
+    # Another worker updates the value: only the version row tells us
+    async with session_factory() as db:
+        config = (await db.execute(SystemConfig.__table__.select())).first()
+        await db.execute(
+            SystemConfig.__table__.update()
+            .where(SystemConfig.id == config.id)
+            .values(value='["MAPA"]')
+        )
+        await bump_config_version(db)
+        await db.commit()
+
+    async with session_factory() as db:
+        assert await cache.get(db, "knowledge_sources") == '["MAPA"]'
+    assert changes == [("knowledge_sources", '["Embrapa"]', '["MAPA"]')]
+
+@pytest.mark.asyncio
+async def test_config_cache_env_fallback(db, monkeypatch):
+    from app.core.config import settings
+    monkeypatch.setattr(settings, "WHATSAPP_NUMBER_ID", "12345")
+    cache = ConfigCache(ttl=300, poll_interval=5)
+    assert await cache.get(db, "whatsapp_number_id") == "12345"
+    assert await cache.get(db, "missing_key") is None
+
+@pytest.mark.asyncio
+async def test_version_row_is_created_then_bumped(db):
+    await bump_config_version(db)
+    await bump_config_version(db)
+    await db.commit()
+    assert await ConfigCache(ttl=300, poll_interval=0)._read_version(db) == 2
+
+@pytest.mark.asyncio
+async def test_notify_during_a_reload_is_not_lost(db):
+    cache = ConfigCache(ttl=300, poll_interval=5)
+    read_version = cache._read_version
+
+    async def notified_while_reading(db):
+        cache.invalidate()
+        return await read_version(db)
+
+    cache._read_version = notified_while_reading
+    await cache.get(db, "knowledge_sources")
+    assert cache._stale
+
+    cache._read_version = read_version
+    await cache.get(db, "knowledge_sources")
+    assert not cache._stale
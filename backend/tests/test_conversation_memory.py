@@ -0,0 +1,127 @@
+import pytest
+from sqlalchemy.future import select
+from app.models import Conversation, Message
+from app.services import conversation_memory, whatsapp_service
+from app.services.conversation_memory import build_context, estimate_tokens, refresh_summary
+
+async def conversation_with(db, turns, first=0):
+    conversation = await whatsapp_service.get_or_create_conversation(db, "5566999990000")
+    for i in range(first, first + turns):
+        await whatsapp_service.append_messages(db, conversation, [
+            Message(content=f"pergunta {i}", role="user"),
+            Message(content=f"resposta {i}", role="assistant"),
+        ])
+    await db.commit()
+    return conversation
+
+@pytest.mark.asyncio
+async def test_context_is_recent_messages_oldest_first(db):
+    conversation = await conversation_with(db, 3)
+    context = await build_context(db, conversation, max_messages=3)
+    assert context.summary is None
+    assert context.messages == [
+        {"role": "assistant", "content": "resposta 1"},
+        {"role": "user", "content": "pergunta 2"},
+        {"role": "assistant", "content": "resposta 2"},
+    ]
+
+@pytest.mark.asyncio
+async def test_context_respects_token_budget_and_before_id(db):
+    conversation = await conversation_with(db, 3)
+    last = (await db.execute(select(Message).order_by(Message.id.desc()))).scalars().first()
+
+    context = await build_context(
+        db, conversation, before_id=last.id, max_messages=10, token_budget=2 * estimate_tokens("pergunta 0")
+    )
+    assert [m["content"] for m in context.messages] == ["resposta 1", "pergunta 2"]
+
+@pytest.mark.asyncio
+async def test_summary_is_refreshed_every_few_turns(db, monkeypatch):
+    monkeypatch.setattr(conversation_memory.settings, "HISTORY_MAX_MESSAGES", 4)
+    monkeypatch.setattr(conversation_memory.settings, "SUMMARY_REFRESH_TURNS", 2)
+    transcripts = []
+
+    async def summarize(previous, transcript, api_key=None):
+        transcripts.append((previous, transcript))
+        return f"resumo {len(transcripts)}"
+
+    monkeypatch.setattr(conversation_memory, "summarize_conversation", summarize)
+
+    # 3 turns = 6 messages: only 2 outside a 4 message window, below 2 turns
+    conversation = await conversation_with(db, 3)
+    assert not await refresh_summary(db, conversation.id, api_key="sk-test")
+
+    await conversation_with(db, 1, first=3)
+    assert await refresh_summary(db, conversation.id, api_key="sk-test")
+    await db.commit()
+    assert transcripts == [(None, "Usuário: pergunta 0\nAssistente: resposta 0\nUsuário: pergunta 1\nAssistente: resposta 1")]
+
+    conversation = (await db.execute(select(Conversation))).scalars().one()
+    await db.refresh(conversation)
+    assert conversation.summary == "resumo 1"
+    assert conversation.summary_message_count == 4
+
+    # Folded messages leave the history; the summary replaces them
+    context = await build_context(db, conversation)
+    assert context.summary == "resumo 1"
+    assert [m["content"] for m in context.messages] == ["pergunta 2", "resposta 2", "pergunta 3", "resposta 3"]
+    assert "resumo 1" in context.summary_prompt()
+    assert not await refresh_summary(db, conversation.id, api_key="sk-test")
+
+@pytest.mark.asyncio
+async def test_summary_folds_what_the_token_budget_leaves_out(db, monkeypatch):
+    monkeypatch.setattr(conversation_memory.settings, "HISTORY_MAX_MESSAGES", 10)
+    monkeypatch.setattr(conversation_memory.settings, "HISTORY_TOKEN_BUDGET", 3 * estimate_tokens("pergunta 0"))
+    monkeypatch.setattr(conversation_memory.settings, "SUMMARY_REFRESH_TURNS", 1)
+
+    async def summarize(previous, transcript, api_key=None):
+        return "resumo"
+
+    monkeypatch.setattr(conversation_memory, "summarize_conversation", summarize)
+
+    # 6 messages, all within the message limit, but only 3 fit the budget
+    conversation = await conversation_with(db, 3)
+    assert await refresh_summary(db, conversation.id, api_key="sk-test")
+    await db.commit()
+    await db.refresh(conversation)
+    assert conversation.summary_message_count == 3
+
+    # Nothing falls between the summary and the history
+    context = await build_context(db, conversation)
+    assert [m["content"] for m in context.messages] == ["resposta 1", "pergunta 2", "resposta 2"]
+
+@pytest.mark.asyncio
+async def test_long_backlog_is_folded_a_batch_at_a_time(db, monkeypatch):
+    monkeypatch.setattr(conversation_memory.settings, "HISTORY_MAX_MESSAGES", 2)
+    monkeypatch.setattr(conversation_memory.settings, "SUMMARY_REFRESH_TURNS", 1)
+    monkeypatch.setattr(conversation_memory.settings, "SUMMARY_BATCH_MESSAGES", 4)
+    transcripts = []
+
+    async def summarize(previous, transcript, api_key=None):
+        transcripts.append(transcript)
+        return f"resumo {len(transcripts)}"
+
+    monkeypatch.setattr(conversation_memory, "summarize_conversation", summarize)
+
+    # 12 messages, 10 outside the window: folded 4, 4, then 2
+    conversation = await conversation_with(db, 6)
+    for folded in (4, 8, 10):
+        assert await refresh_summary(db, conversation.id, api_key="sk-test")
+        await db.commit()
+        await db.refresh(conversation)
+        assert conversation.summary_message_count == folded
+    assert not await refresh_summary(db, conversation.id, api_key="sk-test")
+
+    assert transcripts[0].startswith("Usuário: pergunta 0")
+    assert transcripts[1].startswith("Usuário: pergunta 2")
+    assert transcripts[2] == "Usuário: pergunta 4\nAssistente: resposta 4"
+    context = await build_context(db, conversation)
+    assert [m["content"] for m in context.messages] == ["pergunta 5", "resposta 5"]
+
+    # The token cap also bounds a batch
+    monkeypatch.setattr(conversation_memory.settings, "SUMMARY_BATCH_TOKEN_BUDGET", 1)
+    await conversation_with(db, 2, first=6)
+    assert await refresh_summary(db, conversation.id, api_key="sk-test")
+    await db.commit()
+    await db.refresh(conversation)
+    assert conversation.summary_message_count == 11
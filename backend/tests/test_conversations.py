@@ -0,0 +1,78 @@
+import base64
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from sqlalchemy import text
+from app.api.api_v1.endpoints.conversations import read_conversations, read_messages
+from app.models import Conversation, Message
+
+@pytest.mark.asyncio
+async def test_conversation_pages_follow_last_message(db):
+    base = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    # Same timestamp for several rows, and rows left to the server default (now)
+    db.add_all([Conversation(whatsapp_id=f"55119000000{i:02d}", last_message_at=base + timedelta(minutes=i // 3)) for i in range(20)])
+    db.add_all([Conversation(whatsapp_id=f"55219000000{i:02d}") for i in range(5)])
+    await db.commit()
+
+    seen, cursor = [], None
+    while True:
+        page = await read_conversations(limit=7, cursor=cursor, include_total=False, db=db)
+        seen += [c["id"] for c in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 25
+    # Rows with the server default are the most recent
+    assert seen[:5] == [25, 24, 23, 22, 21]
+    assert seen[5:8] == [20, 19, 18]
+
+@pytest.mark.asyncio
+async def test_messages_latest_older_and_newer(db):
+    conversation = Conversation(whatsapp_id="5566999990000")
+    db.add(conversation)
+    await db.commit()
+    base = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    db.add_all([Message(conversation_id=conversation.id, content=str(i), role="user", timestamp=base + timedelta(seconds=i)) for i in range(7)])
+    await db.commit()
+
+    latest = await read_messages(conversation.id, limit=3, before=None, after=None, db=db)
+    assert [m["content"] for m in latest["items"]] == ["4", "5", "6"]
+    older = await read_messages(conversation.id, limit=3, before=latest["prev_cursor"], after=None, db=db)
+    assert [m["content"] for m in older["items"]] == ["1", "2", "3"]
+    oldest = await read_messages(conversation.id, limit=3, before=older["prev_cursor"], after=None, db=db)
+    assert [m["content"] for m in oldest["items"]] == ["0"] and oldest["prev_cursor"] is None
+
+    nothing_new = await read_messages(conversation.id, limit=3, before=None, after=latest["next_cursor"], db=db)
+    assert nothing_new["items"] == [] and nothing_new["next_cursor"] == latest["next_cursor"]
+    db.add(Message(conversation_id=conversation.id, content="7", role="assistant"))
+    await db.commit()
+    newer = await read_messages(conversation.id, limit=3, before=None, after=latest["next_cursor"], db=db)
+    assert [m["content"] for m in newer["items"]] == ["7"]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("values", [["x", "y"], [None, 1], ["2026-03-01T00:00:00+00:00", "1"], ["2026-03-01", True], [1]])
+async def test_tampered_cursors_are_rejected(db, values):
+    conversation = Conversation(whatsapp_id="5566999990000")
+    db.add(conversation)
+    await db.commit()
+    cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+    with pytest.raises(HTTPException) as error:
+        await read_conversations(limit=10, cursor=cursor, include_total=False, db=db)
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        await read_messages(conversation.id, limit=10, before=None, after=cursor, db=db)
+    assert error.value.status_code == 400
+
+@pytest.mark.asyncio
+async def test_sqlite_keyset_queries_use_an_index(db):
+    plans = []
+    for query in (
+        "SELECT id FROM conversations WHERE (datetime(last_message_at), id) < (datetime('2026-03-01'), 5) "
+        "ORDER BY datetime(last_message_at) DESC, id DESC LIMIT 10",
+        "SELECT id FROM messages WHERE conversation_id = 1 ORDER BY datetime(timestamp) DESC, id DESC LIMIT 10",
+    ):
+        plans.append(" ".join(row[-1] for row in (await db.execute(text(f"EXPLAIN QUERY PLAN {query}"))).all()))
+    assert "ix_conversations_last_message_datetime" in plans[0]
+    assert "ix_messages_conversation_datetime" in plans[1]
+    assert not any("TEMP B-TREE" in plan for plan in plans)
@@ -0,0 +1,35 @@
+import json
+import pytest
+from starlette.requests import Request
+from app.api.api_v1.endpoints import dashboard
+from app.models.professional import Professional
+from app.services import whatsapp_service
+
+def request(headers=None):
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+@pytest.mark.asyncio
+async def test_summary_is_cached_and_supports_etag(db, monkeypatch):
+    monkeypatch.setattr(dashboard, "_summary_cache", None)
+    whatsapp_service.config_cache.invalidate()
+    conversation = await whatsapp_service.get_or_create_conversation(db, "5566999990000")
+    await whatsapp_service.extract_and_update_state(db, conversation, "lagarta na soja")
+    await whatsapp_service.get_or_create_conversation(db, "5511999990000")
+    db.add(Professional(name="Vet", type="Veterinário", state="MT", city="Sinop"))
+    await db.commit()
+
+    response = await dashboard.read_dashboard_summary(request(), db)
+    assert response.status_code == 200
+    summary = json.loads(response.body)
+    assert summary["totals"] == {"conversations": 2, "professionals": 1}
+    assert summary["today"] == {"new_conversations": 2, "active_conversations": 2}
+    assert summary["week"]["active_users"] == 2
+    assert summary["by_category"] == [{"category": "Praga", "count": 1}]
+    assert sorted(s["state"] for s in summary["by_state"]) == ["MT", "SP"]
+    assert len(summary["daily"]) == 7 and summary["daily"][-1]["with_problem"] == 1
+
+    etag = response.headers["etag"]
+    await whatsapp_service.get_or_create_conversation(db, "5521999990000")
+    cached = await dashboard.read_dashboard_summary(request({"If-None-Match": etag}), db)
+    assert cached.status_code == 304
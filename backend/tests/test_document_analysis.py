@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from app.services import document_analysis
+from app.services.document_analysis import build_document_prompt, split_document
+
+def report(pages=6):
+    return "\n\n".join(f"Página {i}\n" + "Linha de texto do laudo de solo. " * 60 for i in range(1, pages + 1))
+
+def test_split_document_respects_chunk_size():
+    chunks = split_document(report(), chunk_tokens=500)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 2000 for chunk in chunks)
+    assert chunks[0].startswith("Página 1\n")
+
+@pytest.mark.asyncio
+async def test_long_document_is_mapped_concurrently_then_reduced(monkeypatch):
+    monkeypatch.setattr(document_analysis.settings, "DOCUMENT_CHUNK_TOKENS", 500)
+    monkeypatch.setattr(document_analysis.settings, "DOCUMENT_MAP_CONCURRENCY", 2)
+    running, peak, seen = 0, 0, []
+
+    async def extract_notes(chunk, instruction, part, parts, api_key=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        seen.append(part)
+        return None if part == 2 else f"notas {part}"
+
+    monkeypatch.setattr(document_analysis, "extract_document_notes", extract_notes)
+    prompt = await build_document_prompt(report(), "qual o pH?", api_key="sk-test")
+
+    parts = len(split_document(report(), 500))
+    assert sorted(seen) == list(range(1, parts + 1))
+    assert peak == 2
+    assert f"[Parte 1/{parts}]\nnotas 1" in prompt
+    assert f"[Parte 2/{parts}]" not in prompt  # failed chunk is skipped
+    assert prompt.index("[Parte 1/") < prompt.index(f"[Parte {parts}/")
+    assert prompt.endswith("Legenda/Instrução do usuário: qual o pH?")
+
+@pytest.mark.asyncio
+async def test_short_document_or_failed_map_uses_text(monkeypatch):
+    async def extract_notes(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(document_analysis, "extract_document_notes", extract_notes)
+    assert "Conteúdo extraído:\nLaudo curto" in await build_document_prompt("Laudo curto")
+
+    prompt = await build_document_prompt(report())
+    assert "Conteúdo extraído:\nPágina 1" in prompt
+    assert len(prompt) < document_analysis.settings.DOCUMENT_PROMPT_CHARS + 100
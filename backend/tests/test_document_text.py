@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+import time
+from app.services import document_text
+from app.services.document_text import (
+    PDF_TIMEOUT_ERROR, PDF_TOO_LARGE_ERROR, ExtractionPool, ExtractionTimeout, extract_pdf_text, extract_text_from_pdf,
+)
+
+def make_pdf(pages):
+    """Minimal PDF with one line of Helvetica text per page"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R /Resources << /Font << /F1 3 0 R >> >> >>" % len(objects))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+PDF = make_pdf([f"Pagina {i} sobre ferrugem da soja" for i in range(10)])
+
+def test_extraction_stops_at_char_budget(monkeypatch):
+    pages_read = []
+    iter_pages = document_text.iter_pdf_pages
+
+    def counting(content, max_pages):
+        for text in iter_pages(content, max_pages):
+            pages_read.append(text)
+            yield text
+
+    monkeypatch.setattr(document_text, "iter_pdf_pages", counting)
+    text = extract_text_from_pdf(PDF, max_chars=50)
+    assert text.startswith("Pagina 0 sobre ferrugem da soja")
+    assert len(text) == 50
+    assert len(pages_read) == 2
+
+    assert extract_text_from_pdf(PDF, max_pages=3).count("Pagina") == 3
+
+@pytest.mark.asyncio
+async def test_extraction_runs_in_pool_and_is_cached(monkeypatch):
+    monkeypatch.setattr(document_text, "_text_cache", document_text.OrderedDict())
+    try:
+        text = await extract_pdf_text(PDF)
+        assert text.count("Pagina") == 10
+
+        # Served from the cache, also for a smaller budget
+        monkeypatch.setattr(document_text, "_get_pool", lambda: pytest.fail("parsed again"))
+        assert await extract_pdf_text(PDF) == text
+        assert await extract_pdf_text(PDF, max_chars=20) == text[:20]
+    finally:
+        document_text.shutdown_extraction_pool()
+
+@pytest.mark.asyncio
+async def test_limits(monkeypatch):
+    monkeypatch.setattr(document_text, "_text_cache", document_text.OrderedDict())
+    monkeypatch.setattr(document_text.settings, "PDF_MAX_BYTES", 100)
+    assert await extract_pdf_text(PDF) == PDF_TOO_LARGE_ERROR
+
+    monkeypatch.setattr(document_text.settings, "PDF_MAX_BYTES", 10 ** 7)
+    monkeypatch.setattr(document_text.settings, "PDF_EXTRACTION_TIMEOUT_SECONDS", 0.001)
+    try:
+        assert await extract_pdf_text(PDF) == PDF_TIMEOUT_ERROR
+    finally:
+        document_text.shutdown_extraction_pool()
+
+@pytest.mark.asyncio
+async def test_timeout_kills_only_the_job_that_ran_over():
+    pool = ExtractionPool(2)
+    try:
+        # Start both workers first, so their startup isn't part of the timings
+        await asyncio.gather(pool.run(abs, -1, timeout=60), pool.run(abs, -2, timeout=60))
+        workers = list(pool._idle)
+
+        stuck, slow = await asyncio.gather(
+            pool.run(time.sleep, 30, timeout=0.5), pool.run(time.sleep, 1, timeout=5), return_exceptions=True
+        )
+        assert isinstance(stuck, ExtractionTimeout)
+        assert slow is None  # time.sleep's result: it ran to the end
+        assert [w for w in workers if w.process.is_alive()] == pool._idle
+        assert len(pool._idle) == 1
+
+        assert await pool.run(extract_text_from_pdf, PDF, 20, 10, timeout=10) == "Pagina 0 sobre ferru"
+    finally:
+        pool.shutdown()
+
+@pytest.mark.asyncio
+async def test_time_waiting_for_a_worker_is_not_timed():
+    pool = ExtractionPool(1)
+    try:
+        await pool.run(abs, -1, timeout=60)
+        # Each job fits its timeout, the two in a row wouldn't
+        assert await asyncio.gather(*[pool.run(time.sleep, 0.4, timeout=0.7) for _ in range(2)]) == [None, None]
+    finally:
+        pool.shutdown()
@@ -0,0 +1,47 @@
+import pytest
+from app.services.gazetteer import Gazetteer, get_gazetteer
+
+def test_finds_cities_after_place_cues():
+    gazetteer = get_gazetteer()
+    place = gazetteer.find("minha soja aqui em sinop está com ferrugem")
+    assert (place.name, place.state) == ("Sinop", "MT")
+    assert round(place.latitude) == -12
+
+    assert gazetteer.find("perto de Rio Verde").state == "GO"
+    assert gazetteer.find("sou de rio verde de mato grosso").state == "MS"
+    assert gazetteer.find("fazenda no município de Luís Eduardo Magalhães").name == "Luís Eduardo Magalhães"
+
+def test_ignores_city_names_used_as_words():
+    gazetteer = get_gazetteer()
+    assert gazetteer.find("mandei um sorriso pro técnico") is None
+    assert gazetteer.find("Lagarto comendo a folha") is None
+    assert gazetteer.find("tem um lagarto na plantação, o Sorriso do meu filho").name == "Sorriso"
+
+def test_homonyms_need_a_state_hint():
+    gazetteer = get_gazetteer()
+    assert gazetteer.find("moro em Palmas") is None
+    assert gazetteer.find("moro em Palmas", state_hint="PR").state == "PR"
+
+def test_city_named_like_another_state_is_ignored():
+    gazetteer = Gazetteer([("Tocantins", "MG", -21.17, -43.01), ("Goiás", "GO", -15.93, -50.14)])
+    assert gazetteer.find("moro em Tocantins") is None
+    assert gazetteer.find("moro em Goiás").state == "GO"
+
+def test_update_municipios_rewrites_the_list(tmp_path):
+    from app.data.update_municipios import update
+    source = tmp_path / "ibge.csv"
+    source.write_text(
+        "codigo_ibge,nome,latitude,longitude,capital,codigo_uf\n"
+        "5107909,Sinop,-11.8604,-55.5091,0,51\n"
+        "1100015,Alta Floresta D'Oeste,-11.9283,-61.9953,0,11\n",
+        encoding="utf-8",
+    )
+    output = tmp_path / "municipios.csv"
+    assert update(str(source), str(output), min_rows=2) == 2
+    assert output.read_text(encoding="utf-8").splitlines() == [
+        "nome,uf,latitude,longitude",
+        "Sinop,MT,-11.8604,-55.5091",
+        "Alta Floresta D'Oeste,RO,-11.9283,-61.9953",
+    ]
+    with pytest.raises(ValueError):
+        update(str(source), str(output))
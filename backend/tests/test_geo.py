@@ -1,9 +1,100 @@
+import random
 import pytest
-from app.services.geo_service import find_nearby_professionals
+from app.models.professional import Professional
+from app.services.geo_service import ProfessionalIndex, find_nearby_professionals
+from app.services.spatial_index import GridIndex, haversine_km
+
+def test_grid_index_matches_brute_force():
+    rng = random.Random(7)
+    points = {i: (rng.uniform(-33, 5), rng.uniform(-73, -35)) for i in range(2000)}
+    index = GridIndex(cell_degrees=0.5)
+    for key, (lat, lon) in points.items():
+        index.add(key, lat, lon)
+    for key in range(0, 2000, 10):
+        index.remove(key)
+        del points[key]
+
+    for _ in range(50):
+        lat, lon = rng.uniform(-33, 5), rng.uniform(-73, -35)
+        expected = sorted((haversine_km(lat, lon, *p), key) for key, p in points.items())
+
+        nearest = index.nearest(lat, lon, 5)
+        assert [key for _, key in nearest] == [key for _, key in expected[:5]]
+
+        within = index.within(lat, lon, 300)
+        assert [key for _, key in within] == [key for d, key in expected if d <= 300]
+
+def test_grid_index_finds_far_away_points():
+    index = GridIndex(cell_degrees=0.25)
+    index.add("manaus", -3.119, -60.0217)
+    [(distance, key)] = index.nearest(-23.55, -46.63, 3)
+    assert key == "manaus"
+    assert 2600 < distance < 2750
 
 @pytest.mark.asyncio
-async def test_find_nearby_professionals():
-    professionals = await find_nearby_professionals(-23.55, -46.63)
-    assert len(professionals) > 0
-    assert "name" in professionals[0]
-    assert "distance" in professionals[0]
+async def test_find_nearby_professionals(db, monkeypatch):
+    monkeypatch.setattr("app.services.geo_service.professional_index", ProfessionalIndex(0.25, 0))
+    db.add_all([
+        Professional(name="Campinas", type="Veterinário", state="SP", city="Campinas", latitude=-22.9056, longitude=-47.0608),
+        Professional(name="BH", type="Veterinário", state="MG", city="Belo Horizonte", latitude=-19.9167, longitude=-43.9345),
+        Professional(name="Sinop", type="Agrônomo", state="MT", city="Sinop", latitude=-11.8642, longitude=-55.5066),
+        Professional(name="Sem local", type="Veterinário", state="SP", city="Santos"),
+    ])
+    await db.commit()
+
+    professionals = await find_nearby_professionals(db, -23.55, -46.63)
+    assert [p["name"] for p in professionals] == ["Campinas", "BH", "Sem local"]
+    assert professionals[0]["distance"] < professionals[1]["distance"]
+    assert professionals[2]["distance"] is None
+
+    professionals = await find_nearby_professionals(db, -23.55, -46.63, radius_km=200)
+    assert [p["name"] for p in professionals] == ["Campinas"]
+
+    professionals = await find_nearby_professionals(db, -23.55, -46.63, "agronomist", limit=1)
+    assert [p["name"] for p in professionals] == ["Sinop"]
+
+@pytest.mark.asyncio
+async def test_index_applies_local_changes(db):
+    index = ProfessionalIndex(0.25, 3600)
+    await index.ensure_fresh(db)
+    p = Professional(name="Campinas", type="Veterinário", state="SP", city="Campinas", latitude=-22.9056, longitude=-47.0608)
+    db.add(p)
+    await db.commit()
+
+    await index.upsert(db, p)
+    assert [r["name"] for r in index.nearest(-23.55, -46.63, "Veterinário")] == ["Campinas"]
+
+    await db.delete(p)
+    await db.commit()
+    await index.remove(db, p.id)
+    assert index.nearest(-23.55, -46.63, "Veterinário") == []
+
+@pytest.mark.asyncio
+async def test_local_change_does_not_hide_other_workers_changes(db, session_factory):
+    index = ProfessionalIndex(0.25, 3600)
+    await index.ensure_fresh(db)
+
+    # Another worker adds a professional; this one hasn't checked yet
+    async with session_factory() as other:
+        other.add(Professional(name="Sorocaba", type="Veterinário", state="SP", city="Sorocaba", latitude=-23.5015, longitude=-47.4526))
+        await other.commit()
+
+    p = Professional(name="Campinas", type="Veterinário", state="SP", city="Campinas", latitude=-22.9056, longitude=-47.0608)
+    db.add(p)
+    await db.commit()
+    await index.upsert(db, p)
+    assert sorted(r["name"] for r in index.nearest(-23.55, -46.63, "Veterinário")) == ["Campinas", "Sorocaba"]
+
+    # With no outside change, the local change is applied without a reload
+    q = Professional(name="Jundiaí", type="Veterinário", state="SP", city="Jundiaí", latitude=-23.1857, longitude=-46.8978)
+    db.add(q)
+    await db.commit()
+    rebuilds = []
+    rebuild = index.rebuild
+    async def counting_rebuild(*args, **kwargs):
+        rebuilds.append(1)
+        await rebuild(*args, **kwargs)
+    index.rebuild = counting_rebuild
+    await index.upsert(db, q)
+    assert rebuilds == []
+    assert len(index.nearest(-23.55, -46.63, "Veterinário")) == 3
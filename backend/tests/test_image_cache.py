@@ -0,0 +1,81 @@
+import io
+import pytest
+from PIL import Image, ImageDraw
+from app.services import whatsapp_service
+from app.services.image_cache import ImageAnalysisCache, hamming, image_cache
+from app.services.image_preprocessing import preprocess_image
+
+def make_cache(**kwargs):
+    options = dict(max_entries=100, max_db_entries=100, ttl=3600, max_distance=4)
+    options.update(kwargs)
+    return ImageAnalysisCache(**options)
+
+def leaf(size=(1600, 1200), quality=95, spots=((300, 300), (900, 600), (1200, 400))):
+    image = Image.new("RGB", size, (40, 130, 50))
+    draw = ImageDraw.Draw(image)
+    scale = size[0] / 1600
+    for x, y in spots:
+        draw.ellipse([x * scale, y * scale, (x + 250) * scale, (y + 250) * scale], fill=(150, 90, 20))
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=quality)
+    return output.getvalue()
+
+def test_recompressed_copy_has_a_close_dhash():
+    original = preprocess_image(leaf()).dhash
+    forwarded = preprocess_image(leaf(size=(800, 600), quality=40)).dhash
+    other = preprocess_image(leaf(spots=((100, 800), (700, 100)))).dhash
+    assert hamming(original, forwarded) <= 4
+    assert hamming(original, other) > 8
+
+@pytest.mark.asyncio
+async def test_exact_near_and_namespaced_lookups(db):
+    cache = make_cache()
+    assert await cache.get(db, "f0e1d2c3b4a59687") is None
+    await cache.put(db, "f0e1d2c3b4a59687", "Ferrugem asiática.", caption="soja")
+    await db.commit()
+
+    assert await cache.get(db, "f0e1d2c3b4a59687", caption="soja") == "Ferrugem asiática."
+    assert await cache.get(db, "f0e1d2c3b4a59686", caption="soja") == "Ferrugem asiática." # 1 bit off
+    assert await cache.get(db, "0f1e2d3c4b5a6978", caption="soja") is None
+    assert await cache.get(db, "f0e1d2c3b4a59687", caption="milho") is None
+
+    # Another worker finds near-duplicates in the shared table
+    other_worker = make_cache()
+    assert await other_worker.get(db, "f0e1d2c3b4a5968f", caption="soja") == "Ferrugem asiática."
+    assert other_worker.stats()["near_hits"] == 1
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["near_hits"], stats["misses"]) == (1, 1, 3)
+
+@pytest.mark.asyncio
+async def test_forwarded_photo_skips_the_vision_call(db, monkeypatch):
+    calls = {"vision": 0, "sent": []}
+
+    async def get_system_config(db, key):
+        return {"openai_api_key": "sk-test", "whatsapp_access_token": "token"}.get(key)
+
+    async def download_media(media_id, token):
+        return leaf(quality=95 if media_id == "m1" else 50)
+
+    async def analyze_image(images, context="", api_key=None):
+        calls["vision"] += 1
+        return "Parece ferrugem."
+
+    async def send_whatsapp_message(db, to, text):
+        calls["sent"].append((to, text))
+
+    whatsapp_service.config_cache.invalidate()
+    image_cache.clear_memory()
+    monkeypatch.setattr(whatsapp_service, "get_system_config", get_system_config)
+    monkeypatch.setattr(whatsapp_service, "download_media", download_media)
+    monkeypatch.setattr(whatsapp_service, "analyze_image", analyze_image)
+    monkeypatch.setattr(whatsapp_service, "send_whatsapp_message", send_whatsapp_message)
+
+    for n, sender in enumerate(["5566999990001", "5566999990002"], start=1):
+        await whatsapp_service.process_whatsapp_messages(db, [
+            {"from": sender, "id": f"wamid.{n}", "type": "image", "image": {"id": f"m{n}", "caption": "folha de soja"}},
+        ])
+
+    assert calls["vision"] == 1
+    assert calls["sent"] == [("5566999990001", "Parece ferrugem."), ("5566999990002", "Parece ferrugem.")]
+    assert await image_cache.count_db_entries(db) == 1
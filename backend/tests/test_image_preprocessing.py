@@ -0,0 +1,51 @@
+import io
+import pytest
+from PIL import Image
+from app.services import image_preprocessing
+from app.services.image_preprocessing import image_stats, prepare_image, preprocess_image
+
+def photo(width, height, orientation=None, fmt="JPEG"):
+    image = Image.new("RGB", (width, height), (30, 120, 40))
+    # Mark the top-left corner so rotation can be checked
+    image.paste((250, 10, 10), (0, 0, width // 4, height // 4))
+    output = io.BytesIO()
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    exif[0x010F] = "PhoneMaker" # Make
+    image.save(output, fmt, quality=95, exif=exif.tobytes())
+    return output.getvalue()
+
+def test_large_photo_is_rotated_downscaled_and_stripped():
+    content = photo(4000, 3000, orientation=6) # stored landscape, shown portrait
+    prepared = preprocess_image(content)
+    image = Image.open(io.BytesIO(prepared.data))
+    assert image.size == (prepared.width, prepared.height) == (768, 1024)
+    assert prepared.detail == "high"
+    assert prepared.mime_type == "image/jpeg"
+    assert len(image.getexif()) == 0
+    assert len(prepared.data) < len(content)
+    # Rotated 90° clockwise: the marked corner is now top-right
+    assert image.getpixel((700, 20))[0] > 200
+    assert image.getpixel((20, 20))[0] < 100
+
+def test_small_image_uses_low_detail_and_webp(monkeypatch):
+    monkeypatch.setattr(image_preprocessing.settings, "IMAGE_OUTPUT_FORMAT", "webp")
+    prepared = preprocess_image(photo(400, 300, fmt="PNG"))
+    assert (prepared.width, prepared.height) == (400, 300)
+    assert prepared.detail == "low"
+    assert prepared.mime_type == "image/webp"
+    assert prepared.data_url().startswith("data:image/webp;base64,")
+
+@pytest.mark.asyncio
+async def test_prepare_image_records_stats_and_passes_unreadable_through():
+    image_stats.reset()
+    await prepare_image(photo(3000, 2000))
+    broken = await prepare_image(b"not an image")
+    assert broken.data == b"not an image"
+    assert broken.detail == "auto"
+    stats = image_stats.as_dict()
+    assert stats["images"] == 1
+    assert stats["failures"] == 1
+    assert 0 < stats["bytes_out"] < stats["bytes_in"]
+    assert stats["avg_ms"] > 0
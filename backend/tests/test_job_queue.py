@@ -0,0 +1,129 @@
+import asyncio
+import json
+import pytest
+from app.models.job import InboundJob
+from app.services.job_queue import (
+    JOB_DEAD, JOB_DONE, JOB_PENDING, JobWorkerPool, claim_next_job, enqueue_job, fail_job,
+)
+
+@pytest.mark.asyncio
+async def test_claim_is_exclusive_and_failures_back_off(db):
+    await enqueue_job(db, {"id": "wamid.1"})
+
+    job = await claim_next_job(db, visibility_timeout=60)
+    job_id, attempts = job.id, job.attempts
+    assert attempts == 1
+    assert await claim_next_job(db, visibility_timeout=60) is None
+
+    await fail_job(db, job_id, attempts, "boom", max_attempts=3, backoff=60, backoff_max=600)
+    job = await db.get(InboundJob, job_id, populate_existing=True)
+    assert job.status == JOB_PENDING
+    # Backing off, not claimable yet
+    assert await claim_next_job(db, visibility_timeout=60) is None
+
+    await fail_job(db, job_id, 3, "boom", max_attempts=3, backoff=60, backoff_max=600)
+    job = await db.get(InboundJob, job_id, populate_existing=True)
+    assert job.status == JOB_DEAD
+
+@pytest.mark.asyncio
+async def test_expired_visibility_timeout_makes_job_claimable_again(db):
+    await enqueue_job(db, {"id": "wamid.2"})
+    job = await claim_next_job(db, visibility_timeout=-1)
+    job_id = job.id
+    again = await claim_next_job(db, visibility_timeout=60)
+    assert again.id == job_id
+    assert again.attempts == 2
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_handler_and_retries(session_factory):
+    calls = []
+
+    async def handler(db, payloads):
+        calls.extend(p["id"] for p in payloads)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+
+    pool = JobWorkerPool(
+        handler=handler, session_factory=session_factory, concurrency=2, poll_interval=0.05,
+        visibility_timeout=5, max_attempts=3, backoff=0, backoff_max=0, max_pending=10,
+    )
+    async with session_factory() as db:
+        await enqueue_job(db, {"id": "wamid.3"})
+
+    await pool.start()
+    try:
+        for _ in range(100):
+            if len(calls) == 2:
+                break
+            await asyncio.sleep(0.02)
+        await asyncio.sleep(0.1)
+    finally:
+        await pool.stop()
+
+    async with session_factory() as db:
+        job = (await db.execute(InboundJob.__table__.select())).first()
+    assert calls == ["wamid.3", "wamid.3"]
+    assert job.status == JOB_DONE
+
+@pytest.mark.asyncio
+async def test_enqueue_is_idempotent_per_message_id(db, monkeypatch):
+    from app.services import job_queue
+    monkeypatch.setattr(job_queue, "_recent_keys", job_queue.OrderedDict())
+
+    first = await enqueue_job(db, {"id": "wamid.dup"}, dedup_key="wamid.dup")
+    assert first is not None
+    assert job_queue.seen_recently("wamid.dup")
+
+    # Another worker (empty LRU) must still reject it through the unique key
+    job_queue._recent_keys.clear()
+    assert await enqueue_job(db, {"id": "wamid.dup"}, dedup_key="wamid.dup") is None
+    rows = (await db.execute(InboundJob.__table__.select())).all()
+    assert len(rows) == 1
+
+@pytest.mark.asyncio
+async def test_enqueue_jobs_inserts_a_batch_in_one_step(db, monkeypatch):
+    from app.services import job_queue
+    monkeypatch.setattr(job_queue, "_recent_keys", job_queue.OrderedDict())
+    await enqueue_job(db, {"id": "wamid.x"}, dedup_key="wamid.x")
+
+    job_ids = await job_queue.enqueue_jobs(db, [
+        ({"id": "wamid.x"}, "wamid.x", None),
+        ({"id": "wamid.y"}, "wamid.y", None),
+        ({"id": "wamid.y"}, "wamid.y", None),
+        ({"id": "wamid.z"}, "wamid.z", None),
+    ])
+    assert len(job_ids) == 2
+
+@pytest.mark.asyncio
+async def test_burst_from_one_sender_is_claimed_as_one_batch(db):
+    from app.services.job_queue import claim_next_batch
+    for n, sender in enumerate(["5566999990000", "5511988880000", "5566999990000", "5566999990000"]):
+        await enqueue_job(db, {"id": f"wamid.burst{n}"}, dedup_key=f"wamid.burst{n}", group_key=sender, delay=0.5, max_wait=10)
+
+    # Still inside the debounce window
+    assert await claim_next_batch(db, visibility_timeout=60) == []
+    await asyncio.sleep(0.6)
+
+    batch = await claim_next_batch(db, visibility_timeout=60)
+    assert [json.loads(job.payload)["id"] for job in batch] == ["wamid.burst0", "wamid.burst2", "wamid.burst3"]
+    batch = await claim_next_batch(db, visibility_timeout=60)
+    assert [json.loads(job.payload)["id"] for job in batch] == ["wamid.burst1"]
+
+@pytest.mark.asyncio
+async def test_sender_with_a_running_batch_is_not_claimed_twice(db):
+    from app.services.job_queue import claim_next_batch, complete_jobs
+    await enqueue_job(db, {"id": "wamid.o1"}, dedup_key="wamid.o1", group_key="5566999990000")
+    first = await claim_next_batch(db, visibility_timeout=60)
+    first_ids = [job.id for job in first]
+
+    await enqueue_job(db, {"id": "wamid.o2"}, dedup_key="wamid.o2", group_key="5566999990000")
+    await enqueue_job(db, {"id": "wamid.o3"}, dedup_key="wamid.o3", group_key="5511988880000")
+
+    # Only the other sender is runnable while the first batch is in flight
+    other = await claim_next_batch(db, visibility_timeout=60)
+    assert [json.loads(job.payload)["id"] for job in other] == ["wamid.o3"]
+    assert await claim_next_batch(db, visibility_timeout=60) == []
+
+    await complete_jobs(db, first_ids)
+    nxt = await claim_next_batch(db, visibility_timeout=60)
+    assert [json.loads(job.payload)["id"] for job in nxt] == ["wamid.o2"]
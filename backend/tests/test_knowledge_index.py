@@ -0,0 +1,101 @@
+import pytest
+import os
+from app.services import knowledge_index as knowledge_module
+from app.services.knowledge_index import KnowledgeIndex, Segment, chunk_text, retrieve_knowledge, tokenize, write_segment
+
+FERRUGEM = """Ferrugem asiática da soja
+
+A ferrugem asiática é causada pelo fungo Phakopsora pachyrhizi. O controle combina vazio sanitário, cultivares precoces e fungicidas aplicados preventivamente.
+
+O monitoramento das lavouras deve começar no início da floração."""
+
+MILHO = """Espaçamento do milho safrinha
+
+Recomenda-se espaçamento entre linhas de 45 a 50 cm para o milho safrinha, com população ajustada à época de semeadura."""
+
+def test_tokenize_folds_and_drops_stopwords():
+    assert tokenize("As pragas da Soja são controladas") == ["praga", "soja", "controlada"]
+
+def test_chunks_keep_paragraphs_and_size():
+    text = "\n\n".join(f"Parágrafo {i}. " + "texto " * 30 for i in range(10))
+    passages = chunk_text(text, 400)
+    assert all(len(p) <= 400 for p in passages)
+    assert passages[0].startswith("Parágrafo 0.")
+    assert sum(p.count("Parágrafo") for p in passages) == 10
+
+def test_segment_roundtrip(tmp_path):
+    path = str(tmp_path / "a.seg")
+    write_segment(path, ["ferrugem na soja", "soja e milho, soja"])
+    segment = Segment(path)
+    try:
+        numbers, tfs = segment.postings("soja")
+        assert list(numbers) == [0, 1] and list(tfs) == [1, 2]
+        assert list(segment.postings("algodao")[0]) == []
+        assert segment.passage(1) == "soja e milho, soja"
+        assert list(segment.passage_lengths) == [2, 3]
+    finally:
+        segment.close()
+
+def test_search_add_replace_remove(tmp_path):
+    index = KnowledgeIndex(str(tmp_path), chunk_chars=200)
+    ferrugem = index.add_document("Boletim Embrapa ferrugem", FERRUGEM)
+    index.add_document("Nota técnica milho", MILHO)
+
+    results = index.search("como controlar a ferrugem na soja?", k=2)
+    assert results[0].name == "Boletim Embrapa ferrugem"
+    assert "fungicidas" in results[0].text
+    assert index.search("espaçamento milho", k=1)[0].name == "Nota técnica milho"
+
+    # Another worker sees the same documents through the manifest
+    other = KnowledgeIndex(str(tmp_path), chunk_chars=200)
+    assert {d["name"] for d in other.documents()} == {"Boletim Embrapa ferrugem", "Nota técnica milho"}
+
+    # Same name replaces the document and its segment file
+    generation, fingerprint = index.generation, index.fingerprint
+    assert other.fingerprint == fingerprint
+    index.add_document("Boletim Embrapa ferrugem", "Texto novo sobre nematoides.")
+    assert index.generation > generation
+    assert index.fingerprint != fingerprint
+    assert not index.search("fungicidas", k=3)
+    assert other.search("nematoides", k=1)[0].doc_id == ferrugem["id"]
+    assert len([f for f in os.listdir(tmp_path) if f.endswith(".seg")]) == 2
+
+    assert index.remove_document(ferrugem["id"])
+    assert not index.remove_document(ferrugem["id"])
+    assert not other.search("nematoides", k=1)
+    assert [d["name"] for d in other.documents()] == ["Nota técnica milho"]
+
+def test_dropped_segment_stays_open_while_searched(tmp_path):
+    index = KnowledgeIndex(str(tmp_path), chunk_chars=200)
+    index.add_document("Boletim Embrapa ferrugem", FERRUGEM)
+    index.search("ferrugem", 1)
+    (segment,) = index._segments.values()
+
+    # A search in another thread holds the segment while it is replaced
+    segment.acquire()
+    index.add_document("Boletim Embrapa ferrugem", MILHO)
+    assert segment.passage(0).startswith("Ferrugem asiática")
+    segment.release()
+    with pytest.raises(ValueError):
+        segment.passage(0)
+    assert index.search("milho safrinha", 1)[0].text.startswith("Espaçamento")
+
+def test_fingerprint_tells_recreated_indexes_apart(tmp_path):
+    first = KnowledgeIndex(str(tmp_path / "first"), chunk_chars=200)
+    first.add_document("Boletim", FERRUGEM)
+    # A fresh directory (e.g. after a redeploy) with other contents
+    second = KnowledgeIndex(str(tmp_path / "second"), chunk_chars=200)
+    second.add_document("Nota técnica milho", MILHO)
+
+    assert first.generation == second.generation
+    assert first.fingerprint != second.fingerprint
+
+def test_retrieve_knowledge_respects_budget(tmp_path, monkeypatch):
+    index = KnowledgeIndex(str(tmp_path), chunk_chars=200)
+    index.add_document("Boletim", FERRUGEM)
+    monkeypatch.setattr(knowledge_module, "knowledge_index", index)
+
+    context = retrieve_knowledge("ferrugem soja fungicidas", top_k=3, token_budget=500)
+    assert "[Boletim]" in context and "Phakopsora" in context
+    assert retrieve_knowledge("ferrugem soja fungicidas", top_k=3, token_budget=5) == ""
+    assert retrieve_knowledge("algodão", top_k=3, token_budget=500) == ""
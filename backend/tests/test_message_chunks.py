@@ -0,0 +1,31 @@
+from app.services.message_chunks import ChunkAssembler, split_message
+
+def test_split_prefers_paragraphs_then_sentences():
+    text = "a" * 50 + ".\n\n" + "b" * 30 + ". " + "c" * 30 + "."
+    assert split_message(text, limit=80) == ["a" * 50 + ".", "b" * 30 + ". " + "c" * 30 + "."]
+    assert split_message("b" * 30 + ". " + "c" * 60 + ".", limit=80) == ["b" * 30 + ".", "c" * 60 + "."]
+
+def test_split_never_exceeds_limit():
+    text = ("palavra " * 2000).strip()
+    chunks = split_message(text, limit=4096)
+    assert all(len(c) <= 4096 for c in chunks)
+    assert " ".join(chunks) == text
+    assert split_message("x" * 10, limit=4) == ["xxxx", "xxxx", "xx"]
+
+def test_assembler_emits_first_chunk_early():
+    assembler = ChunkAssembler(first_chars=10, chunk_chars=100)
+    assert assembler.feed("Primeira parte") == []
+    assert assembler.feed(" pronta.\n\nSegunda") == ["Primeira parte pronta."]
+    # Later chunks wait for chunk_chars
+    assert assembler.feed(" parte.\n\nTerceira parte.") == []
+    assert assembler.flush() == ["Segunda parte.\n\nTerceira parte."]
+    assert assembler.text == "Primeira parte pronta.\n\nSegunda parte.\n\nTerceira parte."
+
+def test_assembler_splits_at_limit_without_paragraphs():
+    assembler = ChunkAssembler(first_chars=10, chunk_chars=10, limit=50)
+    chunks = []
+    for _ in range(20):
+        chunks += assembler.feed("Uma frase. ")
+    chunks += assembler.flush()
+    assert all(len(c) <= 50 for c in chunks)
+    assert " ".join(chunks) == ("Uma frase. " * 20).strip()
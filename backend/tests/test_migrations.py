@@ -0,0 +1,87 @@
+import asyncio
+import os
+import warnings
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db.base import Base
+import app.models  # noqa: F401 - register all models
+import app.models.professional  # noqa: F401
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def alembic_config(url: str) -> Config:
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.set_main_option("sqlalchemy.url", url)
+    return config
+
+async def run_sql(url: str, *statements: str):
+    engine = create_async_engine(url)
+    results = []
+    async with engine.begin() as conn:
+        for statement in statements:
+            result = await conn.execute(text(statement))
+            results.append(result.all() if result.returns_rows else None)
+    await engine.dispose()
+    return results
+
+async def schema(url: str):
+    engine = create_async_engine(url)
+    async with engine.connect() as conn:
+        def read(sync_conn):
+            inspector = inspect(sync_conn)
+            with warnings.catch_warnings():
+                # Expression indexes are compared through sqlite_master instead
+                warnings.filterwarnings("ignore", "Skipped unsupported reflection", exc.SAWarning)
+                return {
+                    table: (
+                        {c["name"] for c in inspector.get_columns(table)},
+                        {i["name"] for i in inspector.get_indexes(table)},
+                    )
+                    for table in inspector.get_table_names() if table != "alembic_version"
+                }
+        result = await conn.run_sync(read)
+    await engine.dispose()
+    return result
+
+async def create_all(url: str):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+def test_migrations_match_models(tmp_path):
+    migrated = f"sqlite+aiosqlite:///{tmp_path / 'migrated.db'}"
+    created = f"sqlite+aiosqlite:///{tmp_path / 'created.db'}"
+    command.upgrade(alembic_config(migrated), "head")
+    asyncio.run(create_all(created))
+
+    assert asyncio.run(schema(migrated)) == asyncio.run(schema(created))
+    # Expression indexes aren't reflected by the inspector
+    indexes = "SELECT name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_autoindex%' ORDER BY name"
+    assert asyncio.run(run_sql(migrated, indexes)) == asyncio.run(run_sql(created, indexes))
+
+    # A database made by create_all is adopted without errors
+    command.upgrade(alembic_config(created), "head")
+
+def test_summary_columns_are_backfilled(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'old.db'}"
+    config = alembic_config(url)
+    command.upgrade(config, "0002")
+    asyncio.run(run_sql(
+        url,
+        "INSERT INTO conversations (id, whatsapp_id, started_at) VALUES (1, '5565999990000', '2024-01-01 10:00:00')",
+        "INSERT INTO conversations (id, whatsapp_id, started_at) VALUES (2, '5565999990001', '2024-01-02 10:00:00')",
+        "INSERT INTO messages (conversation_id, content, role, timestamp) VALUES (1, 'Oi', 'user', '2024-01-01 10:00:00')",
+        "INSERT INTO messages (conversation_id, content, role, timestamp) VALUES (1, 'Olá, como posso ajudar?', 'assistant', '2024-01-01 10:00:05')",
+    ))
+
+    command.upgrade(config, "head")
+
+    [rows] = asyncio.run(run_sql(
+        url, "SELECT id, message_count, last_message_at, last_message_preview FROM conversations ORDER BY id"
+    ))
+    assert rows[0][1:] == (2, "2024-01-01 10:00:05", "Olá, como posso ajudar?")
+    assert rows[1][1:] == (0, "2024-01-02 10:00:00", None)
@@ -0,0 +1,101 @@
+import pytest
+from app.services.response_cache import ResponseCache, jaccard, normalize_question, shingles
+
+def make_cache(**kwargs):
+    options = dict(max_entries=100, max_db_entries=100, ttl=3600, similarity=0.8)
+    options.update(kwargs)
+    return ResponseCache(**options)
+
+def test_normalize_question():
+    assert normalize_question("  Como controlar FERRUGEM na soja?? ") == "como controlar ferrugem na soja"
+
+def test_near_duplicates_are_similar():
+    a = shingles(normalize_question("como controlar ferrugem na soja"))
+    b = shingles(normalize_question("Como controlar a ferrugem na soja?"))
+    c = shingles(normalize_question("qual o espaçamento do milho safrinha"))
+    assert jaccard(a, b) >= 0.8
+    assert jaccard(a, c) < 0.2
+
+@pytest.mark.asyncio
+async def test_exact_and_near_hits_from_memory(db):
+    cache = make_cache()
+    assert await cache.get(db, "como controlar ferrugem na soja") is None
+
+    await cache.put(db, "como controlar ferrugem na soja", "Use fungicida.")
+    await db.commit()
+    assert await cache.get(db, "Como controlar ferrugem na soja?") == "Use fungicida."
+    assert await cache.get(db, "como controlar a ferrugem na soja") == "Use fungicida."
+    assert await cache.get(db, "como controlar ferrugem no milho") is None
+
+    # Different knowledge sources or prompt: different namespace
+    assert await cache.get(db, "como controlar ferrugem na soja", sources="Embrapa") is None
+
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["near_hits"], stats["misses"]) == (1, 1, 3)
+    assert stats["hit_rate"] == 0.4
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stored, asked", [
+    ("quanto de ureia devo aplicar em 10 hectares", "quanto de ureia devo aplicar em 100 hectares"),
+    ("posso aplicar fungicida com chuva", "não posso aplicar fungicida com chuva"),
+    ("vaca está com febre", "vaca não está com febre"),
+])
+async def test_numbers_and_negations_must_match(db, stored, asked):
+    # Even with a loose threshold, these are different questions
+    cache = make_cache(similarity=0.5)
+    await cache.put(db, stored, "resposta")
+    await db.commit()
+    assert await cache.get(db, asked) is None
+    assert await make_cache(similarity=0.5).get(db, asked) is None
+    assert await cache.get(db, stored + "?") == "resposta"
+
+@pytest.mark.asyncio
+async def test_other_workers_hit_the_shared_table(db):
+    await make_cache().put(db, "como controlar ferrugem na soja", "Use fungicida.")
+    await db.commit()
+
+    other_worker = make_cache()
+    assert await other_worker.get(db, "como controlar a ferrugem na soja") == "Use fungicida."
+    assert other_worker.stats()["near_hits"] == 1
+    assert other_worker.stats()["memory_entries"] == 1
+
+@pytest.mark.asyncio
+async def test_ttl_and_lru_eviction(db):
+    cache = make_cache(max_entries=2, max_db_entries=2)
+    cache.trim_every = 1
+    for i, question in enumerate(["pergunta sobre soja", "pergunta sobre milho", "pergunta sobre gado"]):
+        await cache.put(db, question, f"resposta {i}")
+    await db.commit()
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert await cache.count_db_entries(db) == 2
+    # The least recently used one is gone from both tiers
+    assert await make_cache().get(db, "pergunta sobre soja") is None
+
+    expired = make_cache(ttl=-1)
+    await expired.put(db, "pergunta sobre cafe", "resposta")
+    await db.commit()
+    assert await expired.get(db, "pergunta sobre cafe") is None
+
+@pytest.mark.asyncio
+async def test_table_is_trimmed_every_few_puts(db):
+    cache = make_cache(max_db_entries=1)
+    cache.trim_every = 3
+    for question in ["pergunta sobre soja", "pergunta sobre milho"]:
+        await cache.put(db, question, "resposta")
+    await db.commit()
+    assert await cache.count_db_entries(db) == 2
+
+    await cache.put(db, "pergunta sobre gado", "resposta")
+    await db.commit()
+    assert await cache.count_db_entries(db) == 1
+
+@pytest.mark.asyncio
+async def test_flush_clears_both_tiers(db):
+    cache = make_cache()
+    await cache.put(db, "como controlar ferrugem na soja", "Use fungicida.")
+    await db.commit()
+
+    assert await cache.flush(db) == 1
+    assert await cache.get(db, "como controlar ferrugem na soja") is None
+    assert await cache.count_db_entries(db) == 0
@@ -0,0 +1,26 @@
+from app.services.webhook_parser import parse_webhook
+
+def test_parse_webhook_walks_every_entry_and_change():
+    data = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {"id": "1", "changes": [
+                {"field": "messages", "value": {"messages": [{"id": "wamid.a", "from": "5566999990000", "type": "text"}]}},
+                {"field": "messages", "value": {"statuses": [{"id": "wamid.out", "status": "delivered"}]}},
+            ]},
+            {"id": "2", "changes": [
+                {"field": "messages", "value": {"messages": [
+                    {"id": "wamid.b", "from": "5511988880000", "type": "text"},
+                    {"id": "wamid.c", "from": "5511988880000", "type": "image"},
+                ]}},
+                {"field": "account_update", "value": {"messages": [{"id": "ignored"}]}},
+            ]},
+        ],
+    }
+    batch = parse_webhook(data)
+    assert [m["id"] for m in batch.messages] == ["wamid.a", "wamid.b", "wamid.c"]
+    assert [s["status"] for s in batch.statuses] == ["delivered"]
+
+def test_parse_webhook_tolerates_empty_payloads():
+    assert parse_webhook({}) == ([], [])
+    assert parse_webhook({"entry": [{"changes": [{"value": {}}]}]}) == ([], [])
@@ -0,0 +1,254 @@
+import io
+import pytest
+from PIL import Image
+from sqlalchemy.future import select
+from app.models import Conversation, Message
+from app.models.system_config import SystemConfig
+from app.services import whatsapp_service
+from app.services.ai_service import TEXT_INTERRUPTED_NOTE, StreamInterrupted
+from app.services.area_codes import state_from_whatsapp_id
+
+async def stream_of(text, size=7):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+@pytest.fixture
+def fake_ai(monkeypatch):
+    calls = {"text": [], "sent": [], "reply": "Resposta", "fail": 0}
+
+    async def analyze_text(text, context="", api_key=None, stream=False, **kwargs):
+        calls["text"].append(text)
+        if calls["fail"]:
+            calls["fail"] -= 1
+            raise RuntimeError("AI unavailable")
+        if stream:
+            return stream_of(calls["reply"])
+        return calls["reply"]
+
+    async def send_whatsapp_message(db, to, text):
+        calls["sent"].append((to, text))
+
+    # Each test has its own DB
+    whatsapp_service.config_cache.invalidate()
+    monkeypatch.setattr(whatsapp_service, "analyze_text", analyze_text)
+    monkeypatch.setattr(whatsapp_service, "send_whatsapp_message", send_whatsapp_message)
+    return calls
+
+def text_message(n, body, sender="5566999990000"):
+    return {"from": sender, "id": f"wamid.{n}", "type": "text", "text": {"body": body}}
+
+@pytest.mark.asyncio
+async def test_burst_is_answered_once_and_every_message_logged(db, fake_ai):
+    await whatsapp_service.process_whatsapp_messages(db, [
+        text_message(1, "minha soja"),
+        text_message(2, "está com ferrugem"),
+        text_message(3, "aqui no MT"),
+    ])
+
+    assert fake_ai["text"] == ["minha soja\nestá com ferrugem\naqui no MT"]
+    assert fake_ai["sent"] == [("5566999990000", "Resposta")]
+
+    messages = (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+    assert [(m.role, m.content) for m in messages] == [
+        ("user", "minha soja"),
+        ("user", "está com ferrugem"),
+        ("user", "aqui no MT"),
+        ("assistant", "Resposta"),
+    ]
+    conversation = (await db.execute(select(Conversation))).scalars().one()
+    assert conversation.location_state == "MT"
+    assert conversation.problem_category == "Doença"
+
+@pytest.mark.asyncio
+async def test_retried_job_does_not_log_or_answer_twice(db, fake_ai):
+    burst = [text_message(1, "minha soja"), text_message(2, "está com ferrugem")]
+    fake_ai["fail"] = 1
+    with pytest.raises(RuntimeError):
+        await whatsapp_service.process_whatsapp_messages(db, burst)
+    assert fake_ai["sent"] == []
+
+    # The queue retries the jobs, now with a message that arrived meanwhile
+    await whatsapp_service.process_whatsapp_messages(db, burst + [text_message(3, "aqui no MT")])
+    # A late redelivery of jobs already answered
+    await whatsapp_service.process_whatsapp_messages(db, burst)
+
+    assert fake_ai["text"] == ["minha soja\nestá com ferrugem"] + ["minha soja\nestá com ferrugem\naqui no MT"]
+    assert fake_ai["sent"] == [("5566999990000", "Resposta")]
+    messages = (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+    assert [(m.role, m.content) for m in messages] == [
+        ("user", "minha soja"),
+        ("user", "está com ferrugem"),
+        ("user", "aqui no MT"),
+        ("assistant", "Resposta"),
+    ]
+    conversation = (await db.execute(select(Conversation))).scalars().one()
+    assert conversation.message_count == 4
+
+@pytest.mark.asyncio
+async def test_get_or_create_conversation_is_an_upsert(session_factory):
+    async with session_factory() as db1, session_factory() as db2:
+        first = await whatsapp_service.get_or_create_conversation(db1, "5566999990000")
+        second = await whatsapp_service.get_or_create_conversation(db2, "5566999990000")
+    assert first.id == second.id
+
+@pytest.mark.asyncio
+async def test_city_sets_state_and_coordinates(db, fake_ai):
+    await whatsapp_service.process_whatsapp_messages(db, [text_message(1, "bom dia, aqui em Rio Verde a soja tem lagarta")])
+
+    conversation = (await db.execute(select(Conversation))).scalars().one()
+    assert (conversation.location_city, conversation.location_state) == ("Rio Verde", "GO")
+    assert conversation.latitude is not None and conversation.longitude is not None
+
+    await whatsapp_service.process_whatsapp_messages(db, [text_message(2, "mudei para o PR")])
+    await db.refresh(conversation)
+    assert conversation.location_state == "PR"
+    assert conversation.location_city is None
+
+def test_state_from_whatsapp_id():
+    assert state_from_whatsapp_id("5566999990000") == "MT"
+    assert state_from_whatsapp_id("556432215555") == "GO"
+    assert state_from_whatsapp_id("5520999990000") is None  # unassigned DDD
+    assert state_from_whatsapp_id("14155550100") is None
+
+@pytest.mark.asyncio
+async def test_area_code_state_is_overridden_by_text(db, fake_ai):
+    conversation = await whatsapp_service.get_or_create_conversation(db, "5534999990000")
+    assert (conversation.location_state, conversation.location_source) == ("MG", "ddd")
+
+    await whatsapp_service.extract_and_update_state(db, conversation, "estou em Minas Gerais")
+    assert (conversation.location_state, conversation.location_source) == ("MG", "text")
+
+    await whatsapp_service.extract_and_update_state(db, conversation, "a fazenda fica em Jataí")
+    assert (conversation.location_state, conversation.location_source) == ("GO", "city")
+
+@pytest.mark.asyncio
+async def test_long_answer_is_streamed_in_parts(db, fake_ai, monkeypatch):
+    monkeypatch.setattr(whatsapp_service.settings, "WHATSAPP_FIRST_CHUNK_CHARS", 20)
+    paragraphs = ["Primeiro parágrafo da resposta.", "Segundo parágrafo, mais longo que o primeiro.", "Fim."]
+    fake_ai["reply"] = "\n\n".join(paragraphs)
+
+    await whatsapp_service.process_whatsapp_messages(db, [text_message(1, "como controlar ferrugem na soja")])
+
+    assert [text for _, text in fake_ai["sent"]] == ["Primeiro parágrafo da resposta.", "Segundo parágrafo, mais longo que o primeiro.\n\nFim."]
+    assistant = (await db.execute(select(Message).where(Message.role == "assistant"))).scalars().one()
+    assert assistant.content == fake_ai["reply"]
+
+@pytest.mark.asyncio
+async def test_polling_picks_up_the_finished_reply(db, fake_ai, monkeypatch):
+    from app.api.api_v1.endpoints.conversations import read_messages
+    seen = {}
+
+    async def stream_while_polled(text):
+        # The admin view polls while the placeholder is the newest message
+        conversation = (await db.execute(select(Conversation))).scalars().one()
+        page = await read_messages(conversation.id, limit=10, before=None, after=None, db=db)
+        seen["conversation"], seen["cursor"] = conversation.id, page["next_cursor"]
+        assert page["items"][-1]["content"] == TEXT_INTERRUPTED_NOTE
+        yield text
+
+    async def analyze_text(text, context="", api_key=None, stream=False, **kwargs):
+        return stream_while_polled("Aplique fungicida.")
+
+    monkeypatch.setattr(whatsapp_service, "analyze_text", analyze_text)
+    await whatsapp_service.process_whatsapp_messages(db, [text_message(1, "como controlar ferrugem na soja")])
+
+    newer = await read_messages(seen["conversation"], limit=10, before=None, after=seen["cursor"], db=db)
+    assert [(m["role"], m["content"]) for m in newer["items"]] == [("assistant", "Aplique fungicida.")]
+
+async def broken_stream(text):
+    yield text
+    raise StreamInterrupted("connection reset")
+
+@pytest.mark.asyncio
+async def test_broken_off_stream_is_flagged_and_not_cached(db, fake_ai, monkeypatch):
+    db.add(SystemConfig(key="openai_api_key", value="sk-test"))
+    await db.commit()
+    await whatsapp_service.response_cache.flush(db)
+
+    async def analyze_text(text, context="", api_key=None, stream=False, **kwargs):
+        return broken_stream("Aplique fungicida")
+
+    monkeypatch.setattr(whatsapp_service, "analyze_text", analyze_text)
+    await whatsapp_service.process_whatsapp_messages(db, [text_message(1, "como controlar ferrugem na soja")])
+
+    assert [text for _, text in fake_ai["sent"]] == ["Aplique fungicida", TEXT_INTERRUPTED_NOTE]
+    assistant = (await db.execute(select(Message).where(Message.role == "assistant"))).scalars().one()
+    assert assistant.content == f"Aplique fungicida\n\n{TEXT_INTERRUPTED_NOTE}"
+    assert await whatsapp_service.response_cache.count_db_entries(db) == 0
+
+@pytest.mark.asyncio
+async def test_retry_after_a_crash_mid_stream_does_not_resend(db, fake_ai, monkeypatch):
+    monkeypatch.setattr(whatsapp_service.settings, "WHATSAPP_FIRST_CHUNK_CHARS", 20)
+    fake_ai["reply"] = "Primeiro parágrafo da resposta.\n\nSegundo parágrafo, mais longo que o primeiro."
+    send = whatsapp_service.send_whatsapp_message
+
+    async def send_then_crash(db, to, text):
+        await send(db, to, text)
+        raise RuntimeError("worker killed")
+
+    monkeypatch.setattr(whatsapp_service, "send_whatsapp_message", send_then_crash)
+    with pytest.raises(RuntimeError):
+        await whatsapp_service.process_whatsapp_messages(db, [text_message(1, "como controlar ferrugem na soja")])
+    monkeypatch.setattr(whatsapp_service, "send_whatsapp_message", send)
+    await whatsapp_service.process_whatsapp_messages(db, [text_message(1, "como controlar ferrugem na soja")])
+
+    assert [text for _, text in fake_ai["sent"]] == ["Primeiro parágrafo da resposta."]
+    messages = (await db.execute(select(Message).order_by(Message.id))).scalars().all()
+    # The reply that never finished stays marked as interrupted
+    assert [(m.role, m.content) for m in messages] == [
+        ("user", "como controlar ferrugem na soja"),
+        ("assistant", TEXT_INTERRUPTED_NOTE),
+    ]
+
+@pytest.mark.asyncio
+async def test_photo_and_document_in_one_burst_are_both_read(db, fake_ai, monkeypatch):
+    photo = io.BytesIO()
+    Image.new("RGB", (64, 48), (40, 130, 50)).save(photo, "JPEG")
+    media = {"img": photo.getvalue(), "doc": "Laudo de solo: pH 5,2; fósforo baixo.".encode()}
+    seen = {}
+
+    async def get_system_config(db, key):
+        return {"openai_api_key": "sk-test", "whatsapp_access_token": "token"}.get(key)
+
+    async def download_media(media_id, token):
+        return media[media_id]
+
+    async def analyze_image(images, context="", api_key=None):
+        seen["images"], seen["context"] = len(images), context
+        return "Análise da folha e do laudo."
+
+    monkeypatch.setattr(whatsapp_service, "get_system_config", get_system_config)
+    monkeypatch.setattr(whatsapp_service, "download_media", download_media)
+    monkeypatch.setattr(whatsapp_service, "analyze_image", analyze_image)
+
+    await whatsapp_service.process_whatsapp_messages(db, [
+        text_message(1, "minha soja"),
+        {"from": "5566999990000", "id": "wamid.2", "type": "image", "image": {"id": "img", "caption": "folha amarelada"}},
+        {"from": "5566999990000", "id": "wamid.3", "type": "document",
+         "document": {"id": "doc", "mime_type": "text/plain", "filename": "laudo.txt"}},
+        text_message(4, "aqui no MT"),
+    ])
+
+    assert seen["images"] == 1
+    assert "pH 5,2; fósforo baixo" in seen["context"]
+    # Texts and captions keep the order they were sent in
+    assert "Legenda do usuário: minha soja\nfolha amarelada\naqui no MT" in seen["context"]
+    assert fake_ai["sent"] == [("5566999990000", "Análise da folha e do laudo.")]
+
+@pytest.mark.asyncio
+async def test_document_limit_applies_to_each_document(monkeypatch):
+    media = {"a": ("A" * 100).encode(), "b": ("B" * 100).encode()}
+
+    async def download_media(media_id, token):
+        return media[media_id]
+
+    monkeypatch.setattr(whatsapp_service, "download_media", download_media)
+    monkeypatch.setattr(whatsapp_service, "document_char_limit", lambda: 60)
+    documents = [{"media_id": "a", "mime_type": "text/plain"}, {"media_id": "b", "mime_type": "text/plain"}]
+
+    monkeypatch.setattr(whatsapp_service.settings, "DOCUMENT_MAP_REDUCE_ENABLED", True)
+    assert await whatsapp_service.read_documents(documents, "token") == "A" * 60 + "\n\n" + "B" * 60
+
+    # Without map-reduce they share the prompt's limit
+    monkeypatch.setattr(whatsapp_service.settings, "DOCUMENT_MAP_REDUCE_ENABLED", False)
+    assert await whatsapp_service.read_documents(documents, "token") == "A" * 30 + "\n\n" + "B" * 30
@@ -22,13 +22,13 @@ const MapComponent = ({ professionals }) => {
   // Center of Brazil
   const center = [-14.2350, -51.9253];
 
-  // Function to get coordinates from city/state (Mocked for now since we don't have geocoding)
-  // In a real app, we would use a geocoding API or have coordinates in the DB
+  // Use the stored coordinates; professionals without them are placed by state
   const getCoordinates = (prof) => {
+    if (prof.latitude != null && prof.longitude != null) {
+      return [prof.latitude, prof.longitude];
+    }
+
     // Simple offset based on ID to scatter them a bit if we don't have coords
-    // This is just a visualization trick since our seed data doesn't have lat/lon
-    // If the DB has lat/lon, we should use it.
-    // Let's check the verify_api output. No lat/lon in professional model.
     
     // Mapping some states to approx coordinates
     const stateCoords = {
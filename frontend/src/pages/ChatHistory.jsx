@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { X, MessageSquare, User, Bot } from 'lucide-react';
 import { chatService } from '../services/api';
 
@@ -10,6 +10,10 @@ const ChatHistory = () => {
   const [page, setPage] = useState(1);
   const [limit] = useState(10);
   const [total, setTotal] = useState(0);
+  // Keyset pagination: cursors[i] is the cursor for page i + 1 (page 1 has none)
+  const [cursors, setCursors] = useState([null]);
+  const [hasNext, setHasNext] = useState(false);
+  const messagesCursor = useRef(null);
 
   useEffect(() => {
     fetchConversations();
@@ -18,24 +22,32 @@ const ChatHistory = () => {
   const fetchConversations = async () => {
     setLoading(true);
     try {
-      const skip = (page - 1) * limit;
-      const response = await chatService.getConversations({ skip, limit });
+      const cursor = cursors[page - 1];
+      const response = await chatService.getConversations({ limit, cursor, include_total: page === 1 });
       
-      const items = response.data.items || response.data;
-      const totalCount = response.data.total || items.length;
+      const items = response.data.items;
+      const nextCursor = response.data.next_cursor;
+      setCursors(prev => {
+        const next = prev.slice(0, page);
+        next[page] = nextCursor;
+        return next;
+      });
+      setHasNext(Boolean(nextCursor));
 
       // Map API response to component state
       const mappedConversations = items.map(c => ({
         id: c.id,
         user: c.whatsapp_id,
-        lastMessage: c.problem_category ? `Categoria: ${c.problem_category}` : 'Sem categoria',
-        date: new Date(c.updated_at || c.created_at).toLocaleString(),
+        lastMessage: c.last_message_preview || (c.problem_category ? `Categoria: ${c.problem_category}` : 'Sem mensagens'),
+        date: new Date(c.last_message_at || c.updated_at || c.created_at).toLocaleString(),
         status: c.problem_category ? 'Identificado' : 'Pendente',
         location: c.location_state,
         raw: c
       }));
       setConversations(mappedConversations);
-      setTotal(totalCount);
+      if (response.data.total !== null && response.data.total !== undefined) {
+        setTotal(response.data.total);
+      }
     } catch (error) {
       console.error("Error fetching conversations", error);
     } finally {
@@ -43,20 +55,23 @@ const ChatHistory = () => {
     }
   };
 
+  const mapMessages = (items) => items.map(m => ({
+    id: m.id,
+    role: m.role,
+    content: m.content,
+    time: new Date(m.created_at).toLocaleTimeString(),
+    media_url: m.media_url
+  }));
+
   const handleSelectChat = async (chat) => {
     setSelectedChat({ ...chat, messages: [] });
     setLoadingMessages(true);
     try {
       const response = await chatService.getMessages(chat.id);
+      messagesCursor.current = response.data.next_cursor;
       setSelectedChat(prev => ({
         ...prev,
-        messages: response.data.map(m => ({
-          id: m.id,
-          role: m.role,
-          content: m.content,
-          time: new Date(m.created_at).toLocaleTimeString(),
-          media_url: m.media_url
-        }))
+        messages: mapMessages(response.data.items)
       }));
     } catch (error) {
       console.error("Error fetching messages", error);
@@ -65,7 +80,29 @@ const ChatHistory = () => {
     }
   };
 
-  const totalPages = Math.ceil(total / limit);
+  // While a chat is open, fetch only the messages newer than the last one shown
+  useEffect(() => {
+    if (!selectedChat) return undefined;
+    const chatId = selectedChat.id;
+    const interval = setInterval(async () => {
+      if (!messagesCursor.current) return;
+      try {
+        const response = await chatService.getMessages(chatId, { after: messagesCursor.current });
+        messagesCursor.current = response.data.next_cursor;
+        if (response.data.items.length > 0) {
+          // A finished streamed reply comes back with the id of the message it replaces
+          const fresh = mapMessages(response.data.items);
+          const freshIds = new Set(fresh.map(m => m.id));
+          setSelectedChat(prev => prev && prev.id === chatId
+            ? { ...prev, messages: [...prev.messages.filter(m => !freshIds.has(m.id)), ...fresh] }
+            : prev);
+        }
+      } catch (error) {
+        console.error("Error refreshing messages", error);
+      }
+    }, 5000);
+    return () => clearInterval(interval);
+  }, [selectedChat?.id]);
 
   if (loading && conversations.length === 0) {
     return <div className="p-8 text-center text-gray-500">Carregando histórico...</div>;
@@ -153,9 +190,9 @@ const ChatHistory = () => {
             Anterior
           </button>
           <button
-            onClick={() => setPage(p => Math.min(totalPages, p + 1))}
-            disabled={page === totalPages}
-            className={`relative ml-3 inline-flex items-center rounded-md border border-gray-300 bg-white px-4 py-2 text-sm font-medium text-gray-700 hover:bg-gray-50 ${page === totalPages ? 'opacity-50 cursor-not-allowed' : ''}`}
+            onClick={() => setPage(p => p + 1)}
+            disabled={!hasNext}
+            className={`relative ml-3 inline-flex items-center rounded-md border border-gray-300 bg-white px-4 py-2 text-sm font-medium text-gray-700 hover:bg-gray-50 ${!hasNext ? 'opacity-50 cursor-not-allowed' : ''}`}
           >
             Próxima
           </button>
@@ -163,7 +200,7 @@ const ChatHistory = () => {
         <div className="hidden sm:flex sm:flex-1 sm:items-center sm:justify-between">
           <div>
             <p className="text-sm text-gray-700">
-              Mostrando <span className="font-medium">{(page - 1) * limit + 1}</span> a <span className="font-medium">{Math.min(page * limit, total)}</span> de <span className="font-medium">{total}</span> resultados
+              Mostrando <span className="font-medium">{(page - 1) * limit + 1}</span> a <span className="font-medium">{(page - 1) * limit + conversations.length}</span> de <span className="font-medium">~{total}</span> resultados
             </p>
           </div>
           <div>
@@ -176,7 +213,7 @@ const ChatHistory = () => {
                 <span className="sr-only">Anterior</span>
                 <span className="h-5 w-5 flex items-center justify-center">&lt;</span>
               </button>
-              {Array.from({ length: totalPages }, (_, i) => i + 1).map((p) => (
+              {Array.from({ length: cursors.length - (hasNext ? 0 : 1) }, (_, i) => i + 1).map((p) => (
                  <button
                    key={p}
                    onClick={() => setPage(p)}
@@ -191,9 +228,9 @@ const ChatHistory = () => {
                  </button>
               ))}
               <button
-                onClick={() => setPage(p => Math.min(totalPages, p + 1))}
-                disabled={page === totalPages}
-                className={`relative inline-flex items-center rounded-r-md px-2 py-2 text-gray-400 ring-1 ring-inset ring-gray-300 hover:bg-gray-50 focus:z-20 focus:outline-offset-0 ${page === totalPages ? 'opacity-50 cursor-not-allowed' : ''}`}
+                onClick={() => setPage(p => p + 1)}
+                disabled={!hasNext}
+                className={`relative inline-flex items-center rounded-r-md px-2 py-2 text-gray-400 ring-1 ring-inset ring-gray-300 hover:bg-gray-50 focus:z-20 focus:outline-offset-0 ${!hasNext ? 'opacity-50 cursor-not-allowed' : ''}`}
               >
                 <span className="sr-only">Próxima</span>
                 <span className="h-5 w-5 flex items-center justify-center">&gt;</span>
@@ -30,8 +30,8 @@ const Dashboard = () => {
 
   const fetchData = async () => {
     try {
-      const { conversations } = await dashboardService.getStats();
-      processStats(conversations);
+      const summary = await dashboardService.getSummary();
+      processStats(summary);
     } catch (error) {
       console.error("Error fetching dashboard data", error);
     } finally {
@@ -39,41 +39,23 @@ const Dashboard = () => {
     }
   };
 
-  const processStats = (conversations) => {
-    const today = new Date().toISOString().split('T')[0];
-    
-    // 1. Calculate Stats
-    const todayConversations = conversations.filter(c => c.updated_at?.startsWith(today) || c.created_at?.startsWith(today));
-    const uniqueUsers = new Set(conversations.map(c => c.whatsapp_id)).size;
-    const pestAlerts = conversations.filter(c => c.problem_category === 'Praga').length;
+  const processStats = (summary) => {
+    // 1. Stats
+    const pestAlerts = summary.by_category.find(c => c.category === 'Praga')?.count || 0;
 
     setStats([
-      { title: 'Conversas Hoje', value: todayConversations.length.toString(), icon: MessageCircle, color: 'bg-blue-500' },
-      { title: 'Usuários Ativos', value: uniqueUsers.toString(), icon: Users, color: 'bg-green-500' },
+      { title: 'Conversas Hoje', value: summary.today.active_conversations.toString(), icon: MessageCircle, color: 'bg-blue-500' },
+      { title: 'Ativos (7 dias)', value: summary.week.active_users.toString(), icon: Users, color: 'bg-green-500' },
       { title: 'Alertas de Pragas', value: pestAlerts.toString(), icon: AlertTriangle, color: 'bg-red-500' },
     ]);
 
-    // 2. Calculate Chart Data (Last 7 days)
+    // 2. Chart Data (Last 7 days, UTC dates)
     const days = ['Dom', 'Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb'];
-    const last7Days = [...Array(7)].map((_, i) => {
-      const d = new Date();
-      d.setDate(d.getDate() - i);
-      return d;
-    }).reverse();
-
-    const newChartData = last7Days.map(date => {
-      const dateStr = date.toISOString().split('T')[0];
-      const dayName = days[date.getDay()];
-      
-      const dayConvs = conversations.filter(c => c.created_at?.startsWith(dateStr));
-      const problems = dayConvs.filter(c => c.problem_category).length;
-
-      return {
-        name: dayName,
-        mensagens: dayConvs.length, // Using conversation count as proxy for messages for now
-        problemas: problems
-      };
-    });
+    const newChartData = summary.daily.map(day => ({
+      name: days[new Date(`${day.date}T12:00:00Z`).getUTCDay()],
+      mensagens: day.conversations,
+      problemas: day.with_problem
+    }));
 
     setChartData(newChartData);
   };
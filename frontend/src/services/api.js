@@ -36,17 +36,10 @@ const api = axios.create({
 });
 
 export const dashboardService = {
-  getStats: async () => {
-    // We might need to aggregate this from other endpoints or create a specific dashboard endpoint
-    // For now, let's fetch conversations and calculate some stats client-side or use available endpoints
-    const [conversations, professionals] = await Promise.all([
-      api.get('/conversations/', { params: { limit: 1000 } }), // Get more for stats
-      api.get('/professionals/')
-    ]);
-    return {
-      conversations: conversations.data.items || conversations.data, // Handle new structure
-      professionals: professionals.data
-    };
+  // Aggregates computed and cached server-side (ETag / Cache-Control handled by the browser)
+  getSummary: async () => {
+    const response = await api.get('/dashboard/summary');
+    return response.data;
   },
   getAnalytics: async () => {
     const response = await api.get('/analytics/problems');
@@ -56,7 +49,7 @@ export const dashboardService = {
 
 export const chatService = {
   getConversations: (params) => api.get('/conversations/', { params }),
-  getMessages: (id) => api.get(`/conversations/${id}/messages`),
+  getMessages: (id, params) => api.get(`/conversations/${id}/messages`, { params }),
 };
 
 export const professionalsService = {